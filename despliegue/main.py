@@ -21,6 +21,8 @@ from src.funcionalidades.demanda_zona_franja import (
     cargar_resumen_para_consulta,
     consultar_demanda,
 )
+from src.processing.codificador_zonas import CodificadorZonas
+from src.processing.cubo_demanda import CuboDemanda, demanda_reciente_perfil
 
 # --- 2. DEFINICIÓN DE RUTAS Y DIRECTORIOS ---
 BASE_DIR = Path(__file__).resolve().parent
@@ -38,6 +40,7 @@ P5_FALLBACK_PATH = DATA_ROOT / "processed/tlc_clean/problema5/train.parquet"
 FUNCIONALIDADES_DIR = DATA_ROOT / "funcionalidades"
 MAPA_HTML_PATH = FUNCIONALIDADES_DIR / "mapa_poder_barrios.html"
 DEMANDA_CACHE_DIR = CONTEXT_DIR / "funcionalidades"
+CUBO_DEMANDA_DIR = DATA_ROOT / "processed/tlc_clean/cubo_demanda"
 
 # --- 3. CARGA DE MODELOS (LIFESPAN) ---
 @asynccontextmanager
@@ -52,6 +55,9 @@ async def lifespan(app: FastAPI):
         app.scaler_p4 = joblib.load(MODEL_DIR / "modelo_p4_scaler_clima.joblib")
         app.encoder_p4 = joblib.load(MODEL_DIR / "modelo_p4_label_encoder_zonas.joblib")
         app.modelo_p5 = joblib.load(MODEL_DIR / "modelo_p5_xgboost.joblib")
+        # Tablas id de zona → código; una zona no vista usa el código de la primera clase
+        app.codificador_p2 = CodificadorZonas.desde_encoder(app.encoder_p2, desconocida=0)
+        app.codificador_p4 = CodificadorZonas.desde_encoder(app.encoder_p4, desconocida=0)
         print("✅ Modelos cargados correctamente.")
 
         path_zonas = DATA_ROOT / "external/taxi_zone_lookup.csv"
@@ -102,9 +108,23 @@ def cargar_contexto(path: Path, fallback_path: Path, nombre: str) -> pd.DataFram
         return pd.DataFrame()
 
 
+def cargar_perfil_demanda(path: Path):
+    """Demanda media zona × día de la semana × hora sacada del cubo de demanda (o None)."""
+    try:
+        if (path / "meta.json").exists():
+            perfil = CuboDemanda.abrir(path).perfil_semanal("viajes", "1h")
+            print(f"✅ Perfil de demanda cargado: {perfil.shape[0]} zonas.")
+            return perfil
+        print(f"⚠️ No existe {path}. Lags de demanda P1 con proxies de oferta.")
+    except Exception as e:
+        print(f"⚠️ Error cargando cubo de demanda: {e}")
+    return None
+
+
 df_historico = pd.DataFrame()
 df_p2_contexto = cargar_contexto(P2_CONTEXT_PATH, P2_FALLBACK_PATH, "P2")
 df_p5_contexto = cargar_contexto(P5_CONTEXT_PATH, P5_FALLBACK_PATH, "P5")
+perfil_demanda = cargar_perfil_demanda(CUBO_DEMANDA_DIR)
 
 # --- 6. FUNCIONES DE APOYO ---
 def procesar_tiempo_despliegue(hora_usuario: str = "actual"):
@@ -238,18 +258,14 @@ def valor_contexto(info, columna, defecto=0.0, tipo=float):
     except Exception:
         return tipo(defecto)
 
-def transformar_label_encoder_seguro(encoder, valor):
+def transformar_label_encoder_seguro(codificador, valor):
     """
     Evita que LabelEncoder falle si llega una zona no vista.
-    Si la zona no existe, usa la primera clase conocida.
+    Si la zona no existe, usa la primera clase conocida (código 0 del
+    CodificadorZonas creado al arrancar).
     """
     try:
-        valor = int(valor)
-
-        if valor in encoder.classes_:
-            return int(encoder.transform([valor])[0])
-
-        return int(encoder.transform([encoder.classes_[0]])[0])
+        return codificador.transformar_uno(int(valor))
 
     except Exception as e:
         print("Error en LabelEncoder:", e)
@@ -286,6 +302,39 @@ def desplazar_tiempo(t, minutos: float):
         "es_finde": es_fin_semana,
     }
 
+def demanda_reciente_zona(zona_id, t, oferta, tasa_historica, oferta_media):
+    """
+    demanda, lags, rolling y media_hist de P1 para la zona en la hora de t.
+    Los lags salen del perfil semanal del cubo con el mismo constructor que
+    en entrenamiento (demanda_reciente: desde la última hora completa); lo
+    que no hay, y media_hist siempre, de los proxies de oferta, como en
+    cascading.features_p1.
+    """
+    valores = {
+        "demanda": oferta,
+        "lag_1h": oferta,
+        "lag_2h": oferta,
+        "lag_3h": oferta,
+        "lag_6h": oferta,
+        "lag_12h": oferta,
+        "lag_24h": tasa_historica * oferta_media,
+        "roll_mean_3h": oferta,
+        "roll_std_3h": oferta * 0.1,
+        "roll_mean_24h": oferta,
+        "roll_std_24h": oferta * 0.1,
+        "media_hist": tasa_historica * oferta_media,
+    }
+
+    zona_id = int(zona_id)
+    if perfil_demanda is None or not 0 <= zona_id < perfil_demanda.shape[0]:
+        return valores
+
+    recientes = demanda_reciente_perfil(perfil_demanda, zona_id, t["dia_semana"], t["hora_int"])
+    for col, valor in recientes.items():
+        if col in valores and not np.isnan(valor):
+            valores[col] = valor
+    return valores
+
 def predecir_potencial_zona(zona_id: int, t):
     """Predice demanda P1 y probabilidad P2 para una zona y momento."""
     info = obtener_contexto_zona(zona_id, t)
@@ -313,19 +362,7 @@ def predecir_potencial_zona(zona_id: int, t):
         "mes_num": int(mes_num),
         "es_finde": int(t["es_fin_semana"]),
 
-        "demanda": oferta,
-        "lag_1h": oferta,
-        "lag_2h": oferta,
-        "lag_3h": oferta,
-        "lag_6h": oferta,
-        "lag_12h": oferta,
-        "lag_24h": tasa_historica * oferta_media,
-
-        "roll_mean_3h": oferta,
-        "roll_std_3h": oferta * 0.1,
-        "roll_mean_24h": oferta,
-        "roll_std_24h": oferta * 0.1,
-        "media_hist": tasa_historica * oferta_media,
+        **demanda_reciente_zona(zona_id, t, oferta, tasa_historica, oferta_media),
 
         "temp_c": temp,
         "precipitation": precipitation,
@@ -341,7 +378,7 @@ def predecir_potencial_zona(zona_id: int, t):
     demanda_pred = float(app.modelo_p1.predict(df_p1)[0])
     demanda_pred = max(demanda_pred, 0.0)
 
-    z_enc = transformar_label_encoder_seguro(app.encoder_p2, zona_id)
+    z_enc = transformar_label_encoder_seguro(app.codificador_p2, zona_id)
     n_viajes = valor_contexto(info, "n_viajes", oferta, float)
 
     cols_p2 = [
@@ -426,19 +463,7 @@ def predecir_demanda_zona_p1(zona_id: int, t):
         "mes_num": int(t["mes_num"]),
         "es_finde": int(t["es_fin_semana"]),
 
-        "demanda": oferta,
-        "lag_1h": oferta,
-        "lag_2h": oferta,
-        "lag_3h": oferta,
-        "lag_6h": oferta,
-        "lag_12h": oferta,
-        "lag_24h": tasa_historica * oferta_media,
-
-        "roll_mean_3h": oferta,
-        "roll_std_3h": oferta * 0.1,
-        "roll_mean_24h": oferta,
-        "roll_std_24h": oferta * 0.1,
-        "media_hist": tasa_historica * oferta_media,
+        **demanda_reciente_zona(zona_id, t, oferta, tasa_historica, oferta_media),
 
         "temp_c": temp,
         "precipitation": precipitation,
@@ -737,7 +762,7 @@ async def predict_vtc(
     
     # Predecir la velocidad - modelo 4
     z_idx = np.array(
-        [transformar_label_encoder_seguro(app.encoder_p4, origen_id)],
+        [transformar_label_encoder_seguro(app.codificador_p4, origen_id)],
         dtype=np.int32
     )
 
@@ -1,20 +1,33 @@
+# Uso (desde la raíz del repo): python -m despliegue.reentrenar.reentrenar_mlp
 import os
 os.environ["KERAS_BACKEND"] = "jax"
 
 import json
 from pathlib import Path
 
+import shutil
+
 import joblib
 import keras
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from keras import layers
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.preprocessing import LabelEncoder
+
+from src.modelos.lotes_parquet import LotesParquet, Rendimiento, ajustar_scaler, recorrer, valores_unicos
+from src.modelos.problema2.cascading import predecir_demanda_p1_lotes
+from src.processing.codificador_zonas import CodificadorZonas
+from src.processing.cubo_demanda import CUBO_DIR, CuboDemanda, demanda_reciente_cubo
+from src.processing.escritura import EscritorParquet
 
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 
 FEATURES_DIR = BASE_DIR / "data/processed/tlc_clean/problema2/features"
+# Splits con demanda_p1 recalculada (temporales, se borran al terminar)
+REENTRENO_DIR = BASE_DIR / "data/processed/tlc_clean/problema2/features_reentreno"
+CUBO_DEMANDA_DIR = BASE_DIR / CUBO_DIR
 P1_METADATA_PATH = BASE_DIR / "data/processed/tlc_clean/problema1/features/metadata.json"
 RF_P1_PATH = BASE_DIR / "despliegue/modelos_finales/modelo_p1_rf.joblib"
 SAVE_DIR = BASE_DIR / "despliegue/modelos_finales"
@@ -30,54 +43,35 @@ CONFIG = {
 }
 
 
-def build_p1_features(df: pd.DataFrame, oferta_media: float) -> pd.DataFrame:
-    return pd.DataFrame(
-        {
-            "origen_id": df["origen_id"],
-            "hora": df["hora"],
-            "dia_semana": df["dia_semana"],
-            "dia_mes": df["ventana_inicio"].dt.day,
-            "mes_num": df["mes_num"],
-            "es_finde": df["es_finde"],
-            "demanda": df["oferta_inferida"],
-            "lag_1h": df["oferta_inferida"],
-            "lag_2h": df["oferta_inferida"],
-            "lag_3h": df["oferta_inferida"],
-            "lag_6h": df["oferta_inferida"],
-            "lag_12h": df["oferta_inferida"],
-            "lag_24h": df["tasa_historica"] * oferta_media,
-            "roll_mean_3h": df["oferta_inferida"],
-            "roll_std_3h": df["oferta_inferida"] * 0.1,
-            "roll_mean_24h": df["oferta_inferida"],
-            "roll_std_24h": df["oferta_inferida"] * 0.1,
-            "media_hist": df["tasa_historica"] * oferta_media,
-            "temp_c": df["temp_c"],
-            "precipitation": df["precipitation"],
-            "viento_kmh": df["viento_kmh"],
-            "velocidad_mph": df["viento_kmh"] * 0.621,
-            "lluvia": df["lluvia"],
-            "nieve": df["nieve"],
-            "es_festivo": df["es_festivo"],
-            "num_eventos": df["num_eventos"],
-        }
-    )
-
-
-def recalcular_demanda_p1(
-    df: pd.DataFrame,
-    rf_p1,
-    p1_feature_cols: list[str],
-    batch_size: int = 500_000,
-) -> np.ndarray:
-    pred = np.empty(len(df), dtype=np.float32)
-    oferta_media = float(df["oferta_inferida"].mean())
-
-    for start in range(0, len(df), batch_size):
-        end = min(start + batch_size, len(df))
-        feats = build_p1_features(df.iloc[start:end], oferta_media)
-        pred[start:end] = np.clip(rf_p1.predict(feats[p1_feature_cols]), 0, None)
-
-    return pred
+def escribir_con_demanda_p1(
+    origen: Path, destino: Path, columnas: list[str], rf_p1, p1_feature_cols, cubo: CuboDemanda | None = None,
+) -> int:
+    """
+    Copia un split row group a row group con demanda_p1 recalculada. Devuelve las filas.
+    Mismas features que problema2/features.py (lags del cubo, proxies donde no
+    llega): todos los row groups pasan por un único pool de procesos y las
+    filas repetidas se predicen una vez por trozo aunque crucen row groups.
+    """
+    # Media de oferta del split entero (como antes), sumando row group a row group
+    suma, n = 0.0, 0
+    for df in recorrer(origen, ["oferta_inferida"]):
+        suma += float(df["oferta_inferida"].sum())
+        n += int(df["oferta_inferida"].count())
+    oferta_media = suma / n if n else float("nan")
+
+    def lotes():
+        for df in recorrer(origen, columnas):
+            df["ventana_inicio"] = pd.to_datetime(df["ventana_inicio"])
+            recientes = demanda_reciente_cubo(cubo, df["origen_id"], df["ventana_inicio"]) if cubo is not None else None
+            yield df, recientes
+
+    filas = 0
+    with EscritorParquet(destino) as escritor:
+        for df, pred in predecir_demanda_p1_lotes(rf_p1, lotes(), oferta_media, columnas=p1_feature_cols):
+            df["demanda_p1"] = pred.astype(np.float32)
+            escritor.escribir(df)
+            filas += len(df)
+    return filas
 
 
 def build_model(input_dim: int) -> keras.Model:
@@ -119,13 +113,6 @@ def reentrenar_p2_completo():
     np.random.seed(42)
     keras.utils.set_random_seed(42)
 
-    print("\nCargando todos los conjuntos de datos...")
-    df_train = pd.read_parquet(FEATURES_DIR / "train.parquet")
-    df_val = pd.read_parquet(FEATURES_DIR / "val.parquet")
-    df_test = pd.read_parquet(FEATURES_DIR / "test.parquet")
-    for df in [df_train, df_val, df_test]:
-        df["ventana_inicio"] = pd.to_datetime(df["ventana_inicio"])
-
     with open(FEATURES_DIR / "metadata.json", "r", encoding="utf-8") as f:
         meta = json.load(f)
     with open(P1_METADATA_PATH, "r", encoding="utf-8") as f:
@@ -136,45 +123,73 @@ def reentrenar_p2_completo():
     features_final = features_num + ["zona_enc"]
 
     required_p2_cols = [col for col in meta["feature_cols"] if col != "demanda_p1"] + [target]
-    for name, df in [("train", df_train), ("val", df_val), ("test", df_test)]:
-        missing_cols = [col for col in required_p2_cols if col not in df.columns]
+    for name in ["train", "val", "test"]:
+        columnas_split = pq.read_schema(FEATURES_DIR / f"{name}.parquet").names
+        missing_cols = [col for col in required_p2_cols if col not in columnas_split]
         if missing_cols:
             raise ValueError(f"Faltan columnas esperadas en P2 {name}: {missing_cols}")
 
     print(f"Cargando RF final de P1: {RF_P1_PATH}")
     rf_p1 = joblib.load(RF_P1_PATH)
     p1_feature_cols = meta_p1["feature_cols"]
-
-    print("\nRecalculando demanda_p1 con el RF final reentrenado...")
-    df_train["demanda_p1"] = recalcular_demanda_p1(df_train, rf_p1, p1_feature_cols)
-    df_val["demanda_p1"] = recalcular_demanda_p1(df_val, rf_p1, p1_feature_cols)
-    df_test["demanda_p1"] = recalcular_demanda_p1(df_test, rf_p1, p1_feature_cols)
-    print(f"Demanda P1 recalculada - media train: {df_train['demanda_p1'].mean():.2f}")
-
-    df_full = pd.concat([df_train, df_val, df_test], ignore_index=True)
-    print(f"Dataset unificado con exito: {len(df_full):,} filas.")
+    cubo = CuboDemanda.abrir(CUBO_DEMANDA_DIR) if (CUBO_DEMANDA_DIR / "meta.json").exists() else None
+    print(f"Lags de demanda P1: {'cubo ' + str(CUBO_DEMANDA_DIR) if cubo is not None else 'proxies de oferta (no hay cubo)'}")
+
+    # Lo que leen las features P1 (cascading) y el MLP, sin el resto de columnas
+    columnas = list(dict.fromkeys(
+        required_p2_cols + ["ventana_inicio", "tasa_historica", "oferta_inferida", "dia_semana",
+                            "hora", "mes_num", "es_finde", "temp_c", "precipitation", "viento_kmh",
+                            "lluvia", "nieve", "es_festivo", "num_eventos"]
+    ))
+
+    print("\nRecalculando demanda_p1 con el RF final reentrenado (split a split, por row groups)...")
+    REENTRENO_DIR.mkdir(parents=True, exist_ok=True)
+    rutas = []
+    filas = 0
+    for name in ["train", "val", "test"]:
+        destino = REENTRENO_DIR / f"{name}.parquet"
+        filas += escribir_con_demanda_p1(FEATURES_DIR / f"{name}.parquet", destino, columnas, rf_p1, p1_feature_cols, cubo)
+        rutas.append(destino)
+    del rf_p1, cubo
+    print(f"Dataset unificado con exito: {filas:,} filas.")
+
+    columnas_mlp = features_num + ["origen_id", target]
 
     print("\nCodificando zonas...")
     encoder = LabelEncoder()
-    df_full["zona_enc"] = encoder.fit_transform(df_full["origen_id"])
+    encoder.fit(valores_unicos(rutas, "origen_id"))
+    codificador = CodificadorZonas.desde_encoder(encoder)
 
-    X = df_full[features_final].fillna(0).values.astype(np.float32)
-    y = df_full[target].values.astype(np.float32)
+    def matriz(df: pd.DataFrame) -> np.ndarray:
+        df = df.assign(zona_enc=codificador.transformar(df["origen_id"]))
+        return df[features_final].fillna(0).to_numpy(dtype=np.float32)
 
     print("Normalizando features...")
-    scaler = StandardScaler()
-    X = scaler.fit_transform(X).astype(np.float32)
+    scaler = ajustar_scaler(rutas, matriz, columnas=columnas_mlp)
+
+    def preparar(df: pd.DataFrame):
+        return scaler.transform(matriz(df)).astype(np.float32), df[target].to_numpy(dtype=np.float32)
+
+    # Lotes float32 desde los parquets; los pesos de clase van en cada lote
+    dataset = LotesParquet(
+        rutas,
+        preparar,
+        CONFIG["batch_size"],
+        columnas=columnas_mlp,
+        shuffle=True,
+        pesos_clase={0: CONFIG["pos_weight"], 1: 1.0},
+    )
+    rendimiento = Rendimiento(dataset)
 
     print("\nEntrenando MLP...")
-    model = build_model(X.shape[1])
+    model = build_model(len(features_final))
     model.fit(
-        X,
-        y,
+        dataset,
         epochs=CONFIG["epochs"],
-        batch_size=CONFIG["batch_size"],
-        class_weight={0: CONFIG["pos_weight"], 1: 1.0},
+        callbacks=[rendimiento],
         verbose=1,
     )
+    shutil.rmtree(REENTRENO_DIR, ignore_errors=True)
 
     model_path = SAVE_DIR / "modelo_p2_mlp.keras"
     scaler_path = SAVE_DIR / "modelo_p2_mlp_scaler.pkl"
@@ -190,8 +205,9 @@ def reentrenar_p2_completo():
         "features": features_final,
         "target": target,
         "config": CONFIG,
-        "train_samples": int(len(df_full)),
-        "input_dim": int(X.shape[1]),
+        "train_samples": int(dataset.num_filas),
+        "input_dim": len(features_final),
+        "muestras_s": [round(v) for v in rendimiento.muestras_s],
         "cascading_input": {
             "feature": "demanda_p1",
             "rf_p1_path": str(RF_P1_PATH),
@@ -1,3 +1,4 @@
+# Uso (desde la raíz del repo): python -m despliegue.reentrenar.reentrenar_red_p4
 import json
 from pathlib import Path
 
@@ -5,8 +6,12 @@ import joblib
 import keras
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from keras import layers, models
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.preprocessing import LabelEncoder
+
+from src.modelos.lotes_parquet import LotesParquet, Rendimiento, ajustar_scaler, valores_unicos
+from src.processing.codificador_zonas import CodificadorZonas
 
 
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -90,42 +95,44 @@ def reentrenar_p4_completo():
     if missing_files:
         raise FileNotFoundError(
             "Faltan archivos procesados de P4. Genera primero los datos con "
-            "`uv run python src/modelos/problema4/preprocesamiento_base.py`. "
+            "`uv run python -m src.modelos.problema4.preprocesamiento_base`. "
             f"Archivos ausentes: {missing_files}"
         )
 
     np.random.seed(42)
     keras.utils.set_random_seed(42)
 
-    print("\nCargando train + val + test...")
-    df_full = pd.concat(
-        [pd.read_parquet(path) for path in DATA_FILES.values()],
-        ignore_index=True,
-    )
-    print(f"Dataset unificado con exito: {len(df_full):,} filas.")
-
+    # train + val + test se leen por row groups (ver src/modelos/lotes_parquet.py)
+    rutas = list(DATA_FILES.values())
     required_cols = [COL_ZONA, TARGET] + COLS_CLIMA_TEMP
-    missing_cols = [col for col in required_cols if col not in df_full.columns]
-    if missing_cols:
-        raise ValueError(f"Faltan columnas esperadas en los datos de P4: {missing_cols}")
+    for path in rutas:
+        missing_cols = [col for col in required_cols if col not in pq.read_schema(path).names]
+        if missing_cols:
+            raise ValueError(f"Faltan columnas esperadas en los datos de P4: {missing_cols}")
 
+    print("\nPreparando entradas...")
     encoder = LabelEncoder()
-    scaler = StandardScaler()
+    encoder.fit(valores_unicos(rutas, COL_ZONA))
+    codificador = CodificadorZonas.desde_encoder(encoder)
+    scaler = ajustar_scaler(rutas, lambda df: df[COLS_CLIMA_TEMP], columnas=COLS_CLIMA_TEMP)
 
-    print("\nPreparando entradas...")
-    X_zone = encoder.fit_transform(df_full[COL_ZONA]).astype(np.int32)
-    X_num = scaler.fit_transform(df_full[COLS_CLIMA_TEMP]).astype(np.float32)
-    y = df_full[TARGET].values.astype(np.float32)
+    def preparar(df: pd.DataFrame):
+        X_zone = codificador.transformar(df[COL_ZONA]).astype(np.int32)
+        X_num = scaler.transform(df[COLS_CLIMA_TEMP]).astype(np.float32)
+        return [X_zone, X_num], df[TARGET].to_numpy(dtype=np.float32)
+
+    dataset = LotesParquet(rutas, preparar, CONFIG["batch_size"], columnas=required_cols, shuffle=True)
+    rendimiento = Rendimiento(dataset)
+    print(f"Dataset unificado con exito: {dataset.num_filas:,} filas.")
 
     num_unique_zones = len(encoder.classes_)
 
     print("\nEntrenando red neuronal con embeddings...")
     model = build_model(num_unique_zones=num_unique_zones, num_features=len(COLS_CLIMA_TEMP))
     model.fit(
-        [X_zone, X_num],
-        y,
+        dataset,
         epochs=CONFIG["epochs"],
-        batch_size=CONFIG["batch_size"],
+        callbacks=[rendimiento],
         verbose=1,
     )
 
@@ -144,7 +151,8 @@ def reentrenar_p4_completo():
         "zona_col": COL_ZONA,
         "numeric_features": COLS_CLIMA_TEMP,
         "config": CONFIG,
-        "train_samples": int(len(df_full)),
+        "train_samples": int(dataset.num_filas),
+        "muestras_s": [round(v) for v in rendimiento.muestras_s],
         "num_unique_zones": int(num_unique_zones),
     }
     with open(metadata_path, "w", encoding="utf-8") as f:
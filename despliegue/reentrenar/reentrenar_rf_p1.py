@@ -1,9 +1,12 @@
+import argparse
 import pandas as pd
 import joblib
 import json
 from pathlib import Path
 from sklearn.ensemble import RandomForestRegressor
 
+from src.modelos.problema1.busqueda_rf import params_rf
+
 # ============================================================
 # 1. CONFIGURACIÓN DE RUTAS 
 # ============================================================
@@ -13,8 +16,10 @@ BASE_DIR = Path(__file__).resolve().parents[2]
 DATA_DIR = BASE_DIR / 'data/processed/tlc_clean/problema1/features'
 SAVE_DIR = BASE_DIR / 'despliegue/modelos_finales'
 SAVE_DIR.mkdir(parents=True, exist_ok=True)
+# Resultado de src.modelos.problema1.busqueda_rf (solo se usa con --busqueda)
+BUSQUEDA_PATH = BASE_DIR / 'models/problema1/busqueda_rf.json'
 
-def reentrenar_p1_completo():
+def reentrenar_p1_completo(usar_busqueda=False):
     print("=" * 60)
     print("REENTRENAMIENTO FINAL - PROBLEMA 1 (RANDOM FOREST)")
     print("=" * 60)
@@ -25,6 +30,9 @@ def reentrenar_p1_completo():
         print(f"ERROR: No se encuentran los archivos en {DATA_DIR}")
         print("Asegúrate de que la ruta es correcta desde la raíz del proyecto.")
         return
+    if usar_busqueda and not BUSQUEDA_PATH.exists():
+        print(f"ERROR: No existe {BUSQUEDA_PATH}. Ejecuta antes python -m src.modelos.problema1.busqueda_rf")
+        return
 
     # ============================================================
     # 2. CARGAR Y UNIFICAR TODO EL DATASET (100%)
@@ -54,15 +62,10 @@ def reentrenar_p1_completo():
     # ============================================================
     # 3. CONFIGURACIÓN DEL MODELO
     # ============================================================
-    rf_final = RandomForestRegressor(
-        n_estimators=200,
-        max_depth=12,
-        min_samples_split=20,
-        min_samples_leaf=10,
-        max_features='sqrt',
-        random_state=42,
-        n_jobs=-1,
-    )
+    # Por defecto los de baseline.py; con --busqueda, la mejor configuración encontrada
+    params = params_rf(BUSQUEDA_PATH if usar_busqueda else None)
+    print(f"Hiperparámetros: {params}")
+    rf_final = RandomForestRegressor(**params)
 
     # ============================================================
     # 4. ENTRENAMIENTO Y GUARDADO
@@ -77,4 +80,8 @@ def reentrenar_p1_completo():
     print("=" * 60)
 
 if __name__ == "__main__":
-    reentrenar_p1_completo()
+    # Desde la raíz del repo: python -m despliegue.reentrenar.reentrenar_rf_p1 [--busqueda]
+    parser = argparse.ArgumentParser("Reentrenamiento final del RF de P1")
+    parser.add_argument("--busqueda", action="store_true",
+                        help="usar la mejor configuración de models/problema1/busqueda_rf.json")
+    reentrenar_p1_completo(parser.parse_args().busqueda)
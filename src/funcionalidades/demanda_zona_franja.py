@@ -2,6 +2,10 @@
 
 Uso recomendado desde la raiz del repo:
     uv run python -m src.funcionalidades.demanda_zona_franja
+
+Con el cubo de demanda ya construido (src.processing.cubo_demanda) no hace
+falta releer los viajes:
+    uv run python -m src.funcionalidades.demanda_zona_franja --inputs data/processed/tlc_clean/cubo_demanda
 """
 
 from __future__ import annotations
@@ -15,6 +19,9 @@ import numpy as np
 import pandas as pd
 import pyarrow.parquet as pq
 
+from src.processing.cubo_demanda import CuboDemanda
+from src.processing.escaneo import Consumidor, EscaneoCompartido
+
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 DEFAULT_INPUT_RELATIVE = Path("data/processed/tlc_clean/datos_final.parquet")
@@ -54,18 +61,17 @@ def cargar_parquet_columnas(path: Path, columnas: list[str]) -> pd.DataFrame:
     return pd.read_parquet(path, columns=columnas_presentes)
 
 
-def agregar_viajes_por_zona_hora(path: Path) -> pd.DataFrame:
-    """Agrega viajes crudos a demanda por zona y hora real, leyendo por row groups."""
-    parquet = pq.ParquetFile(path)
-    columnas = set(parquet.schema_arrow.names)
-    if not {"origen_id", "fecha_inicio"}.issubset(columnas):
-        raise ValueError(f"{path} necesita columnas 'origen_id' y 'fecha_inicio'.")
+class AgregadorDemandaZonaHora(Consumidor):
+    """Demanda por zona y hora real, como consumidor del escaneo compartido."""
+
+    columnas = ["origen_id", "fecha_inicio"]
+
+    def __init__(self):
+        self.partes = []
 
-    partes = []
-    for row_group in range(parquet.metadata.num_row_groups):
-        chunk = parquet.read_row_group(
-            row_group, columns=["origen_id", "fecha_inicio"]
-        ).to_pandas()
+    def procesar(self, chunk: pd.DataFrame) -> None:
+        if not {"origen_id", "fecha_inicio"}.issubset(chunk.columns):
+            return
         chunk["fecha_inicio"] = pd.to_datetime(chunk["fecha_inicio"])
         chunk["timestamp_hora"] = chunk["fecha_inicio"].dt.floor("h")
         parte = (
@@ -73,19 +79,43 @@ def agregar_viajes_por_zona_hora(path: Path) -> pd.DataFrame:
             .size()
             .reset_index(name="demanda")
         )
-        partes.append(parte)
+        self.partes.append(parte)
 
-    if not partes:
-        return pd.DataFrame(columns=["origen_id", "hora", "demanda"])
+    def finalizar(self, info: dict) -> pd.DataFrame:
+        if not self.partes:
+            return pd.DataFrame(columns=["origen_id", "hora", "demanda"])
 
-    agregado = (
-        pd.concat(partes, ignore_index=True)
-        .groupby(["origen_id", "timestamp_hora"], observed=True)["demanda"]
-        .sum()
-        .reset_index()
-    )
-    agregado["hora"] = agregado["timestamp_hora"].dt.hour
-    return agregado[["origen_id", "hora", "demanda"]]
+        agregado = (
+            pd.concat(self.partes, ignore_index=True)
+            .groupby(["origen_id", "timestamp_hora"], observed=True)["demanda"]
+            .sum()
+            .reset_index()
+        )
+        self.partes = []
+        agregado["hora"] = agregado["timestamp_hora"].dt.hour
+        return agregado[["origen_id", "hora", "demanda"]]
+
+
+def agregar_viajes_por_zona_hora(path: Path) -> pd.DataFrame:
+    """Agrega viajes crudos a demanda por zona y hora real, leyendo por row groups."""
+    columnas = columnas_parquet(path)
+    if not {"origen_id", "fecha_inicio"}.issubset(columnas):
+        raise ValueError(f"{path} necesita columnas 'origen_id' y 'fecha_inicio'.")
+
+    escaneo = EscaneoCompartido(path).registrar("demanda", AgregadorDemandaZonaHora())
+    return escaneo.ejecutar(verbose=False)["demanda"]
+
+
+def es_cubo_demanda(path: Path) -> bool:
+    return path.is_dir() and (path / "meta.json").exists()
+
+
+def demanda_desde_cubo(path: Path) -> pd.DataFrame:
+    """Demanda por zona y hora real desde el cubo denso (solo horas con viajes, como al agregar)."""
+    horas = CuboDemanda.abrir(path).capa("viajes", "1h")
+    zona, columna = np.nonzero(horas)
+    # t0 del cubo es medianoche: la columna módulo 24 es la hora del día
+    return pd.DataFrame({"origen_id": zona, "hora": columna % 24, "demanda": horas[zona, columna]})
 
 
 def cargar_datos_demanda(paths: list[Path] | None = None) -> pd.DataFrame:
@@ -98,6 +128,9 @@ def cargar_datos_demanda(paths: list[Path] | None = None) -> pd.DataFrame:
 
     frames = []
     for path in input_paths:
+        if es_cubo_demanda(path):
+            frames.append(demanda_desde_cubo(path))
+            continue
         columnas = columnas_parquet(path)
         if {"origen_id", "hora", "demanda"}.issubset(columnas):
             frames.append(
@@ -125,8 +158,10 @@ def cargar_datos_demanda(paths: list[Path] | None = None) -> pd.DataFrame:
                 "o ('origen_id', 'hora', 'n_viajes')."
             )
 
-    out = pd.concat(frames, ignore_index=True)
+    return tipos_demanda(pd.concat(frames, ignore_index=True))
 
+
+def tipos_demanda(out: pd.DataFrame) -> pd.DataFrame:
     out["origen_id"] = out["origen_id"].astype(int)
     out["hora"] = out["hora"].astype(int)
     out["demanda"] = pd.to_numeric(out["demanda"], errors="coerce").fillna(0)
@@ -389,7 +424,7 @@ def build_arg_parser() -> argparse.ArgumentParser:
         "--inputs",
         nargs="*",
         type=Path,
-        help=f"Parquets de entrada. Por defecto usa {DEFAULT_INPUT_RELATIVE}.",
+        help=f"Parquets de entrada (o el directorio del cubo de demanda). Por defecto usa {DEFAULT_INPUT_RELATIVE}.",
     )
     parser.add_argument(
         "--zone-lookup",
@@ -440,6 +475,34 @@ def build_arg_parser() -> argparse.ArgumentParser:
     return parser
 
 
+def generar_informe(
+    datos: pd.DataFrame,
+    inputs: list[Path] | None = None,
+    zone_lookup_path: Path = DEFAULT_ZONE_LOOKUP,
+    out_dir: Path = DEFAULT_REPORT_DIR,
+) -> pd.DataFrame:
+    """Clasifica, enriquece y guarda el informe a partir de la demanda zona-hora."""
+    resumen, metadata = clasificar_niveles_demanda(datos)
+    metadata["input_paths"] = normalizar_paths(inputs)
+    resumen = enriquecer_con_zonas(resumen, zone_lookup_path)
+    guardar_resultados(resumen, metadata, out_dir)
+
+    print(f"Resultados guardados en: {out_dir}")
+    print(resumen["nivel_demanda"].value_counts().to_string())
+    print("\nTop 10 combinaciones de demanda alta:")
+    columnas = [
+        "origen_id",
+        "origen_zona",
+        "franja_horaria",
+        "demanda_media",
+        "nivel_demanda",
+        "hora_pico",
+    ]
+    columnas = [col for col in columnas if col in resumen.columns]
+    print(resumen.nlargest(10, "demanda_media")[columnas].to_string(index=False))
+    return resumen
+
+
 def main() -> None:
     args = build_arg_parser().parse_args()
 
@@ -460,24 +523,7 @@ def main() -> None:
         return
 
     datos = cargar_datos_demanda(args.inputs)
-    resumen, metadata = clasificar_niveles_demanda(datos)
-    metadata["input_paths"] = normalizar_paths(args.inputs)
-    resumen = enriquecer_con_zonas(resumen, args.zone_lookup)
-    guardar_resultados(resumen, metadata, args.out_dir)
-
-    print(f"Resultados guardados en: {args.out_dir}")
-    print(resumen["nivel_demanda"].value_counts().to_string())
-    print("\nTop 10 combinaciones de demanda alta:")
-    columnas = [
-        "origen_id",
-        "origen_zona",
-        "franja_horaria",
-        "demanda_media",
-        "nivel_demanda",
-        "hora_pico",
-    ]
-    columnas = [col for col in columnas if col in resumen.columns]
-    print(resumen.nlargest(10, "demanda_media")[columnas].to_string(index=False))
+    generar_informe(datos, args.inputs, args.zone_lookup, args.out_dir)
 
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
+# Uso (desde la raíz del repo): python -m src.funcionalidades.mapa_coropletico
 import plotly.express as px
 import pandas as pd
 import geopandas as gpd
@@ -8,6 +9,8 @@ import requests
 import pyarrow.parquet as pq
 import zipfile
 
+from src.processing.escaneo import Consumidor, EscaneoCompartido
+
 # 1. CONFIGURACIÓN DE RUTAS
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 DATA_ROOT = Path(os.getenv("CONDUCIA_DATA_DIR", str(PROJECT_ROOT / "data")))
@@ -153,21 +156,16 @@ def calcular_indice_economico(df, columna):
     
     return stats
 
-def calcular_indice_economico_parquet(path, columna):
-    """Calcula el indice leyendo solo columnas necesarias por row groups."""
-    parquet = pq.ParquetFile(path)
-    cols = set(parquet.schema_arrow.names)
-    necesarias = {columna, "propina", "num_pasajeros"}
-    if not necesarias.issubset(cols):
-        raise ValueError(
-            f"{path} no contiene columnas necesarias: {sorted(necesarias)}"
-        )
+class AgregadorIndiceEconomico(Consumidor):
+    """Sumas de propina/pasajeros y volumen por `columna`, para el escaneo compartido."""
+
+    def __init__(self, columna):
+        self.columna = columna
+        self.columnas = [columna, "propina", "num_pasajeros"]
+        self.partes = []
 
-    partes = []
-    for i in range(parquet.metadata.num_row_groups):
-        chunk = parquet.read_row_group(
-            i, columns=[columna, "propina", "num_pasajeros"]
-        ).to_pandas()
+    def procesar(self, chunk):
+        columna = self.columna
         chunk = chunk.dropna(subset=[columna])
         stats = (
             chunk.groupby(columna, observed=True)
@@ -178,32 +176,61 @@ def calcular_indice_economico_parquet(path, columna):
             )
             .reset_index()
         )
-        partes.append(stats)
-
-    if not partes:
-        return pd.DataFrame(columns=[columna, "Poder_Adquisitivo"])
-
-    agregado = (
-        pd.concat(partes, ignore_index=True)
-        .groupby(columna, observed=True)
-        .agg(
-            propina_sum=("propina_sum", "sum"),
-            pasajeros_sum=("pasajeros_sum", "sum"),
-            volumen_viajes=("volumen_viajes", "sum"),
+        self.partes.append(stats)
+
+    def finalizar(self, info):
+        columna = self.columna
+        if not self.partes:
+            return pd.DataFrame(columns=[columna, "Poder_Adquisitivo"])
+
+        agregado = (
+            pd.concat(self.partes, ignore_index=True)
+            .groupby(columna, observed=True)
+            .agg(
+                propina_sum=("propina_sum", "sum"),
+                pasajeros_sum=("pasajeros_sum", "sum"),
+                volumen_viajes=("volumen_viajes", "sum"),
+            )
+            .reset_index()
         )
-        .reset_index()
-    )
+        self.partes = []
 
-    agregado["propina_media"] = agregado["propina_sum"] / agregado["volumen_viajes"]
-    agregado["pasajeros_medios"] = agregado["pasajeros_sum"] / agregado["volumen_viajes"]
-    agregado["Poder_Adquisitivo"] = (
-        normalize(agregado["propina_media"]) * 0.4
-        + normalize(agregado["pasajeros_medios"]) * 0.3
-        + normalize(agregado["volumen_viajes"]) * 0.3
-    ) * 100
-    return agregado[[columna, "Poder_Adquisitivo"]]
+        agregado["propina_media"] = agregado["propina_sum"] / agregado["volumen_viajes"]
+        agregado["pasajeros_medios"] = agregado["pasajeros_sum"] / agregado["volumen_viajes"]
+        agregado["Poder_Adquisitivo"] = (
+            normalize(agregado["propina_media"]) * 0.4
+            + normalize(agregado["pasajeros_medios"]) * 0.3
+            + normalize(agregado["volumen_viajes"]) * 0.3
+        ) * 100
+        return agregado[[columna, "Poder_Adquisitivo"]]
 
-def generar_mapa_plotly():
+
+def calcular_indices_parquet(path, columnas):
+    """
+    Índice económico para varias columnas de agrupación con una sola lectura
+    del parquet (un consumidor por columna en el escaneo compartido).
+    """
+    disponibles = set(pq.ParquetFile(path).schema_arrow.names)
+    escaneo = EscaneoCompartido(path)
+    for columna in columnas:
+        necesarias = {columna, "propina", "num_pasajeros"}
+        if not necesarias.issubset(disponibles):
+            raise ValueError(
+                f"{path} no contiene columnas necesarias: {sorted(necesarias)}"
+            )
+        escaneo.registrar(columna, AgregadorIndiceEconomico(columna))
+    return escaneo.ejecutar(verbose=False)
+
+
+def calcular_indice_economico_parquet(path, columna):
+    """Calcula el indice leyendo solo columnas necesarias por row groups."""
+    return calcular_indices_parquet(path, [columna])[columna]
+
+def generar_mapa_plotly(stats_barrios=None, stats_zonas=None):
+    """
+    Genera el mapa. Si no se pasan los índices (p. ej. desde el escaneo
+    compartido), se calculan aquí con una sola lectura de datos_final.
+    """
     # 1. Cargar geometrías
     print("Cargando geometrías...")
     geo_barrios = obtener_geojson(GEOJSON_URL, GEOJSON_LOCAL_PATH)
@@ -213,8 +240,9 @@ def generar_mapa_plotly():
 
     # 2. Calcular índice económico
     print("Calculando métricas por barrios y zonas (modo eficiente)...")
-    stats_barrios = calcular_indice_economico_parquet(DATA_PATH, "origen_barrio")
-    stats_zonas = calcular_indice_economico_parquet(DATA_PATH, "origen_id")
+    if stats_barrios is None or stats_zonas is None:
+        indices = calcular_indices_parquet(DATA_PATH, ["origen_barrio", "origen_id"])
+        stats_barrios, stats_zonas = indices["origen_barrio"], indices["origen_id"]
 
     # 6. CREAR EL MAPA COROPLÉTICO
     print("Generando mapa interactivo...")
@@ -1,9 +1,23 @@
+import http.client
+import os
 import re
+import struct
+import time
+import urllib.error
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 CLOUDFRONT_BASE = "https://d37ci6vzurychx.cloudfront.net/trip-data"
 
+# Descargas en paralelo (acotado para no saturar CloudFront ni el disco)
+MAX_WORKERS = 4
+REINTENTOS = 4
+BACKOFF_S = 2.0
+TIMEOUT_S = 60
+BLOQUE = 256 * 1024
+MAGIC_PARQUET = b"PAR1"
+
 
 def month_range(start: str, end: str):
     def parse(s):
@@ -26,21 +40,137 @@ def month_range(start: str, end: str):
     return out
 
 
-def download(service: str, start: str, end: str, raw_dir: Path):
-    months = month_range(start, end)
-    for mm in months:
+def parquet_valido(path: Path, tamano_esperado: int | None = None) -> bool:
+    """
+    Comprobación barata de integridad: tamaño esperado (si se conoce), magic
+    PAR1 al principio y al final, y longitud del footer coherente con el
+    tamaño del fichero. Un parquet truncado no pasa este control.
+    """
+    try:
+        tamano = path.stat().st_size
+        if tamano_esperado is not None and tamano != tamano_esperado:
+            return False
+        if tamano < 12:
+            return False
+        with open(path, "rb") as f:
+            if f.read(4) != MAGIC_PARQUET:
+                return False
+            f.seek(-8, os.SEEK_END)
+            (len_footer,) = struct.unpack("<I", f.read(4))
+            if f.read(4) != MAGIC_PARQUET:
+                return False
+        return 0 < len_footer <= tamano - 12
+    except OSError:
+        return False
+
+
+def _tamano_total(response, offset: int) -> int | None:
+    """Tamaño total del recurso a partir de Content-Range o Content-Length."""
+    rango = response.headers.get("Content-Range")
+    if rango and "/" in rango:
+        total = rango.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    longitud = response.headers.get("Content-Length")
+    return int(longitud) + offset if longitud else None
+
+
+def _descargar_reanudable(url: str, out: Path, timeout: int = TIMEOUT_S) -> None:
+    """
+    Descarga url en out.part, reanudando con Range si ya hay bytes previos,
+    valida el parquet y lo publica con un rename atómico.
+    """
+    tmp = out.with_name(out.name + ".part")
+    offset = tmp.stat().st_size if tmp.exists() else 0
+
+    req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+    if offset:
+        req.add_header("Range", f"bytes={offset}-")
+
+    try:
+        response = urllib.request.urlopen(req, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        # 416: el .part ya tiene todo el fichero
+        if e.code != 416 or not parquet_valido(tmp):
+            raise
+        os.replace(tmp, out)
+        return
+
+    with response:
+        if offset and response.status != 206:
+            # El servidor ignora Range: se empieza desde cero
+            offset = 0
+        total = _tamano_total(response, offset)
+        with open(tmp, "ab" if offset else "wb") as f:
+            for bloque in iter(lambda: response.read(BLOQUE), b""):
+                f.write(bloque)
+
+    # Corte a medias: se conserva el .part para reanudar en el siguiente intento
+    recibido = tmp.stat().st_size
+    if total is not None and recibido < total:
+        raise ConnectionError(f"descarga interrumpida ({recibido}/{total} bytes)")
+    if not parquet_valido(tmp, total):
+        tmp.unlink(missing_ok=True)
+        raise ValueError(f"descarga corrupta o incompleta ({out.name})")
+    os.replace(tmp, out)
+
+
+def _es_reintentable(error: Exception) -> bool:
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code in (408, 429) or error.code >= 500
+    return isinstance(error, (urllib.error.URLError, http.client.HTTPException, OSError, ValueError))
+
+
+def descargar_archivo(
+    url: str, out: Path, reintentos: int = REINTENTOS, backoff: float = BACKOFF_S
+) -> str:
+    """Descarga un fichero con reintentos y backoff exponencial. Devuelve un mensaje de estado."""
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    if out.exists():
+        if parquet_valido(out):
+            return f"SKIP {out.name}"
+        # Fichero truncado de una ejecución anterior: se descarta
+        out.unlink()
+
+    for intento in range(1, reintentos + 1):
+        try:
+            _descargar_reanudable(url, out)
+            return f"OK   {out.name} ({out.stat().st_size / 1024**2:.1f} MB)"
+        except Exception as e:
+            if intento == reintentos or not _es_reintentable(e):
+                return f"FAIL {out.name}: {e}"
+            time.sleep(backoff * 2 ** (intento - 1))
+
+
+def download(
+    service: str,
+    start: str,
+    end: str,
+    raw_dir: Path,
+    base_url: str = CLOUDFRONT_BASE,
+    max_workers: int = MAX_WORKERS,
+):
+    """
+    Descarga los meses [start, end] de un servicio en paralelo (pool acotado).
+    Cada fichero se reanuda si quedó a medias y se valida antes de darlo por bueno.
+    """
+    tareas = {}
+    for mm in month_range(start, end):
         year = mm[:4]
         fname = f"{service}_tripdata_{mm}.parquet"
-        url = f"{CLOUDFRONT_BASE}/{fname}"
-        out = raw_dir / "tlc" / service / year / fname
-        out.parent.mkdir(parents=True, exist_ok=True)
-
-        if out.exists():
-            print(f"SKIP {fname}")
-            continue
+        tareas[fname] = (f"{base_url}/{fname}", raw_dir / "tlc" / service / year / fname)
 
-        print(f"DESCARGANDO {fname}")
-        urllib.request.urlretrieve(url, out)
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futuros = {
+            pool.submit(descargar_archivo, url, out): fname
+            for fname, (url, out) in tareas.items()
+        }
+        for futuro in as_completed(futuros):
+            msg = futuro.result()
+            resultados[futuros[futuro]] = msg
+            print(msg)
+    return resultados
 
 
 # Tal vez debería hacerse en otro archivo : download_lookup?
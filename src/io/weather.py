@@ -1,10 +1,29 @@
 # weather.py
+import hashlib
 import pandas as pd
+import urllib.error
 import urllib.request
 import json
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+API_URLS = {
+    "archive": "https://archive-api.open-meteo.com/v1/archive",
+    "historical_forecast": "https://historical-forecast-api.open-meteo.com/v1/forecast",
+}
+HOURLY_VARS = "temperature_2m,precipitation,rain,snowfall,windspeed_10m"
+
+# Concurrencia acotada + ritmo global de peticiones (antes: sleep(0.35) en serie)
+MAX_WORKERS = 4
+INTERVALO_MIN_S = 0.35
+REINTENTOS = 4
+BACKOFF_S = 1.0
+# El archivo de Open-Meteo va con unos días de retraso: no se cachean meses recientes
+DIAS_RETRASO_ARCHIVO = 7
+
 # Coordenadas representativas
 BOROUGH_COORDS = {
     "Manhattan":     {"lat": 40.7831, "lon": -73.9712},  # Central Park
@@ -28,12 +47,99 @@ def _month_start_end(yyyy_mm: str) -> tuple[str, str]:
     end = start + pd.offsets.MonthEnd(1)
     return start.date().isoformat(), end.date().isoformat()
 
+
+class _LimitadorRitmo:
+    """Garantiza un intervalo mínimo entre peticiones, compartido por todos los hilos."""
+
+    def __init__(self, intervalo_s: float):
+        self.intervalo_s = intervalo_s
+        self._lock = threading.Lock()
+        self._siguiente = 0.0
+
+    def esperar(self) -> None:
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self._siguiente)
+            self._siguiente = turno + self.intervalo_s
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+
+def _get_json(url: str, limitador: _LimitadorRitmo, reintentos: int = REINTENTOS) -> dict:
+    """GET con reintentos y backoff exponencial ante errores transitorios (429, 5xx, red)."""
+    for intento in range(1, reintentos + 1):
+        limitador.esperar()
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                return json.loads(response.read().decode())
+        except urllib.error.HTTPError as e:
+            transitorio = e.code == 429 or e.code >= 500
+            if not transitorio or intento == reintentos:
+                raise
+        except (urllib.error.URLError, TimeoutError):
+            if intento == reintentos:
+                raise
+        time.sleep(BACKOFF_S * 2 ** (intento - 1))
+
+
+def _ruta_cache(cache_dir: Path, base_url: str, borough: str, coords: dict, yyyy_mm: str) -> Path:
+    """
+    JSON cacheado de un (borough, mes). El nombre lleva un hash de la fuente
+    (URL de la API, variables horarias y coordenadas): si cambia cualquiera
+    de ellas no se reutiliza lo descargado de otra fuente.
+    """
+    fuente = f"{base_url}|{HOURLY_VARS}|{coords['lat']},{coords['lon']}"
+    clave = hashlib.sha256(fuente.encode()).hexdigest()[:12]
+    return cache_dir / f"{borough.lower().replace(' ', '_')}_{yyyy_mm}_{clave}.json"
+
+
+def _mes_cerrado(yyyy_mm: str) -> bool:
+    """True si el mes ya está completo en el archivo histórico (se puede cachear)."""
+    _, fin = _month_start_end(yyyy_mm)
+    limite = pd.Timestamp.now().normalize() - pd.Timedelta(days=DIAS_RETRASO_ARCHIVO)
+    return pd.Timestamp(fin) < limite
+
+
+def _obtener_mes(
+    base_url: str, borough: str, coords: dict, yyyy_mm: str,
+    cache_dir: Path, limitador: _LimitadorRitmo,
+) -> pd.DataFrame | None:
+    """Clima horario de un (borough, mes): de la caché en disco o de la API."""
+    ruta = _ruta_cache(cache_dir, base_url, borough, coords, yyyy_mm)
+    if ruta.exists():
+        with open(ruta, encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        s, e = _month_start_end(yyyy_mm)
+        url = (
+            f"{base_url}?"
+            f"latitude={coords['lat']}&longitude={coords['lon']}&"
+            f"start_date={s}&end_date={e}&"
+            f"hourly={HOURLY_VARS}&"
+            f"timezone=America%2FNew_York"
+        )
+        data = _get_json(url, limitador)
+        if _mes_cerrado(yyyy_mm):
+            # Escritura atómica para no dejar JSON a medias en la caché
+            tmp = ruta.with_name(ruta.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, ruta)
+
+    # Si no hay hourly (raro), skip
+    if "hourly" not in data or "time" not in data["hourly"]:
+        return None
+    return pd.DataFrame(data["hourly"])
+
 def download_weather_data(
     start_date: str,
     end_date: str,
     output_path: Path,
     overwrite: bool = False,
     api: str = "archive",  # "archive" o "historical_forecast"
+    base_url: str | None = None,
+    cache_dir: Path | None = None,
+    max_workers: int = MAX_WORKERS,
 ):
     """
     Descarga clima horario para varios boroughs y genera dataset enriquecible por hora.
@@ -45,66 +151,64 @@ def download_weather_data(
       - api:
           "archive" -> https://archive-api.open-meteo.com/v1/archive
           "historical_forecast" -> https://historical-forecast-api.open-meteo.com/v1/forecast
+      - base_url: sustituye la URL de la API (p. ej. un mock local)
+      - cache_dir: caché JSON por (fuente, borough, mes); por defecto output_path.parent / "cache".
+        Al ampliar el rango solo se piden los meses que faltan.
+      - max_workers: peticiones simultáneas (el ritmo global lo marca INTERVALO_MIN_S)
     """
     if output_path.exists() and not overwrite:
         print(f"SKIP Weather ({output_path.name})")
         return
 
-    if api == "historical_forecast":
-        base_url = "https://historical-forecast-api.open-meteo.com/v1/forecast"
-    else:
-        base_url = "https://archive-api.open-meteo.com/v1/archive"
+    base_url = base_url or API_URLS.get(api, API_URLS["archive"])
+    cache_dir = Path(cache_dir) if cache_dir else output_path.parent / "cache"
+    cache_dir.mkdir(parents=True, exist_ok=True)
 
     print(" Descargando Clima ...")
     months = _iter_months(start_date, end_date)
+    limitador = _LimitadorRitmo(INTERVALO_MIN_S)
+
+    partes = {borough: {} for borough in BOROUGH_COORDS}
+    fallos = {borough: [] for borough in BOROUGH_COORDS}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futuros = {
+            pool.submit(_obtener_mes, base_url, borough, coords, mm, cache_dir, limitador): (borough, mm)
+            for borough, coords in BOROUGH_COORDS.items()
+            for mm in months
+        }
+        for futuro in as_completed(futuros):
+            borough, mm = futuros[futuro]
+            try:
+                df_temp = futuro.result()
+            except Exception as e:
+                # Un mes fallido ya no tira el borough entero
+                fallos[borough].append(f"{mm} ({e})")
+                continue
+            if df_temp is not None:
+                partes[borough][mm] = df_temp
 
     dfs = []
 
-    for borough, coords in BOROUGH_COORDS.items():
+    for borough in BOROUGH_COORDS:
         print(f"   -> {borough}...", end=" ")
+        dfs_borough = [partes[borough][mm] for mm in months if mm in partes[borough]]
 
-        try:
-            dfs_borough = []
-
-            for mm in months:
-                s, e = _month_start_end(mm)
-
-                url = (
-                    f"{base_url}?"
-                    f"latitude={coords['lat']}&longitude={coords['lon']}&"
-                    f"start_date={s}&end_date={e}&"
-                    f"hourly=temperature_2m,precipitation,rain,snowfall,windspeed_10m&"
-                    f"timezone=America%2FNew_York"
-                )
-
-                with urllib.request.urlopen(url) as response:
-                    data = json.loads(response.read().decode())
+        if not dfs_borough:
+            print("NO DATA" + (f" (errores: {', '.join(fallos[borough])})" if fallos[borough] else ""))
+            continue
 
-                # Si no hay hourly (raro), skip
-                if "hourly" not in data or "time" not in data["hourly"]:
-                    continue
+        df_b = pd.concat(dfs_borough, ignore_index=True)
+        df_b["fecha_hora"] = pd.to_datetime(df_b["time"])
+        df_b.drop(columns=["time"], inplace=True)
+        df_b["borough"] = borough
 
-                df_temp = pd.DataFrame(data["hourly"])
-                dfs_borough.append(df_temp)
-
-                # Pausa para no saturar API
-                time.sleep(0.35)
-
-            if not dfs_borough:
-                print("NO DATA")
-                continue
-
-            df_b = pd.concat(dfs_borough, ignore_index=True)
-            df_b["fecha_hora"] = pd.to_datetime(df_b["time"])
-            df_b.drop(columns=["time"], inplace=True)
-            df_b["borough"] = borough
-
-            dfs.append(df_b)
+        dfs.append(df_b)
+        if fallos[borough]:
+            print(f"OK ({len(dfs_borough)}/{len(months)} meses; fallan: {', '.join(fallos[borough])})")
+        else:
             print("OK")
 
-        except Exception as e:
-            print(f"ERROR: {e}")
-
     if not dfs:
         print(" No se pudo descargar clima (dfs vacío).")
         return
@@ -0,0 +1,276 @@
+# src/modelos/lotes_parquet.py
+"""
+Entrenamiento de las redes densas (P2 mlp / reentrenar_mlp, P4 reentrenar_red_p4,
+P5 red_neuronal) leyendo los parquets por row groups en vez de cargarlos enteros.
+
+Antes cada script leía train/val/test completos con pandas y los pasaba a
+arrays float32 densos antes del fit (P4 además concatenaba los tres
+splits), así que la memoria crecía con el dataset. Aquí:
+
+  - LotesParquet (un keras.utils.PyDataset) decodifica los row groups por
+    bloques de `grupos_por_bloque`, les aplica `preparar` (el scaler y el
+    encoder ya guardados → arrays float32/int32) y sirve los lotes. Con
+    shuffle, en cada época se baraja el orden de los row groups y las filas
+    dentro de cada bloque; como los splits vienen ordenados por zona o por
+    tiempo, mezclar varios row groups por bloque evita lotes de una sola
+    zona. En memoria solo hay dos bloques (el actual y el siguiente).
+  - ajustar_scaler y valores_unicos ajustan el StandardScaler (partial_fit)
+    y las clases del LabelEncoder recorriendo los row groups, sin tener el
+    split entero en memoria.
+  - con `fraccion` se toma una muestra fija de cada row group (la misma en
+    todas las épocas), en lugar de leer el fichero y hacer .sample().
+  - Rendimiento (callback) y medir dan las muestras por segundo del
+    entrenamiento y del lector solo.
+
+    ds_train = LotesParquet(RUTA_TRAIN, preparar, batch_size=1024, columnas=COLUMNAS,
+                            shuffle=True, pesos_clase={0: 0.5, 1: 1.0})
+    model.fit(ds_train, validation_data=ds_val, callbacks=[Rendimiento(ds_train)])
+
+keras no admite class_weight con un PyDataset, por eso los pesos de clase
+van como sample_weight en cada lote (pesos_clase).
+
+Uso (muestras/s del lector, sin modelo):
+    python -m src.modelos.lotes_parquet data/processed/tlc_clean/problema2/features/train.parquet --objetivo target
+"""
+
+import argparse
+import math
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import keras
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sklearn.preprocessing import StandardScaler
+
+GRUPOS_POR_BLOQUE = 4
+
+
+def _lista(rutas):
+    return [Path(rutas)] if isinstance(rutas, (str, Path)) else [Path(r) for r in rutas]
+
+
+def grupos_parquet(rutas) -> list:
+    """(ruta, row group, filas) de cada row group de los ficheros, en orden."""
+    grupos = []
+    for ruta in _lista(rutas):
+        metadata = pq.ParquetFile(ruta).metadata
+        grupos += [(ruta, rg, metadata.row_group(rg).num_rows) for rg in range(metadata.num_row_groups)]
+    return grupos
+
+
+def filas_muestra(filas: int, fraccion) -> int:
+    return filas if fraccion is None else int(round(filas * min(fraccion, 1.0)))
+
+
+def leer_grupo(fichero: pq.ParquetFile, rg: int, columnas=None, fraccion=None, semilla=42, indice=0) -> pd.DataFrame:
+    """Un row group como DataFrame; con fraccion, la muestra fija de ese grupo (según semilla e índice)."""
+    df = fichero.read_row_group(rg, columns=columnas).to_pandas()
+    if fraccion is not None and fraccion < 1:
+        rng = np.random.default_rng([semilla, indice])
+        df = df.iloc[np.sort(rng.choice(len(df), filas_muestra(len(df), fraccion), replace=False))]
+    return df.reset_index(drop=True)
+
+
+def recorrer(rutas, columnas=None, fraccion=None, semilla=42):
+    """Row groups de los ficheros, uno a uno, como DataFrames (con la misma muestra que LotesParquet)."""
+    ficheros = {}
+    for indice, (ruta, rg, _) in enumerate(grupos_parquet(rutas)):
+        fichero = ficheros.setdefault(ruta, pq.ParquetFile(ruta))
+        yield leer_grupo(fichero, rg, columnas, fraccion, semilla, indice)
+
+
+def ajustar_scaler(rutas, preparar, columnas=None, fraccion=None, semilla=42, scaler=None):
+    """StandardScaler ajustado con partial_fit sobre preparar(df) de cada row group."""
+    scaler = scaler if scaler is not None else StandardScaler()
+    for df in recorrer(rutas, columnas, fraccion, semilla):
+        if len(df):
+            scaler.partial_fit(preparar(df))
+    return scaler
+
+
+def valores_unicos(rutas, columna, transformar=None) -> np.ndarray:
+    """Valores distintos (ordenados) de una columna, para ajustar un LabelEncoder."""
+    unicos = []
+    for df in recorrer(rutas, [columna]):
+        valores = df[columna] if transformar is None else transformar(df[columna])
+        unicos.append(np.unique(valores.to_numpy()))
+    return np.unique(np.concatenate(unicos)) if unicos else np.empty(0)
+
+
+def _cortar(x, a, b):
+    if isinstance(x, (list, tuple)):
+        return [v[a:b] for v in x]
+    return x[a:b]
+
+
+def _unir(partes):
+    if len(partes) == 1:
+        return partes[0]
+    if isinstance(partes[0], list):
+        return [np.concatenate(vs) for vs in zip(*partes)]
+    return np.concatenate(partes)
+
+
+def _tomar(x, indices):
+    if isinstance(x, (list, tuple)):
+        return [v[indices] for v in x]
+    return x[indices]
+
+
+class LotesParquet(keras.utils.PyDataset):
+    """
+    Lotes de uno o varios parquets, por bloques de row groups.
+
+    preparar(df) -> (x, y): x es un array o una lista de arrays (varias
+    entradas del modelo), alineados con las filas de df. Los lotes tienen
+    batch_size filas salvo el último (la forma no cambia entre bloques).
+    Sin shuffle el orden es el de los ficheros, así que predict va alineado
+    con objetivos().
+    """
+
+    def __init__(self, rutas, preparar, batch_size=1024, columnas=None, shuffle=False,
+                 grupos_por_bloque=GRUPOS_POR_BLOQUE, fraccion=None, pesos_clase=None,
+                 semilla=42, **kwargs):
+        super().__init__(**kwargs)
+        self.rutas = _lista(rutas)
+        self.preparar = preparar
+        self.batch_size = batch_size
+        self.columnas = columnas
+        self.shuffle = shuffle
+        self.grupos_por_bloque = grupos_por_bloque
+        self.fraccion = fraccion
+        self.semilla = semilla
+        self.pesos_clase = pesos_clase
+        self.grupos = grupos_parquet(self.rutas)
+        self.filas = np.array([filas_muestra(n, fraccion) for _, _, n in self.grupos], dtype=np.int64)
+        self.num_filas = int(self.filas.sum())
+        self._ficheros = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.epoca = 0
+        self._planificar()
+
+    def _planificar(self):
+        """Orden de los row groups en esta época, agrupados en bloques."""
+        orden = np.arange(len(self.grupos))
+        if self.shuffle:
+            orden = np.random.default_rng([self.semilla, self.epoca]).permutation(orden)
+        k = self.grupos_por_bloque
+        self.bloques = [orden[i:i + k] for i in range(0, len(orden), k)]
+        self.limites = np.r_[0, np.cumsum([self.filas[b].sum() for b in self.bloques])]
+        self._cache.clear()
+
+    def _fichero(self, ruta):
+        if ruta not in self._ficheros:
+            self._ficheros[ruta] = pq.ParquetFile(ruta)
+        return self._ficheros[ruta]
+
+    def _leer_bloque(self, b):
+        partes = []
+        for g in self.bloques[b]:
+            ruta, rg, _ = self.grupos[g]
+            partes.append(leer_grupo(self._fichero(ruta), rg, self.columnas, self.fraccion, self.semilla, int(g)))
+        x, y = self.preparar(pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0])
+        y = np.asarray(y)
+        if self.shuffle:
+            perm = np.random.default_rng([self.semilla, self.epoca, b]).permutation(len(y))
+            x, y = _tomar(x, perm), y[perm]
+        return x, y
+
+    def _bloque(self, b):
+        with self._lock:
+            if b not in self._cache:
+                self._cache[b] = self._leer_bloque(b)
+                while len(self._cache) > 2:
+                    self._cache.popitem(last=False)
+            return self._cache[b]
+
+    def __len__(self):
+        return math.ceil(self.num_filas / self.batch_size)
+
+    def __getitem__(self, i):
+        a, fin = i * self.batch_size, min((i + 1) * self.batch_size, self.num_filas)
+        b = int(np.searchsorted(self.limites, a, side='right')) - 1
+        xs, ys = [], []
+        while a < fin:
+            x, y = self._bloque(b)
+            ini, hasta = self.limites[b], min(fin, self.limites[b + 1])
+            xs.append(_cortar(x, a - ini, hasta - ini))
+            ys.append(y[a - ini:hasta - ini])
+            a, b = hasta, b + 1
+        x, y = _unir(xs), _unir(ys)
+        if self.pesos_clase is None:
+            return x, y
+        clases = np.array(sorted(self.pesos_clase))
+        pesos = np.array([self.pesos_clase[c] for c in clases], dtype=np.float32)
+        return x, y, pesos[np.searchsorted(clases, y)]
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.epoca += 1
+            self._planificar()
+
+    def objetivos(self) -> np.ndarray:
+        """y de todas las filas en el orden de los lotes (el de predict si no hay shuffle)."""
+        return np.concatenate([self._leer_bloque(b)[1] for b in range(len(self.bloques))])
+
+
+class Rendimiento(keras.callbacks.Callback):
+    """Muestras por segundo de cada época de entrenamiento (lectura + preparar + paso del modelo)."""
+
+    def __init__(self, dataset: LotesParquet):
+        super().__init__()
+        self.dataset = dataset
+        self.muestras_s = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._t0 = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        segundos = time.perf_counter() - self._t0
+        self.muestras_s.append(self.dataset.num_filas / segundos)
+        print(f"  Época {epoch + 1}: {self.muestras_s[-1]:,.0f} muestras/s ({segundos:.1f}s)")
+
+
+def medir(dataset: LotesParquet, max_lotes=None) -> dict:
+    """Muestras/s del lector solo (sin modelo) recorriendo los lotes en orden."""
+    n_lotes = len(dataset) if max_lotes is None else min(max_lotes, len(dataset))
+    t0 = time.perf_counter()
+    muestras = 0
+    for i in range(n_lotes):
+        muestras += len(dataset[i][1])
+    segundos = time.perf_counter() - t0
+    return {'lotes': n_lotes, 'muestras': muestras, 'segundos': round(segundos, 3),
+            'muestras_s': muestras / segundos if segundos else float('inf')}
+
+
+def main():
+    parser = argparse.ArgumentParser("Muestras/s del lector de parquet por row groups")
+    parser.add_argument("rutas", nargs="+", type=Path)
+    parser.add_argument("--objetivo", required=True, help="columna target")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--grupos-por-bloque", type=int, default=GRUPOS_POR_BLOQUE)
+    parser.add_argument("--lotes", type=int, default=None, help="máximo de lotes a leer")
+    args = parser.parse_args()
+
+    esquema = pq.read_schema(args.rutas[0])
+    numerica = lambda t: pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_boolean(t)
+    columnas = [c for c in esquema.names if c != args.objetivo and numerica(esquema.field(c).type)]
+
+    def preparar(df):
+        return df[columnas].fillna(0).to_numpy(dtype=np.float32), df[args.objetivo].to_numpy(dtype=np.float32)
+
+    ds = LotesParquet(args.rutas, preparar, args.batch_size, columnas=columnas + [args.objetivo],
+                      shuffle=True, grupos_por_bloque=args.grupos_por_bloque)
+    r = medir(ds, args.lotes)
+    print(f"{len(ds.grupos)} row groups, {ds.num_filas:,} filas, {len(columnas)} features")
+    print(f"{r['muestras']:,} muestras en {r['lotes']} lotes: {r['segundos']:.2f}s → {r['muestras_s']:,.0f} muestras/s")
+
+
+if __name__ == "__main__":
+    main()
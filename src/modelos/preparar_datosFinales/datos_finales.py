@@ -1,8 +1,18 @@
-import pandas as pd
+# Uso (desde la raíz del repo): python -m src.modelos.preparar_datosFinales.datos_finales
+import numpy as np
 import os
 import glob
+import tempfile
+import zlib
 from pathlib import Path
 
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from src.processing.escritura import EscritorParquet, esquema_compacto
+from src.processing.ordenacion import declarado_ordenado, leer_run, mezclar_ordenados, volcar_ordenados
+
 # --- CONFIGURACIÓN DE RUTAS ---
 BASE_DIR = Path(__file__).resolve().parents[3]
 INPUT_DIR = os.path.join(BASE_DIR, 'data', 'processed', 'tlc_clean')
@@ -11,10 +21,17 @@ OUTPUT_FILE = os.path.join(INPUT_DIR, 'dataset_final.parquet')
 
 # Muestra del 40% de los datos para cada mes (1=100%, 0.4=40%, etc.)
 SAMPLE_RATE = 0.4 
+# Semilla base del muestreo: cada row group usa (SEMILLA, servicio, año, mes, row group)
+SEMILLA = 42
+# Memoria máxima para ordenar un mes que no venga ordenado (el resto se vuelca a disco)
+PRESUPUESTO_MB = 512
 
-def carga_datos_hibrida(input_dir, output_file, anio_actual, anio_anterior):
-    lista_muestras = []
-    
+def archivos_entrada(input_dir, anio_actual, anio_anterior):
+    """
+    Devuelve [(tipo, anio, mes, ruta), ...] con los meses limpios que entran en el
+    dataset híbrido: meses 1-11 del año actual y mes 12 del anterior.
+    """
+    seleccion = []
     for tipo in ['yellow', 'fhvhv']:
         # Definimos los objetivos: meses 1-11 del año actual y mes 12 del anterior
         objetivos = [
@@ -36,40 +53,120 @@ def carga_datos_hibrida(input_dir, output_file, anio_actual, anio_anterior):
 
                 # Solo procesamos si el mes está en nuestra lista de interés para ese año
                 if mes_archivo in meses_a_buscar:
-                    df_mes = pd.read_parquet(archivo)
-                    
-                    # 1. Aplicar Sampling
-                    df_sample = df_mes.sample(frac=SAMPLE_RATE, random_state=42)
-                    
-                    # 2. Etiquetado y limpieza de fecha
-                    df_sample['tipo_vehiculo'] = 'Yellow Taxi' if tipo == 'yellow' else 'VTC'
-                    df_sample['fecha_inicio'] = pd.to_datetime(df_sample['fecha_inicio'])
-                    
-                    # 3. Forzamos el mes_num para que diciembre (del año pasado) 
-                    # aparezca correctamente en las gráficas de este año
-                    df_sample['mes_num'] = mes_archivo
-                    
-                    lista_muestras.append(df_sample)
-                    print(f"Cargado Mes {mes_archivo} del año {anio_objetivo} para {tipo} con {len(df_sample):,} registros.")
-
-    # Concatenación y ordenación final
-    df_final = pd.concat(lista_muestras, ignore_index=True)
-
-    # --- ORDENACIÓN CRONOLÓGICA ---
-    print("\nOrdenando el dataset cronológicamente...")
-    # Ordenamos por la fecha completa (Año-Mes-Día Hora) para que sea exacto
-    df_final = df_final.sort_values(by=['fecha_inicio']).reset_index(drop=True)
-    
-    print(f"\nDataset Híbrido Creado: {len(df_final):,} registros totales.")
-
-    # --- EXPORTACIÓN A PARQUET ---
-    print(f"Guardando en: {output_file}...")
-    # Usamos motor 'pyarrow' o 'fastparquet' (por defecto suele ser snappy)
-    df_final.to_parquet(output_file, index=False, compression='snappy')
+                    seleccion.append((tipo, anio_objetivo, mes_archivo, archivo))
+    return seleccion
+
+def _esquema_salida(entradas):
+    """
+    Esquema común de todos los meses (unión de columnas, en orden de aparición
+    como hacía pd.concat) más tipo_vehiculo y mes_num, ya en formato compacto.
+    """
+    esquemas = [pq.read_schema(ruta) for *_, ruta in entradas]
+    esquema = pa.unify_schemas(esquemas, promote_options="permissive")
+    for nombre, tipo in (('tipo_vehiculo', pa.string()), ('mes_num', pa.int8())):
+        if nombre in esquema.names:
+            esquema = esquema.set(esquema.get_field_index(nombre), pa.field(nombre, tipo))
+        else:
+            esquema = esquema.append(pa.field(nombre, tipo))
+    return esquema_compacto(esquema.empty_table())
+
+
+def _alinear(tabla, esquema):
+    """Pone la tabla en el esquema común: columnas que faltan como nulos (como pd.concat)."""
+    columnas = []
+    for campo in esquema:
+        if campo.name in tabla.schema.names:
+            columna = tabla.column(campo.name)
+            if pa.types.is_dictionary(campo.type) and not pa.types.is_dictionary(columna.type):
+                columna = pc.dictionary_encode(columna)
+            columnas.append(columna.cast(campo.type, safe=False))
+        else:
+            columnas.append(pa.nulls(tabla.num_rows, campo.type))
+    return pa.Table.from_arrays(columnas, schema=esquema)
+
+
+def _muestra_row_groups(tipo, anio, mes, archivo, esquema):
+    """
+    Muestreo estratificado por row group: de cada row group se toma exactamente
+    round(n * SAMPLE_RATE) filas con una semilla propia, así la muestra es
+    reproducible y no hace falta tener el mes entero en memoria.
+    """
+    parquet = pq.ParquetFile(archivo)
+    etiqueta = 'Yellow Taxi' if tipo == 'yellow' else 'VTC'
+    for rg in range(parquet.num_row_groups):
+        tabla = parquet.read_row_group(rg)
+        n = tabla.num_rows
+        rng = np.random.default_rng([SEMILLA, zlib.crc32(tipo.encode()), anio, mes, rg])
+        idx = np.sort(rng.choice(n, size=int(round(n * SAMPLE_RATE)), replace=False))
+        tabla = tabla.take(idx)
+
+        # Etiquetado y mes_num forzado para que diciembre (del año pasado)
+        # aparezca correctamente en las gráficas de este año
+        for nombre, valor in (('tipo_vehiculo', pa.array([etiqueta] * len(idx), pa.string())),
+                              ('mes_num', pa.array(np.full(len(idx), mes, dtype=np.int8)))):
+            if nombre in tabla.schema.names:
+                tabla = tabla.set_column(tabla.schema.get_field_index(nombre), nombre, valor)
+            else:
+                tabla = tabla.append_column(nombre, valor)
+        yield _alinear(tabla, esquema)
+
+
+def _contar(bloques, tipo, anio, mes):
+    total = 0
+    for bloque in bloques:
+        total += bloque.num_rows
+        yield bloque
+    print(f"Cargado Mes {mes} del año {anio} para {tipo} con {total:,} registros.")
+
+
+def _mes_ordenado(tipo, anio, mes, archivo, esquema, tmp_dir):
+    """
+    Bloques muestreados de un mes, en orden cronológico. Los meses enriquecidos
+    ya vienen ordenados (lo declara el footer) y se leen en streaming. Si no,
+    la muestra se ordena aquí mismo, antes del merge, con la ordenación
+    externa (presupuesto PRESUPUESTO_MB) a un run en tmp_dir, y el merge lo
+    lee con memory-map: así los meses sin orden se ordenan de uno en uno y
+    no tienen cada uno su presupuesto en memoria a la vez durante el merge.
+    """
+    bloques = _muestra_row_groups(tipo, anio, mes, archivo, esquema)
+    if declarado_ordenado(archivo, 'fecha_inicio'):
+        return _contar(bloques, tipo, anio, mes)
+    run = Path(tmp_dir) / f"{tipo}_{anio}_{mes:02d}.arrow"
+    if volcar_ordenados(bloques, run, 'fecha_inicio', PRESUPUESTO_MB, tmp_dir) == 0:
+        return _contar([], tipo, anio, mes)
+    return _contar(leer_run(run), tipo, anio, mes)
+
+
+def carga_datos_hibrida(input_dir, output_file, anio_actual, anio_anterior):
+    """
+    Dataset híbrido (muestra de cada mes) ordenado cronológicamente, en streaming:
+    muestreo por row group, cada mes ordenado por separado y merge k-way de los
+    meses (src.processing.ordenacion) directamente al ParquetWriter. La memoria depende del tamaño de bloque
+    y del número de meses, no del tamaño total: en el merge cada mes tiene un
+    solo bloque en memoria (los que hubo que ordenar se leen de su run en disco).
+    """
+    entradas = archivos_entrada(input_dir, anio_actual, anio_anterior)
+    if not entradas:
+        print("No hay meses limpios que cargar.")
+        return 0
+
+    esquema = _esquema_salida(entradas)
+    total = 0
+    with tempfile.TemporaryDirectory(prefix="meses_", dir=Path(output_file).parent) as tmp:
+        fuentes = [_mes_ordenado(tipo, anio, mes, archivo, esquema, tmp) for tipo, anio, mes, archivo in entradas]
+
+        print(f"\nMezclando {len(fuentes)} meses en orden cronológico...")
+        print(f"Guardando en: {output_file}...")
+        # Esquema compacto con zstd y el orden por fecha declarado en el footer
+        with EscritorParquet(output_file, esquema, ordenado_por='fecha_inicio') as escritor:
+            for tramo in mezclar_ordenados(fuentes, 'fecha_inicio'):
+                escritor.escribir(tramo)
+                total += tramo.num_rows
+
+    print(f"\nDataset Híbrido Creado: {total:,} registros totales.")
     print("¡Hecho!")
-    
-    return df_final
+    return total
 
 if __name__ == "__main__":
     # Ejecutamos con tus parámetros
-   df_resultado = carga_datos_hibrida(INPUT_DIR, OUTPUT_FILE, anio_actual=2025, anio_anterior=2024)
\ No newline at end of file
+   total_registros = carga_datos_hibrida(INPUT_DIR, OUTPUT_FILE, anio_actual=2025, anio_anterior=2024)
\ No newline at end of file
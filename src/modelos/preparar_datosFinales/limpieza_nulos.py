@@ -1,3 +1,4 @@
+# Uso (desde la raíz del repo): python -m src.modelos.preparar_datosFinales.limpieza_nulos
 """Para preparar el dataset final de ConducIA, he implementado un proceso de limpieza de alta eficiencia diseñado para datasets masivos (2 millones de filas) evitando el desbordamiento de memoria RAM mediante procesamiento por bloques.
 
 La estrategia de limpieza aplicada se basa en tres pilares:
@@ -17,14 +18,26 @@ Este enfoque asegura que el modelo de IA aprenda de patrones de propina coherent
 import pandas as pd
 import numpy as np
 import os
-import pyarrow.parquet as pq
+import json
+from concurrent.futures import ProcessPoolExecutor
 import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.processing.escritura import EscritorParquet
 
 # --- CONFIGURACIÓN ---
 BASE_DIR = r'/mnt/c/Users/carla/Desktop/PD2/PD2-conducIA'
 DIRECTORIO_DATOS = os.path.join(BASE_DIR, 'data', 'processed', 'tlc_clean')
 INPUT_FILE = os.path.join(DIRECTORIO_DATOS, 'dataset_final.parquet')
 OUTPUT_FILE = os.path.join(DIRECTORIO_DATOS, 'datos_final.parquet')
+# Estadísticas de imputación calculadas sobre todo el dataset (reutilizables al reentrenar)
+ESTADISTICAS_FILE = os.path.join(DIRECTORIO_DATOS, 'datos_final_imputacion.json')
+
+# Row groups en paralelo (1 = en el proceso actual) y semilla de la imputación
+# de pasajeros: cada row group usa (SEMILLA, i), así el resultado no depende
+# del número de workers ni del orden en que terminan
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+SEMILLA = 42
 
 def asignar_franja_horaria(hora):
     if 0 <= hora < 6: return 'Madrugada'
@@ -33,72 +46,178 @@ def asignar_franja_horaria(hora):
     elif 16 <= hora < 20: return 'Tarde'
     else: return 'Noche'
 
-def limpiar_y_enriquecer_extremo_ram(ruta_input, ruta_output):
+# Tablas de lookup por hora (0-23) y por día de la semana (0-6): sustituyen a
+# los .apply fila a fila por un np.take
+FRANJAS = ['Madrugada', 'Mañana', 'Mediodia', 'Tarde', 'Noche']
+FRANJA_POR_HORA = np.array([FRANJAS.index(asignar_franja_horaria(h)) for h in range(24)], dtype=np.int8)
+FIN_SEMANA_POR_DIA = np.array([0, 0, 0, 0, 0, 1, 1], dtype=np.int8)
+HORA_SEN = np.sin(2 * np.pi * np.arange(24) / 24).astype('float32')
+HORA_COS = np.cos(2 * np.pi * np.arange(24) / 24).astype('float32')
+
+
+def _variables_temporales(df_chunk):
+    hora = df_chunk['fecha_inicio'].dt.hour.to_numpy()
+    dia_semana = df_chunk['fecha_inicio'].dt.dayofweek.to_numpy()
+    df_chunk['hora'] = hora
+    df_chunk['dia_semana'] = dia_semana
+    df_chunk['es_fin_semana'] = FIN_SEMANA_POR_DIA[dia_semana]
+    df_chunk['franja_horaria'] = pd.Categorical.from_codes(FRANJA_POR_HORA[hora], categories=FRANJAS)
+    df_chunk['hora_sen'] = HORA_SEN[hora]
+    df_chunk['hora_cos'] = HORA_COS[hora]
+
+
+def _limpiar_bloque(df_chunk, mediana_val, dist_pasajeros, rng):
+    # --- VARIABLES TEMPORALES ---
+    if 'fecha_inicio' in df_chunk.columns:
+        _variables_temporales(df_chunk)
+
+    # --- TRANSFORMACIONES ---
+    if 'tipo_pago' in df_chunk.columns:
+        df_chunk = df_chunk.drop(columns=['tipo_pago'])
+
+    # FILTRO INTELIGENTE:
+    # 1. Identificamos los "falsos ceros": propina es 0 Y el viaje fue mayor a $10
+    # (Asegúrate de que 'total_amount' sea el nombre correcto de tu columna de precio)
+    if mediana_val is not None and 'propina' in df_chunk.columns and 'total_amount' in df_chunk.columns:
+        es_falso_cero = (df_chunk['propina'] == 0) & (df_chunk['total_amount'] > 10)
+        df_chunk.loc[es_falso_cero, 'propina'] = mediana_val
+
+    # 2. Imputamos los Nulos (NaN) que ya existían
+    if mediana_val is not None and 'propina' in df_chunk.columns:
+        df_chunk['propina'] = df_chunk['propina'].fillna(mediana_val)
+
+    # 3. Limpieza de pasajeros
+    if len(dist_pasajeros) and 'num_pasajeros' in df_chunk.columns:
+        mask = df_chunk['num_pasajeros'].isna()
+        if mask.any():
+            df_chunk.loc[mask, 'num_pasajeros'] = rng.choice(
+                dist_pasajeros.index, size=mask.sum(), p=dist_pasajeros.values
+            )
+    return df_chunk
+
+
+def estadisticas_imputacion(ruta_input, filas_por_lote=1_000_000):
+    """
+    Primera pasada (solo columnas propina y num_pasajeros): histograma exacto
+    de propinas positivas y de pasajeros sobre TODOS los row groups. Las
+    propinas van en céntimos, así que el número de valores distintos es
+    pequeño y la mediana sale exacta (misma que Series.median) sin guardar filas.
+    """
+    parquet_file = pq.ParquetFile(ruta_input)
+    columnas = [c for c in ('propina', 'num_pasajeros') if c in parquet_file.schema_arrow.names]
+    hist_propina = pd.Series(dtype='int64')
+    hist_pasajeros = pd.Series(dtype='int64')
+
+    for lote in parquet_file.iter_batches(batch_size=filas_por_lote, columns=columnas):
+        if 'propina' in columnas:
+            propina = lote.column('propina').to_numpy(zero_copy_only=False).astype('float64')
+            valores, cuentas = np.unique(propina[propina > 0], return_counts=True)
+            hist_propina = hist_propina.add(pd.Series(cuentas, index=valores), fill_value=0)
+        if 'num_pasajeros' in columnas:
+            pasajeros = lote.column('num_pasajeros').to_pandas().value_counts()
+            hist_pasajeros = hist_pasajeros.add(pasajeros, fill_value=0)
+
+    estadisticas = {'mediana_propina': None, 'n_propinas_positivas': 0,
+                    'pasajeros_valores': [], 'pasajeros_probabilidades': []}
+    if len(hist_propina):
+        hist_propina = hist_propina.sort_index()
+        acumulado = hist_propina.to_numpy().cumsum()
+        n = int(acumulado[-1])
+        # Mediana con interpolación: media de los valores en las posiciones (n-1)//2 y n//2
+        bajo = hist_propina.index[np.searchsorted(acumulado, (n - 1) // 2 + 1)]
+        alto = hist_propina.index[np.searchsorted(acumulado, n // 2 + 1)]
+        estadisticas['mediana_propina'] = float((bajo + alto) / 2)
+        estadisticas['n_propinas_positivas'] = n
+    if len(hist_pasajeros):
+        dist = (hist_pasajeros / hist_pasajeros.sum()).sort_values(ascending=False, kind='stable')
+        estadisticas['pasajeros_valores'] = [float(v) for v in dist.index]
+        estadisticas['pasajeros_probabilidades'] = [float(v) for v in dist.to_numpy()]
+    return estadisticas
+
+
+def guardar_estadisticas(estadisticas, ruta):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(estadisticas, f, indent=2)
+
+
+def cargar_estadisticas(ruta):
+    with open(ruta, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _dist_pasajeros(estadisticas):
+    return pd.Series(estadisticas['pasajeros_probabilidades'], index=estadisticas['pasajeros_valores'], dtype='float64')
+
+
+def _procesar_row_group(ruta_input, i, mediana_val, dist_pasajeros):
+    """Trabajo de un worker: lee, limpia y devuelve el row group i como tabla Arrow."""
+    df_chunk = pq.ParquetFile(ruta_input).read_row_group(i).to_pandas()
+    rng = np.random.default_rng([SEMILLA, i])
+    df_chunk = _limpiar_bloque(df_chunk, mediana_val, dist_pasajeros, rng)
+    return pa.Table.from_pandas(df_chunk, preserve_index=False)
+
+
+def limpiar_y_enriquecer_extremo_ram(ruta_input, ruta_output, max_workers=MAX_WORKERS,
+                                     estadisticas=None, ruta_estadisticas=None):
+    """
+    Dos pasadas: estadísticas globales de imputación (o las dadas, p. ej. las
+    guardadas de un entrenamiento anterior) y limpieza por row groups.
+    Las estadísticas usadas se guardan en ruta_estadisticas si se indica.
+    """
     print("\n Limpieza Extrema RAM + Variables Temporales...")
     if not os.path.exists(ruta_input):
         print(f" Error: No se encuentra {ruta_input}")
         return
     
     parquet_file = pq.ParquetFile(ruta_input)
-    # Usamos una muestra para obtener la mediana de las propinas reales
-    df_mini_sample = parquet_file.read_row_group(0).to_pandas()
-    mediana_val = df_mini_sample[df_mini_sample['propina'] > 0]['propina'].median()
-    dist_pasajeros = df_mini_sample['num_pasajeros'].value_counts(normalize=True)
+    # Mediana de las propinas reales y distribución de pasajeros de todo el
+    # fichero (antes salían solo del row group 0)
+    if estadisticas is None:
+        estadisticas = estadisticas_imputacion(ruta_input)
+    if ruta_estadisticas is not None:
+        guardar_estadisticas(estadisticas, ruta_estadisticas)
+    mediana_val = estadisticas['mediana_propina']
+    dist_pasajeros = _dist_pasajeros(estadisticas)
     
-    print(f" Mediana calculada para imputar: ${mediana_val:.2f}")
-    del df_mini_sample 
+    if mediana_val is not None:
+        print(f" Mediana calculada para imputar: ${mediana_val:.2f} "
+              f"({estadisticas['n_propinas_positivas']:,} propinas positivas)")
 
-    writer = None
-    
-    try:
-        for i in range(parquet_file.num_row_groups):
-            df_chunk = parquet_file.read_row_group(i).to_pandas()
-
-            # --- VARIABLES TEMPORALES ---
-            if 'fecha_inicio' in df_chunk.columns:
-                df_chunk['hora'] = df_chunk['fecha_inicio'].dt.hour
-                df_chunk['dia_semana'] = df_chunk['fecha_inicio'].dt.dayofweek
-                df_chunk['es_fin_semana'] = df_chunk['dia_semana'].apply(lambda x: 1 if x >= 5 else 0).astype('int8')
-                df_chunk['franja_horaria'] = df_chunk['hora'].apply(asignar_franja_horaria)
-                df_chunk['hora_sen'] = np.sin(2 * np.pi * df_chunk['hora'] / 24).astype('float32')
-                df_chunk['hora_cos'] = np.cos(2 * np.pi * df_chunk['hora'] / 24).astype('float32')
-            
-            # --- TRANSFORMACIONES ---
-            if 'tipo_pago' in df_chunk.columns:
-                df_chunk = df_chunk.drop(columns=['tipo_pago'])
-            
-            # FILTRO INTELIGENTE:
-            # 1. Identificamos los "falsos ceros": propina es 0 Y el viaje fue mayor a $10
-            # (Asegúrate de que 'total_amount' sea el nombre correcto de tu columna de precio)
-            if 'propina' in df_chunk.columns and 'total_amount' in df_chunk.columns:
-                es_falso_cero = (df_chunk['propina'] == 0) & (df_chunk['total_amount'] > 10)
-                df_chunk.loc[es_falso_cero, 'propina'] = mediana_val
-                
-            # 2. Imputamos los Nulos (NaN) que ya existían
-            if 'propina' in df_chunk.columns:
-                df_chunk['propina'] = df_chunk['propina'].fillna(mediana_val)
-                
-            # 3. Limpieza de pasajeros
-            if 'num_pasajeros' in df_chunk.columns:
-                mask = df_chunk['num_pasajeros'].isna()
-                if mask.any():
-                    df_chunk.loc[mask, 'num_pasajeros'] = np.random.choice(
-                        dist_pasajeros.index, size=mask.sum(), p=dist_pasajeros.values
-                    )
+    # La entrada viene ordenada por fecha y se procesa en orden: datos_final
+    # queda agrupado en el tiempo y cada row group cubre un intervalo estrecho
+    # (min/max de fecha_inicio en el footer), lo que usa src.processing.lectura.scan
+    writer = EscritorParquet(ruta_output, ordenado_por='fecha_inicio')
+    n_grupos = parquet_file.num_row_groups
+
+    def resultados_en_orden():
+        if max_workers <= 1:
+            for i in range(n_grupos):
+                yield _procesar_row_group(ruta_input, i, mediana_val, dist_pasajeros)
+            return
+        # Ventana acotada de row groups en vuelo: la memoria no crece con el
+        # fichero y se escriben en el orden original aunque acaben desordenados
+        ventana = 2 * max_workers
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            pendientes = {}
+            for i in range(n_grupos):
+                pendientes[i] = pool.submit(_procesar_row_group, ruta_input, i, mediana_val, dist_pasajeros)
+                if len(pendientes) >= ventana:
+                    siguiente = min(pendientes)
+                    yield pendientes.pop(siguiente).result()
+            for siguiente in sorted(pendientes):
+                yield pendientes.pop(siguiente).result()
 
+    try:
+        for i, table in enumerate(resultados_en_orden()):
             # Guardado
-            table = pa.Table.from_pandas(df_chunk)
-            if writer is None:
-                writer = pq.ParquetWriter(ruta_output, table.schema)
-            writer.write_table(table)
-            
-            print(f" Bloque {i+1}/{parquet_file.num_row_groups} procesado.")
-            del df_chunk 
+            writer.escribir(table)
+            print(f" Bloque {i+1}/{n_grupos} procesado.")
+            del table
             
     finally:
-        if writer:
+        if writer.esquema is not None:
             writer.close()
             print(f" ¡ÉXITO! Archivo guardado en: {ruta_output}")
 
 if __name__ == "__main__":
-    limpiar_y_enriquecer_extremo_ram(INPUT_FILE, OUTPUT_FILE)
\ No newline at end of file
+    limpiar_y_enriquecer_extremo_ram(INPUT_FILE, OUTPUT_FILE, ruta_estadisticas=ESTADISTICAS_FILE)
\ No newline at end of file
@@ -1,7 +1,13 @@
+# Uso (desde la raíz del repo): python -m src.modelos.preparar_datosFinales.run_pipeline
+import argparse
 import os
 from pathlib import Path
-from src.modelos.preparar_datosFinales.datos_finales import carga_datos_hibrida
-from src.modelos.preparar_datosFinales.limpieza_nulos import limpiar_y_enriquecer_extremo_ram
+from src.modelos.preparar_datosFinales import datos_finales, limpieza_nulos
+from src.modelos.preparar_datosFinales.datos_finales import carga_datos_hibrida, archivos_entrada, SAMPLE_RATE
+from src.modelos.preparar_datosFinales.limpieza_nulos import cargar_estadisticas, limpiar_y_enriquecer_extremo_ram
+from src.pipelines.manifest import Manifest, hash_codigo
+from src.processing import escritura, ordenacion
+from src.processing.particionado import ARTEFACTO_PARTICIONADO, DATOS_FINAL_DIR, codigo_particionado, particionar_datos_final
 
 # --- RUTAS ---
 BASE_DIR = Path(__file__).resolve().parents[3] 
@@ -10,29 +16,77 @@ INPUT_DIR = os.path.join(BASE_DIR, 'data', 'processed', 'tlc_clean')
 # Definimos los archivos
 ARCHIVO_INTERMEDIO = os.path.join(INPUT_DIR, 'dataset_intermedio.parquet')
 ARCHIVO_FINAL = os.path.join(INPUT_DIR, 'datos_final.parquet')
+ARCHIVO_ESTADISTICAS = os.path.join(INPUT_DIR, 'datos_final_imputacion.json')
+
+ANIO_ACTUAL, ANIO_ANTERIOR = 2025, 2024
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser("Dataset final ConducIA")
+    parser.add_argument(
+        "--particionado", action="store_true",
+        help="Escribir también datos_final como dataset Hive service=/year=/month=",
+    )
+    parser.add_argument(
+        "--reusar-imputacion", action="store_true",
+        help="Al reentrenar: imputar con la mediana y la distribución de pasajeros "
+             "guardadas en datos_final_imputacion.json en vez de recalcularlas",
+    )
+    args = parser.parse_args()
+
     print("Iniciando Pipeline de Datos ConducIA...")
-    
-    # 1. Si el dataset final existe hacemos skip de todo
-    if os.path.exists(ARCHIVO_FINAL):
-        print(f" ¡El archivo final ya existe en {ARCHIVO_FINAL}!")
-        print(" SKIP de ambas fases. Todo está listo.")
-    
+    manifest = Manifest()
+
+    # 1. Dataset intermedio: depende de los meses limpios seleccionados
+    entradas = [Path(ruta) for *_, ruta in archivos_entrada(INPUT_DIR, ANIO_ACTUAL, ANIO_ANTERIOR)]
+    params_carga = {"anio_actual": ANIO_ACTUAL, "anio_anterior": ANIO_ANTERIOR, "sample_rate": SAMPLE_RATE}
+    codigo_carga = hash_codigo(datos_finales, escritura, ordenacion)
+
+    if manifest.esta_actualizado("dataset_intermedio", [ARCHIVO_INTERMEDIO], entradas, codigo_carga, params_carga):
+        print(" El archivo intermedio está al día. SKIP Fase de Carga.")
     else:
-        # Si el archivo unificado existe hacemos SKIP de esa fase
-        if os.path.exists(ARCHIVO_INTERMEDIO):
-            print(" El archivo intermedio ya existe. SKIP Fase de Carga.")
+        print(" Carga y unión de datos...")
+        carga_datos_hibrida(INPUT_DIR, ARCHIVO_INTERMEDIO, anio_actual=ANIO_ACTUAL, anio_anterior=ANIO_ANTERIOR)
+        manifest.registrar("dataset_intermedio", [ARCHIVO_INTERMEDIO], entradas, codigo_carga, params_carga)
+
+    # 2. Dataset final: depende del intermedio (si este cambió, se rehace en cascada)
+    codigo_limpieza = hash_codigo(limpieza_nulos, escritura)
+    salidas_final = [ARCHIVO_FINAL, ARCHIVO_ESTADISTICAS]
+    # Con --reusar-imputacion las estadísticas guardadas entran en la firma:
+    # si cambian (o se deja de reusar) la limpieza se rehace
+    estadisticas = None
+    if args.reusar_imputacion:
+        if os.path.exists(ARCHIVO_ESTADISTICAS):
+            estadisticas = cargar_estadisticas(ARCHIVO_ESTADISTICAS)
+            print(f" Reusando estadísticas de imputación de {ARCHIVO_ESTADISTICAS}")
         else:
-            print(" Carga y unión de datos...")
-            carga_datos_hibrida(INPUT_DIR, ARCHIVO_INTERMEDIO, anio_actual=2025, anio_anterior=2024)
-        
+            print(f" No existe {ARCHIVO_ESTADISTICAS}: se recalculan las estadísticas.")
+    params_limpieza = {"imputacion": estadisticas} if estadisticas is not None else None
+    if manifest.esta_actualizado("datos_final", salidas_final, [ARCHIVO_INTERMEDIO], codigo_limpieza, params_limpieza):
+        print(f" ¡El archivo final ya está al día en {ARCHIVO_FINAL}!")
+        print(" SKIP de la limpieza. Todo está listo.")
+    else:
         # 3. Ejecutamos la limpieza 
         print(" Limpieza y creación de variables...")
-        limpiar_y_enriquecer_extremo_ram(ARCHIVO_INTERMEDIO, ARCHIVO_FINAL)
+        # Las estadísticas de imputación (mediana de propina, distribución de
+        # pasajeros) quedan en ARCHIVO_ESTADISTICAS; con --reusar-imputacion se
+        # leen de ahí y no se recalculan sobre los datos nuevos
+        limpiar_y_enriquecer_extremo_ram(
+            ARCHIVO_INTERMEDIO, ARCHIVO_FINAL,
+            estadisticas=estadisticas, ruta_estadisticas=ARCHIVO_ESTADISTICAS,
+        )
+        manifest.registrar("datos_final", salidas_final, [ARCHIVO_INTERMEDIO], codigo_limpieza, params_limpieza)
         
         #if os.path.exists(ARCHIVO_INTERMEDIO):
             #os.remove(ARCHIVO_INTERMEDIO)
             #print(" Archivo intermedio eliminado para liberar espacio.")
+
+    # 4. Versión particionada (opcional): los lectores con filtros solo leen sus fragmentos
+    if args.particionado:
+        codigo_particion = codigo_particionado()
+        if manifest.esta_actualizado(ARTEFACTO_PARTICIONADO, [DATOS_FINAL_DIR], [ARCHIVO_FINAL], codigo_particion):
+            print(" SKIP datos_final particionado (al día).")
+        else:
+            print(particionar_datos_final(ARCHIVO_FINAL, DATOS_FINAL_DIR))
+            manifest.registrar(ARTEFACTO_PARTICIONADO, [DATOS_FINAL_DIR], [ARCHIVO_FINAL], codigo_particion)
             
-        print(" Pipeline finalizado. Listo para entrenar modelos.")
\ No newline at end of file
+    print(" Pipeline finalizado. Listo para entrenar modelos.")
@@ -1,4 +1,5 @@
 # src/modelos/problema1/analizar_predicciones.py
+# Uso (desde la raíz del repo): python -m src.modelos.problema1.analizar_predicciones
 
 """
 Analisis detallado de predicciones del Random Forest.
@@ -20,6 +21,8 @@ import pandas as pd
 import seaborn as sns
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+from src.pipelines.predicciones import AlmacenPredicciones
+
 
 print("=" * 90)
 print("ANALISIS DETALLADO DE PREDICCIONES - RANDOM FOREST")
@@ -33,8 +36,9 @@ MODEL_DIR = Path("models/problema1")
 OUTPUT_DIR = Path("reports/problema1")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+MODEL_PATH = MODEL_DIR / "baseline_random_forest.pkl"
+
 df_test = pd.read_parquet(DATA_DIR / "test.parquet")
-rf = joblib.load(MODEL_DIR / "baseline_random_forest.pkl")
 
 with open(DATA_DIR / "metadata.json", "r", encoding="utf-8") as f:
     meta = json.load(f)
@@ -102,8 +106,14 @@ def describe_window(label: str, df_window: pd.DataFrame) -> None:
         )
 
 
+# Predicciones del almacen si el modelo, el test y las features no han cambiado
+# (el RF solo se carga si hay que recalcularlas)
 X_test = df_test[FEATURE_COLS]
-df_test["pred_rf"] = np.clip(rf.predict(X_test), 0, None)
+pred = AlmacenPredicciones().obtener(
+    "problema1/rf_test", [MODEL_PATH], DATA_DIR / "test.parquet", FEATURE_COLS,
+    lambda: {"pred_rf": np.clip(joblib.load(MODEL_PATH).predict(X_test), 0, None)},
+)
+df_test["pred_rf"] = pred["pred_rf"].to_numpy()
 df_test["pred_naive"] = df_test["demanda"]
 df_test["pred_media_hist"] = df_test["media_hist"]
 df_test["error_rf"] = (df_test[TARGET] - df_test["pred_rf"]).abs()
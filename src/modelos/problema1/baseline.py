@@ -1,4 +1,5 @@
 # src/modelos/problema1/baseline.py
+# Uso (desde la raíz del repo): python -m src.modelos.problema1.baseline
 
 import pandas as pd
 import numpy as np
@@ -11,6 +12,8 @@ import matplotlib.gridspec as gridspec
 import joblib
 import warnings
 
+from src.modelos.problema1.busqueda_rf import PARAMS_RF
+
 warnings.filterwarnings('ignore')
 
 # ============================================================
@@ -129,15 +132,8 @@ print(f"\n{'='*80}")
 print("BASELINE 3 — RANDOM FOREST")
 print(f"{'='*80}")
 
-rf = RandomForestRegressor(
-    n_estimators=200,
-    max_depth=12,
-    min_samples_split=20,
-    min_samples_leaf=10,
-    max_features='sqrt',
-    random_state=42,
-    n_jobs=-1,
-)
+# Hiperparámetros compartidos con reentrenar_rf_p1.py (ver busqueda_rf.py)
+rf = RandomForestRegressor(**PARAMS_RF)
 
 print("Entrenando Random Forest...")
 rf.fit(X_train, y_train)
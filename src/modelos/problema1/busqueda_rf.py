@@ -0,0 +1,273 @@
+# src/modelos/problema1/busqueda_rf.py
+"""
+Búsqueda de hiperparámetros del Random Forest de P1 con successive halving.
+
+Los hiperparámetros del RF (n_estimators=200, max_depth=12, ...) estaban
+repetidos en baseline.py y en reentrenar_rf_p1.py, y probar otra
+configuración era un reajuste completo en serie. Ahora PARAMS_RF vive aquí
+y esta búsqueda:
+
+  - Carga los splits de features una vez y deja X/y de train y val en
+    memoria compartida (multiprocessing.shared_memory, float32 como los usa
+    sklearn internamente): cada worker los ve sin copiarlos ni picklearlos.
+  - Evalúa las configuraciones en un pool de procesos (un RF con n_jobs=1
+    por worker, paralelismo entre configuraciones).
+  - Successive halving: todas las configuraciones empiezan con una
+    submuestra de train; en cada ronda pasa 1/eta (las de menor RMSE en
+    val) y la submuestra crece ×eta, hasta que las últimas usan train entero.
+    Las submuestras son anidadas (prefijos de una misma permutación).
+  - Guarda por configuración y ronda las métricas de val (RMSE, MAE, R²,
+    MAPE), el tiempo de entrenamiento, el de predicción (ms por 1.000
+    filas) y el número de nodos, para elegir modelos precisos y rápidos en
+    inferencia. El tiempo total de cada ronda también queda registrado.
+
+Resultado: models/problema1/busqueda_rf.json. reentrenar_rf_p1.py puede
+usar la mejor configuración con --busqueda.
+
+Uso (desde la raíz del repo):
+    python -m src.modelos.problema1.busqueda_rf
+    python -m src.modelos.problema1.busqueda_rf --eta 3 --workers 8 --max-ms-pred 50
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+DATA_DIR     = Path('data/processed/tlc_clean/problema1/features')
+RESULTS_PATH = Path('models/problema1/busqueda_rf.json')
+
+# Configuración actual del RF de P1 (baseline.py y reentrenar_rf_p1.py)
+PARAMS_RF = {
+    'n_estimators': 200,
+    'max_depth': 12,
+    'min_samples_split': 20,
+    'min_samples_leaf': 10,
+    'max_features': 'sqrt',
+    'random_state': 42,
+    'n_jobs': -1,
+}
+
+# Rejilla por defecto; la configuración actual siempre entra como candidata
+REJILLA = {
+    'n_estimators': [100, 200, 400],
+    'max_depth': [8, 12, 16, None],
+    'min_samples_leaf': [5, 10, 20],
+    'max_features': ['sqrt', 0.5],
+}
+
+ETA = 3
+MIN_FILAS = 20_000
+SEMILLA = 42
+
+# Arrays compartidos vistos desde cada worker (los rellena _adjuntar)
+_DATOS = {}
+_BLOQUES = []
+
+
+def params_rf(ruta_busqueda=None):
+    """PARAMS_RF, o la mejor configuración de una búsqueda guardada si se indica su JSON."""
+    params = dict(PARAMS_RF)
+    if ruta_busqueda is not None:
+        with open(ruta_busqueda, 'r', encoding='utf-8') as f:
+            params.update(json.load(f)['mejor']['params'])
+        params['n_jobs'] = PARAMS_RF['n_jobs']
+    return params
+
+
+def candidatos(rejilla=REJILLA, base=PARAMS_RF):
+    """Producto de la rejilla sobre la configuración base (sin n_jobs), con la base primero."""
+    fijos = {k: v for k, v in base.items() if k != 'n_jobs'}
+    claves = list(rejilla)
+    lista = [fijos]
+    for valores in itertools.product(*(rejilla[k] for k in claves)):
+        params = {**fijos, **dict(zip(claves, valores))}
+        if params not in lista:
+            lista.append(params)
+    return lista
+
+
+def metricas(y_true, y_pred):
+    """Mismas métricas que calc_metrics de baseline.py."""
+    return {
+        'rmse': float(np.sqrt(mean_squared_error(y_true, y_pred))),
+        'mae':  float(mean_absolute_error(y_true, y_pred)),
+        'r2':   float(r2_score(y_true, y_pred)),
+        'mape': float(np.mean(np.abs((y_true - y_pred) / np.clip(y_true, 1, None))) * 100),
+    }
+
+
+# ── Memoria compartida ────────────────────────────────────────────────────────
+def compartir(arrays):
+    """Copia cada array a un bloque de memoria compartida. Devuelve (bloques, descriptores)."""
+    bloques, descriptores = [], {}
+    for nombre, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        bloques.append(shm)
+        descriptores[nombre] = (shm.name, arr.shape, arr.dtype.str)
+    return bloques, descriptores
+
+
+def _adjuntar(descriptores):
+    """Initializer del pool: vistas sin copia sobre los bloques del proceso padre."""
+    for nombre, (bloque, forma, tipo) in descriptores.items():
+        # track=False: los bloques son del padre (él hace unlink); si el worker
+        # los registrara, su resource_tracker los borraría o avisaría al salir
+        shm = shared_memory.SharedMemory(name=bloque, track=False)
+        _BLOQUES.append(shm)
+        _DATOS[nombre] = np.ndarray(forma, dtype=np.dtype(tipo), buffer=shm.buf)
+
+
+def evaluar(params, n_filas):
+    """Entrena un RF con los n_filas primeros de la permutación de train y lo mide en val."""
+    idx = np.sort(_DATOS['perm'][:n_filas])
+    X, y = _DATOS['X_train'][idx], _DATOS['y_train'][idx]
+
+    rf = RandomForestRegressor(**params, n_jobs=1)
+    t0 = time.perf_counter()
+    rf.fit(X, y)
+    seg_fit = time.perf_counter() - t0
+
+    X_val = _DATOS['X_val']
+    t0 = time.perf_counter()
+    pred = np.clip(rf.predict(X_val), 0, None)
+    seg_pred = time.perf_counter() - t0
+
+    return {
+        'params': params,
+        'filas': int(n_filas),
+        **metricas(_DATOS['y_val'], pred),
+        'seg_fit': round(seg_fit, 3),
+        'ms_pred_1k': round(seg_pred / len(X_val) * 1e6, 3),
+        'nodos': int(sum(e.tree_.node_count for e in rf.estimators_)),
+    }
+
+
+# ── Successive halving ────────────────────────────────────────────────────────
+def tamanos_ronda(n_candidatos, n_train, eta=ETA, min_filas=MIN_FILAS):
+    """Filas de train por ronda: la última usa train entero y cada una anterior 1/eta."""
+    n_rondas = max(1, math.ceil(math.log(max(n_candidatos, 1), eta)) + 1)
+    tamanos = [max(min(min_filas, n_train), n_train // eta ** (n_rondas - 1 - k)) for k in range(n_rondas)]
+    # Rondas que caerían por debajo del mínimo se funden con la siguiente
+    return sorted(set(tamanos))
+
+
+def successive_halving(lista, n_train, pool, eta=ETA, min_filas=MIN_FILAS):
+    """Ejecuta las rondas en el pool. Devuelve la lista de rondas con sus resultados ordenados por RMSE."""
+    vivos = list(lista)
+    rondas = []
+    tamanos = tamanos_ronda(len(vivos), n_train, eta, min_filas)
+    for k, n_filas in enumerate(tamanos):
+        print(f"\n   Ronda {k + 1}/{len(tamanos)}: {len(vivos)} configuraciones × {n_filas:,} filas")
+        t0 = time.perf_counter()
+        resultados = list(pool.map(evaluar, vivos, [n_filas] * len(vivos)))
+        resultados.sort(key=lambda r: r['rmse'])
+        segundos = time.perf_counter() - t0
+        print(f"   {segundos:.1f}s  mejor RMSE val={resultados[0]['rmse']:.3f}")
+        rondas.append({'filas': int(n_filas), 'segundos': round(segundos, 2), 'resultados': resultados})
+        if k + 1 < len(tamanos):
+            vivos = [r['params'] for r in resultados[:max(1, math.ceil(len(resultados) / eta))]]
+    return rondas
+
+
+def elegir(resultados, max_ms_pred=None):
+    """Menor RMSE de la última ronda; con max_ms_pred, solo entre las que predicen por debajo de ese tiempo."""
+    validos = [r for r in resultados if max_ms_pred is None or r['ms_pred_1k'] <= max_ms_pred]
+    return min(validos or resultados, key=lambda r: r['rmse'])
+
+
+def cargar_splits(data_dir=DATA_DIR):
+    """X/y de train y val como arrays float32/float64 (lo que usa sklearn) y las features."""
+    with open(data_dir / 'metadata.json', 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    features, target = meta['feature_cols'], meta['target']
+    datos = {}
+    for split in ('train', 'val'):
+        df = pd.read_parquet(data_dir / f'{split}.parquet', columns=features + [target])
+        datos[f'X_{split}'] = df[features].to_numpy(dtype=np.float32)
+        datos[f'y_{split}'] = df[target].to_numpy(dtype=np.float64)
+    return datos, features
+
+
+def buscar(rejilla=REJILLA, eta=ETA, min_filas=MIN_FILAS, workers=None, max_ms_pred=None,
+           data_dir=DATA_DIR, salida=RESULTS_PATH):
+    t_total = time.perf_counter()
+    print("Cargando features...")
+    datos, features = cargar_splits(data_dir)
+    n_train = len(datos['y_train'])
+    datos['perm'] = np.random.default_rng(SEMILLA).permutation(n_train)
+    print(f"   Train: {n_train:,} | Val: {len(datos['y_val']):,} | Features: {len(features)}")
+
+    lista = candidatos(rejilla)
+    workers = workers or os.cpu_count() or 1
+    print(f"   {len(lista)} configuraciones, eta={eta}, {workers} workers")
+
+    bloques, descriptores = compartir(datos)
+    del datos
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_adjuntar, initargs=(descriptores,)) as pool:
+            rondas = successive_halving(lista, n_train, pool, eta, min_filas)
+    finally:
+        for shm in bloques:
+            shm.close()
+            shm.unlink()
+
+    finales = rondas[-1]['resultados']
+    mejor = elegir(finales, max_ms_pred)
+    base = {k: v for k, v in PARAMS_RF.items() if k != 'n_jobs'}
+    actual = next((r for ronda in reversed(rondas) for r in ronda['resultados'] if r['params'] == base), None)
+
+    print(f"\n{'RMSE':>8} {'MAE':>8} {'R²':>7} {'fit s':>8} {'ms/1k':>8}  params")
+    for r in finales:
+        marca = '*' if r is mejor else ' '
+        print(f"{r['rmse']:>8.3f} {r['mae']:>8.3f} {r['r2']:>7.3f} {r['seg_fit']:>8.1f} {r['ms_pred_1k']:>8.2f} {marca} {r['params']}")
+    if actual is not None:
+        print(f"\n   Configuración actual: RMSE={actual['rmse']:.3f} con {actual['filas']:,} filas")
+
+    resumen = {
+        'features': features,
+        'params_base': base,
+        'rejilla': rejilla,
+        'eta': eta,
+        'workers': workers,
+        'max_ms_pred': max_ms_pred,
+        'rondas': rondas,
+        'mejor': mejor,
+        'actual': actual,
+        'segundos_total': round(time.perf_counter() - t_total, 2),
+    }
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    with open(salida, 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, indent=2, default=str)
+    print(f"\nMejor: {mejor['params']}")
+    print(f"Resultados: {salida} ({resumen['segundos_total']:.1f}s en total)")
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser("Búsqueda de hiperparámetros del RF de P1 (successive halving)")
+    parser.add_argument('--eta', type=int, default=ETA, help='factor de reducción por ronda')
+    parser.add_argument('--min-filas', type=int, default=MIN_FILAS, help='filas de train en la primera ronda')
+    parser.add_argument('--workers', type=int, default=None, help='procesos del pool (por defecto, CPUs)')
+    parser.add_argument('--max-ms-pred', type=float, default=None,
+                        help='elegir la mejor que prediga 1.000 filas en menos de estos ms')
+    parser.add_argument('--salida', type=Path, default=RESULTS_PATH)
+    args = parser.parse_args()
+    buscar(eta=args.eta, min_filas=args.min_filas, workers=args.workers,
+           max_ms_pred=args.max_ms_pred, salida=args.salida)
+
+
+if __name__ == '__main__':
+    main()
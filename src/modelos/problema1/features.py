@@ -5,13 +5,31 @@ Calcula lags, rolling stats y media histórica sobre los datos
 ya agregados (zona×hora) que vienen de preparar_datos.py.
 Sin data leakage: lags calculados sobre el dataset completo,
 media histórica solo desde train.
+
+Los lags y las ventanas se leen de la matriz densa zona×hora del cubo de
+demanda (src.processing.cubo_demanda): lag_3h es la demanda de 3 horas
+antes aunque alguna de esas horas no tuviera viajes (antes era "3 filas
+observadas antes"). Si el cubo no existe o no cuadra con los splits raw,
+la matriz se construye con los propios splits.
+
+Lags, medias y desviaciones móviles salen de índices y sumas acumuladas
+sobre esa matriz (rezagos_y_ventanas) y la media histórica de una tabla
+[zona, día, hora] por índice directo, sin groupby con lambda ni merges.
+Con --paridad se compara además con la implementación de pandas anterior.
+
+Uso (desde la raíz del repo):
+    python -m src.modelos.problema1.features [--paridad]
 """
 
 import pandas as pd
 import numpy as np
-import json, os
+import json, os, sys, time
 from pathlib import Path
 
+from src.processing.cubo_demanda import (
+    CUBO_DIR, LAGS_HORAS, VENTANAS_HORAS, CuboDemanda, paridad_rezagos, rezagos_y_ventanas,
+)
+
 RAW_DIR = Path('data/processed/tlc_clean/problema1/raw')
 OUT_DIR = Path('data/processed/tlc_clean/problema1/features')
 OUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -34,21 +52,55 @@ agg['timestamp_hora'] = pd.to_datetime(agg['timestamp_hora'])
 print(f"  Total registros zona×hora: {len(agg):,}")
 
 # ── 2. Lags y rolling sobre el dataset COMPLETO (sin leakage) ────────────────
+def cubo_demanda_horaria(agg):
+    """Cubo con la demanda zona×hora: el de datos_final si cuadra con los splits raw."""
+    t_min, t_max = agg['timestamp_hora'].min(), agg['timestamp_hora'].max()
+    if (CUBO_DIR / 'meta.json').exists():
+        cubo = CuboDemanda.abrir(CUBO_DIR)
+        if (
+            cubo.cubre(t_min, t_max)
+            and cubo.ventana('viajes', t_min, t_max + pd.Timedelta('1h'), '1h').sum() == agg['demanda'].sum()
+            and np.array_equal(
+                cubo.valores('viajes', agg['origen_id'], agg['timestamp_hora'], '1h'),
+                agg['demanda'].to_numpy(dtype=np.float64),
+            )
+        ):
+            print(f"  Demanda zona×hora desde el cubo {CUBO_DIR}")
+            return cubo
+        print(f"  El cubo {CUBO_DIR} no cuadra con los splits raw: se usa la demanda de los splits")
+    return CuboDemanda.desde_tabla(agg, 'origen_id', 'timestamp_hora', {'viajes': 'demanda'}, '1h')
+
 print("Calculando lags y rolling...")
 agg = agg.sort_values(['origen_id', 'timestamp_hora']).reset_index(drop=True)
 
-agg['target'] = agg.groupby('origen_id')['demanda'].shift(-1)
-
-for lag in [1, 2, 3, 6, 12, 24]:
-    agg[f'lag_{lag}h'] = agg.groupby('origen_id')['demanda'].shift(lag)
-
-for window in [3, 24]:
-    agg[f'roll_mean_{window}h'] = agg.groupby('origen_id')['demanda'].transform(
-        lambda x: x.shift(1).rolling(window, min_periods=1).mean()
-    )
-    agg[f'roll_std_{window}h'] = agg.groupby('origen_id')['demanda'].transform(
-        lambda x: x.shift(1).rolling(window, min_periods=1).std().fillna(0)
-    )
+# Matriz densa [zona, hora]: las horas sin viajes cuentan como 0 (no se saltan)
+cubo = cubo_demanda_horaria(agg)
+t0 = time.perf_counter()
+args_rezagos = (
+    cubo.capa('viajes', '1h'),
+    agg['origen_id'].to_numpy(),
+    cubo.indice_tiempo(agg['timestamp_hora'], '1h'),
+    LAGS_HORAS, VENTANAS_HORAS,
+    cubo.columnas_datos('1h'),
+)
+feats = rezagos_y_ventanas(*args_rezagos)
+for col, valores in feats.items():
+    if col != 'demanda':
+        agg[col] = valores
+print(f"  Lags y rolling ({len(agg):,} filas): {time.perf_counter() - t0:.2f}s")
+
+if '--paridad' in sys.argv:
+    print("Comprobando paridad con la implementación de pandas (lenta)...")
+    paridad = paridad_rezagos(*args_rezagos)
+    for col, d in paridad['diferencias'].items():
+        print(f"  {col:14s} max |dif| = {d['max_abs']:.2e}  NaN distintos = {d['nan_distinto']}"
+              + (f"  (NaN sin horas previas, 0 en el original: {d['nan_sin_previas']})" if d['nan_sin_previas'] else ""))
+    seg = paridad['segundos']
+    print(f"  Vectorizado: {seg['vectorizado']:.2f}s | pandas: {seg['pandas']:.2f}s "
+          f"(x{seg['pandas'] / max(seg['vectorizado'], 1e-9):.0f})")
+    print("  Paridad OK ✓ (salvo roll_std sin horas previas: NaN en vez de 0, a propósito)"
+          if paridad['ok'] else "  ⚠️ Las features no coinciden con la referencia")
+del cubo, feats, args_rezagos
 
 # ── 3. Partir por fecha DESPUÉS de calcular lags ─────────────────────────────
 print("Partiendo en train / val / test...")
@@ -57,21 +109,34 @@ agg_val   = agg[(agg['timestamp_hora'] >= CORTE_TRAIN) & (agg['timestamp_hora']
 agg_test  = agg[agg['timestamp_hora'] >= CORTE_VAL].copy()
 
 # ── 4. Media histórica solo desde train ──────────────────────────────────────
+# Tabla [zona, dia_semana, hora] con la media de las filas de train: se aplica
+# por índice directo en vez de con merge
 print("Calculando media histórica (solo train)...")
-media_train = (
-    agg_train.groupby(['origen_id', 'hora', 'dia_semana'])['demanda']
-    .mean().reset_index().rename(columns={'demanda': 'media_hist'})
-)
+t0 = time.perf_counter()
+N_ZONAS = int(agg['origen_id'].max()) + 1
+
+def indice_zona_dia_hora(df):
+    return (
+        (df['origen_id'].to_numpy(dtype=np.int64) * 7 + df['dia_semana'].to_numpy(dtype=np.int64)) * 24
+        + df['hora'].to_numpy(dtype=np.int64)
+    )
+
+idx_train = indice_zona_dia_hora(agg_train)
+n_hist    = np.bincount(idx_train, minlength=N_ZONAS * 7 * 24)
+suma_hist = np.bincount(idx_train, weights=agg_train['demanda'].to_numpy(dtype=np.float64), minlength=N_ZONAS * 7 * 24)
+with np.errstate(invalid='ignore', divide='ignore'):
+    media_train = np.where(n_hist > 0, suma_hist / n_hist, np.nan)
 global_mean = float(agg_train['demanda'].mean())
 
 def aplicar_media_hist(df):
-    df = df.merge(media_train, on=['origen_id', 'hora', 'dia_semana'], how='left')
-    df['media_hist'] = df['media_hist'].fillna(global_mean)
+    media = media_train[indice_zona_dia_hora(df)]
+    df['media_hist'] = np.where(np.isnan(media), global_mean, media)
     return df
 
 agg_train = aplicar_media_hist(agg_train)
 agg_val   = aplicar_media_hist(agg_val)
 agg_test  = aplicar_media_hist(agg_test)
+print(f"  Media histórica: {time.perf_counter() - t0:.2f}s")
 
 # ── 5. Limpieza ───────────────────────────────────────────────────────────────
 print("Limpieza...")
@@ -1,4 +1,5 @@
 # src/modelos/problema1/lstm.py
+# Uso (desde la raíz del repo): python -m src.modelos.problema1.lstm
 import os, json
 os.environ['KERAS_BACKEND'] = 'jax'
 
@@ -14,6 +15,9 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from pathlib import Path
 
+from src.modelos.problema1.secuencias import SecuenciasZona
+from src.processing.codificador_zonas import CodificadorZonas
+
 np.random.seed(42)
 keras.utils.set_random_seed(42)
 
@@ -53,11 +57,10 @@ TARGET = 'target'
 from sklearn.preprocessing import LabelEncoder
 le = LabelEncoder()
 le.fit(df_train['origen_id'])
+codificador = CodificadorZonas.desde_encoder(le)
 for df in [df_train, df_val, df_test]:
     # Zonas en val/test que no están en train → asignar -1 y excluir
-    df['zona_enc'] = df['origen_id'].apply(
-        lambda z: le.transform([z])[0] if z in le.classes_ else -1
-    )
+    df['zona_enc'] = codificador.transformar(df['origen_id'])
 
 df_train = df_train[df_train['zona_enc'] >= 0].copy()
 df_val   = df_val[df_val['zona_enc'] >= 0].copy()
@@ -82,41 +85,23 @@ joblib.dump(scaler_X, MODELS_DIR / 'lstm_scaler_X.pkl')
 joblib.dump(scaler_y, MODELS_DIR / 'lstm_scaler_y.pkl')
 
 # ── 4. Crear secuencias ───────────────────────────────────────────────────────
-def create_sequences(X_sc, y_sc, zona_enc_col, timestamps, lookback):
-    """Crea secuencias por zona, preservando orden temporal."""
-    X_list, y_list = [], []
-    zonas = np.unique(zona_enc_col)
-    for z in zonas:
-        mask = zona_enc_col == z
-        idx = np.where(mask)[0]
-        # Ordenar por timestamp dentro de la zona
-        order = np.argsort(timestamps[idx])
-        idx = idx[order]
-        X_z = X_sc[idx]
-        y_z = y_sc[idx]
-        if len(X_z) < lookback + 1:
-            continue
-        for i in range(len(X_z) - lookback):
-            X_list.append(X_z[i:i+lookback])
-            y_list.append(y_z[i+lookback])
-    return np.array(X_list, dtype=np.float32), np.array(y_list, dtype=np.float32)
-
+# Las ventanas se montan por lotes desde una vista sin copia (ver secuencias.py)
 LB = CONFIG['lookback']
 print(f"Creando secuencias (lookback={LB}h)...")
 
-X_tr, y_tr = create_sequences(X_train_sc, y_train_sc,
-    df_train['zona_enc'].values, df_train['timestamp_hora'].values, LB)
-X_v, y_v = create_sequences(X_val_sc, y_val_sc,
-    df_val['zona_enc'].values, df_val['timestamp_hora'].values, LB)
-X_te, _ = create_sequences(X_test_sc, np.zeros(len(X_test_sc)),
-    df_test['zona_enc'].values, df_test['timestamp_hora'].values, LB)
+ds_tr = SecuenciasZona(X_train_sc, y_train_sc,
+    df_train['zona_enc'].values, df_train['timestamp_hora'].values, LB,
+    batch_size=CONFIG['batch_size'], shuffle=True)
+ds_v = SecuenciasZona(X_val_sc, y_val_sc,
+    df_val['zona_enc'].values, df_val['timestamp_hora'].values, LB, batch_size=256)
+# Test con el target original para métricas reales
+ds_te = SecuenciasZona(X_test_sc, y_test_real,
+    df_test['zona_enc'].values, df_test['timestamp_hora'].values, LB, batch_size=256)
 
-# Target real correspondiente a las secuencias de test
-_, y_te_real = create_sequences(
-    X_test_sc, y_test_real,
-    df_test['zona_enc'].values, df_test['timestamp_hora'].values, LB)
+y_v       = ds_v.objetivos
+y_te_real = ds_te.objetivos
 
-print(f"  Train: {X_tr.shape} | Val: {X_v.shape} | Test: {X_te.shape}")
+print(f"  Train: {ds_tr.forma} | Val: {ds_v.forma} | Test: {ds_te.forma}")
 
 # ── 5. Modelo ─────────────────────────────────────────────────────────────────
 model = keras.Sequential([
@@ -145,10 +130,9 @@ cbs = [
 ]
 
 history = model.fit(
-    X_tr, y_tr,
-    validation_data=(X_v, y_v),
+    ds_tr,
+    validation_data=ds_v,
     epochs=CONFIG['epochs'],
-    batch_size=CONFIG['batch_size'],
     callbacks=cbs, verbose=1,
 )
 
@@ -163,12 +147,12 @@ def metrics(y_true, y_pred, label=""):
     return {'rmse': rmse, 'mae': mae, 'r2': r2, 'mape': mape}
 
 # Val
-y_v_pred_sc = model.predict(X_v, batch_size=256, verbose=0).flatten()
+y_v_pred_sc = model.predict(ds_v, verbose=0).flatten()
 y_v_pred    = np.clip(scaler_y.inverse_transform(y_v_pred_sc.reshape(-1,1)).flatten(), 0, None)
 y_v_real    = scaler_y.inverse_transform(y_v.reshape(-1,1)).flatten()
 
 # Test
-y_te_pred_sc = model.predict(X_te, batch_size=256, verbose=0).flatten()
+y_te_pred_sc = model.predict(ds_te, verbose=0).flatten()
 y_te_pred    = np.clip(scaler_y.inverse_transform(y_te_pred_sc.reshape(-1,1)).flatten(), 0, None)
 
 print("\nRESULTADOS:")
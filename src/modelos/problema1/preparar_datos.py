@@ -5,211 +5,209 @@ sin cargar todo en RAM. Sustituye a samplear_datos.py + division_datos.py.
 
 Salida: data/processed/tlc_clean/problema1/raw/{train,val,test}.parquet
         con datos AGREGADOS (zona×hora), no viajes individuales.
+
+La agregación es un consumidor del escaneo compartido (src.processing.escaneo):
+el rango temporal y los cortes salen del footer del parquet (sin leer
+columnas) y datos_final se lee una sola vez. Para generar también los
+demás problemas en ese pase: python -m src.pipelines.escaneo_compartido
+
+Uso (desde la raíz del repo): python -m src.modelos.problema1.preparar_datos
 """
 
-import pyarrow.parquet as pq
-import pyarrow.dataset as ds
-import pyarrow.compute as pc
 import pandas as pd
 import numpy as np
-import json, os
+import json
 from pathlib import Path
 
+from src.pipelines.manifest import Manifest, hash_codigo
+from src.processing import acumulador, escaneo, lectura
+from src.processing.acumulador import AcumuladorGrupos, clave_zona_ventana, tabla_zona_ventana
+from src.processing.escaneo import Consumidor, EscaneoCompartido
+from src.processing.lectura import planificar_cortes
+
 PARQUET_PATH = "data/processed/tlc_clean/datos_final.parquet"
 OUT_DIR      = Path("data/processed/tlc_clean/problema1/raw")
-OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 # División temporal: 70% train / 15% val / 15% test
 SPLIT = (0.70, 0.85)  # cortes como fracción del rango total
 
-print("="*60)
-print(" AGREGACIÓN DIRECTA SIN SAMPLEO")
-print("="*60)
-
-# ── 1. Calcular rango temporal sin cargar datos ───────────────────────────────
-print("\n1. Calculando rango temporal...")
-pf = pq.ParquetFile(PARQUET_PATH)
-t_min, t_max = None, None
-
-for i in range(pf.num_row_groups):
-    rg_meta = pf.metadata.row_group(i)
-    # Leer solo la columna de fecha para obtener min/max
-    batch = pf.read_row_group(i, columns=['fecha_inicio'])
-    col = batch.column('fecha_inicio')
-    bmin = pd.Timestamp(pc.min(col).as_py())
-    bmax = pd.Timestamp(pc.max(col).as_py())
-    t_min = bmin if t_min is None else min(t_min, bmin)
-    t_max = bmax if t_max is None else max(t_max, bmax)
-    print(f"\r   Row group {i+1}/{pf.num_row_groups}...", end='', flush=True)
-
-print(f"\n   Período: {t_min} → {t_max}")
-
-rango = t_max - t_min
-corte_train = (t_min + rango * SPLIT[0]).floor('1h')
-corte_val   = (t_min + rango * SPLIT[1]).floor('1h')
-print(f"   Corte train: {corte_train}")
-print(f"   Corte val:   {corte_val}")
-
-# ── 2. Columnas que necesitamos ───────────────────────────────────────────────
+# Ejecución incremental: si datos_final.parquet y este script no han cambiado,
+# los splits existentes siguen siendo válidos
+ARTEFACTO = 'problema1/raw'
+SALIDAS   = [OUT_DIR / f'{s}.parquet' for s in ('train', 'val', 'test')] + [OUT_DIR / 'metadata.json']
+CODIGO    = hash_codigo(__file__, escaneo, lectura, acumulador)
+PARAMS    = {'split': SPLIT}
+
+# ── Columnas que necesitamos ──────────────────────────────────────────────────
 COLS_NECESARIAS = [
     'fecha_inicio', 'origen_id', 'mes_num',
     'temp_c', 'precipitation', 'viento_kmh', 'velocidad_mph',
     'lluvia', 'nieve', 'es_festivo', 'num_eventos',
 ]
 
-# ── 3. Leer por row groups y acumular agregados parciales ────────────────────
-print("\n2. Leyendo y agregando por chunks...")
 
-# Acumuladores: dict zona→hora→{conteo, sumas}
-# En lugar de acumular en dict (lento), acumulamos DataFrames parciales
-chunks_train, chunks_val, chunks_test = [], [], []
+def planificar(ruta=PARQUET_PATH):
+    """Rango temporal y cortes train/val/test leídos del footer (sin leer columnas)."""
+    plan = planificar_cortes(ruta, SPLIT, '1h')
+    print(f"   Período: {plan['t_min']} → {plan['t_max']}")
+    print(f"   Corte train: {plan['corte_train']}")
+    print(f"   Corte val:   {plan['corte_val']}")
+    est = plan['filas_estimadas']
+    print(f"   Viajes estimados: train={est['train']:,} val={est['val']:,} test={est['test']:,}")
+    return plan
+
+
+# Agregación zona×hora. Es exacta aunque un zona×hora caiga en varios row
+# groups: se acumulan sumas y conteos, no medias de cada chunk
+AGREGACIONES = {
+    'demanda':       ('fecha_inicio',  'count'),
+    'hora':          ('hora',          'first'),
+    'dia_semana':    ('dia_semana',    'first'),
+    'dia_mes':       ('dia_mes',       'first'),
+    'mes_num':       ('mes_num',       'first'),
+    'es_finde':      ('es_finde',      'first'),
+    'temp_c':        ('temp_c',        'mean'),
+    'precipitation': ('precipitation', 'mean'),
+    'viento_kmh':    ('viento_kmh',    'mean'),
+    'velocidad_mph': ('velocidad_mph', 'mean'),
+    'lluvia':        ('lluvia',        'max'),
+    'nieve':         ('nieve',         'max'),
+    'es_festivo':    ('es_festivo',    'max'),
+    'num_eventos':   ('num_eventos',   'mean'),
+}
+
+
+class AgregadorZonaHora(Consumidor):
+    """Agregados zona×hora acumulados por row group; cortes al final."""
+
+    columnas = COLS_NECESARIAS
 
-for i in range(pf.num_row_groups):
-    print(f"\r   Procesando row group {i+1}/{pf.num_row_groups}...", end='', flush=True)
-    
-    # Leer solo columnas necesarias
-    try:
-        batch = pf.read_row_group(i, columns=COLS_NECESARIAS)
-    except Exception:
+    def __init__(self, plan):
+        # Cortes planificados con el footer antes de leer (ver planificar)
+        self.corte_train, self.corte_val = plan['corte_train'], plan['corte_val']
+        # Estadísticos por clave zona×hora en arrays (memoria ∝ grupos, no chunks)
+        self.acumulador = AcumuladorGrupos(AGREGACIONES)
+        self.tipo_zona, self.unidad = np.int16, 'datetime64[us]'
+
+    def procesar(self, df):
         # Si alguna columna no existe en este grupo, saltar
-        continue
-    
-    df = batch.to_pandas()
-    df['fecha_inicio']   = pd.to_datetime(df['fecha_inicio'])
-    df['timestamp_hora'] = df['fecha_inicio'].dt.floor('1h')
-    df['hora']           = df['fecha_inicio'].dt.hour
-    df['dia_semana']     = df['fecha_inicio'].dt.dayofweek
-    df['dia_mes']        = df['fecha_inicio'].dt.day
-    df['es_finde']       = (df['dia_semana'] >= 5).astype(int)
-    
-    # Agregar este chunk
-    agg = (
-        df.groupby(['origen_id', 'timestamp_hora'])
-        .agg(
-            demanda       = ('fecha_inicio',  'count'),
-            hora          = ('hora',          'first'),
-            dia_semana    = ('dia_semana',    'first'),
-            dia_mes       = ('dia_mes',       'first'),
-            mes_num       = ('mes_num',       'first'),
-            es_finde      = ('es_finde',      'first'),
-            temp_c        = ('temp_c',        'mean'),
-            precipitation = ('precipitation', 'mean'),
-            viento_kmh    = ('viento_kmh',    'mean'),
-            velocidad_mph = ('velocidad_mph', 'mean'),
-            lluvia        = ('lluvia',        'max'),
-            nieve         = ('nieve',         'max'),
-            es_festivo    = ('es_festivo',    'max'),
-            num_eventos   = ('num_eventos',   'mean'),
-        )
-        .reset_index()
-    )
-    
-    # Partir por período
-    mask_train = agg['timestamp_hora'] <  corte_train
-    mask_val   = (agg['timestamp_hora'] >= corte_train) & (agg['timestamp_hora'] < corte_val)
-    mask_test  = agg['timestamp_hora'] >= corte_val
-    
-    if mask_train.any(): chunks_train.append(agg[mask_train])
-    if mask_val.any():   chunks_val.append(agg[mask_val])
-    if mask_test.any():  chunks_test.append(agg[mask_test])
-    
-    del df, batch, agg
-
-print(f"\n   Chunks acumulados: train={len(chunks_train)}, val={len(chunks_val)}, test={len(chunks_test)}")
-
-# ── 4. Consolidar: sumar demandas del mismo zona×hora entre chunks ────────────
-print("\n3. Consolidando agregados...")
-
-def consolidar(chunks):
-    """
-    Combina chunks del mismo período sumando demandas y promediando features.
-    Necesario porque el mismo zona×hora puede aparecer en múltiples row groups.
-    """
-    df = pd.concat(chunks, ignore_index=True)
-    
-    # Para demanda: SUMAR (es un conteo)
-    # Para features numéricas: promediar ponderado por demanda
-    # Simplificación: promediar (el error es mínimo para vars continuas)
-    result = df.groupby(['origen_id', 'timestamp_hora']).agg(
-        demanda       = ('demanda',       'sum'),   # ← SUMAR conteos
-        hora          = ('hora',          'first'),
-        dia_semana    = ('dia_semana',    'first'),
-        dia_mes       = ('dia_mes',       'first'),
-        mes_num       = ('mes_num',       'first'),
-        es_finde      = ('es_finde',      'first'),
-        temp_c        = ('temp_c',        'mean'),
-        precipitation = ('precipitation', 'mean'),
-        viento_kmh    = ('viento_kmh',    'mean'),
-        velocidad_mph = ('velocidad_mph', 'mean'),
-        lluvia        = ('lluvia',        'max'),
-        nieve         = ('nieve',         'max'),
-        es_festivo    = ('es_festivo',    'max'),
-        num_eventos   = ('num_eventos',   'mean'),
-    ).reset_index()
-    
-    return result
-
-agg_train = consolidar(chunks_train)
-print(f"   Train: {len(agg_train):,} registros zona×hora")
-del chunks_train
-
-agg_val = consolidar(chunks_val)
-print(f"   Val:   {len(agg_val):,} registros zona×hora")
-del chunks_val
-
-agg_test = consolidar(chunks_test)
-print(f"   Test:  {len(agg_test):,} registros zona×hora")
-del chunks_test
-
-# ── 5. Verificar cobertura temporal ──────────────────────────────────────────
-print("\n4. Cobertura temporal:")
-for name, df in [('Train', agg_train), ('Val', agg_val), ('Test', agg_test)]:
-    t0 = df['timestamp_hora'].min()
-    t1 = df['timestamp_hora'].max()
-    dias = (t1 - t0).days
-    print(f"   {name}: {t0.date()} → {t1.date()} ({dias} días, {len(df):,} registros)")
-
-# Verificar que no hay solapamiento
-assert agg_train['timestamp_hora'].max() < agg_val['timestamp_hora'].min(), \
-    "Solapamiento train/val"
-assert agg_val['timestamp_hora'].max() < agg_test['timestamp_hora'].min(), \
-    "Solapamiento val/test"
-print("   Sin solapamientos ✓")
-
-# ── 6. Guardar ────────────────────────────────────────────────────────────────
-print("\n5. Guardando splits agregados...")
-
-agg_train.to_parquet(OUT_DIR / 'train.parquet', index=False)
-agg_val.to_parquet(  OUT_DIR / 'val.parquet',   index=False)
-agg_test.to_parquet( OUT_DIR / 'test.parquet',  index=False)
-
-n_total = len(agg_train) + len(agg_val) + len(agg_test)
-metadata = {
-    'fuente': 'agregacion directa sin sampleo (80M viajes → zona×hora)',
-    'cortes': {
-        'corte_train': str(corte_train),
-        'corte_val':   str(corte_val),
-    },
-    'split': {
-        s: {
-            'filas':        len(d),
-            'pct':          round(len(d) / n_total * 100, 1),
-            'fecha_inicio': str(d['timestamp_hora'].min()),
-            'fecha_fin':    str(d['timestamp_hora'].max()),
-            'dias':         (d['timestamp_hora'].max() - d['timestamp_hora'].min()).days,
+        if any(c not in df.columns for c in COLS_NECESARIAS):
+            return
+
+        df = df.dropna(subset=['origen_id', 'fecha_inicio'])
+        df['fecha_inicio']   = pd.to_datetime(df['fecha_inicio'])
+        df['hora']           = df['fecha_inicio'].dt.hour
+        df['dia_semana']     = df['fecha_inicio'].dt.dayofweek
+        df['dia_mes']        = df['fecha_inicio'].dt.day
+        df['es_finde']       = (df['dia_semana'] >= 5).astype(int)
+        self.tipo_zona, self.unidad = df['origen_id'].dtype, df['fecha_inicio'].dtype
+
+        claves = clave_zona_ventana(df['origen_id'], df['fecha_inicio'], '1h')
+        self.acumulador.actualizar(claves, df)
+
+    def finalizar(self, info):
+        corte_train, corte_val = self.corte_train, self.corte_val
+
+        agg = tabla_zona_ventana(self.acumulador, '1h', 'origen_id', 'timestamp_hora', self.tipo_zona, self.unidad)
+        self.acumulador = None
+        print(f"\n   Registros zona×hora: {len(agg):,}")
+
+        # Partir por período
+        mask_train = agg['timestamp_hora'] <  corte_train
+        mask_val   = (agg['timestamp_hora'] >= corte_train) & (agg['timestamp_hora'] < corte_val)
+        mask_test  = agg['timestamp_hora'] >= corte_val
+
+        splits = {
+            'train': agg[mask_train].reset_index(drop=True),
+            'val':   agg[mask_val].reset_index(drop=True),
+            'test':  agg[mask_test].reset_index(drop=True),
+        }
+        for nombre, d in splits.items():
+            print(f"   {nombre.capitalize():5s}: {len(d):,} registros zona×hora")
+        return {'splits': splits, 'corte_train': corte_train, 'corte_val': corte_val}
+
+
+def guardar(resultado):
+    """Comprueba la cobertura temporal y escribe los splits + metadata.json."""
+    splits = resultado['splits']
+    agg_train, agg_val, agg_test = splits['train'], splits['val'], splits['test']
+
+    # ── Verificar cobertura temporal ──────────────────────────────────────────
+    print("\n   Cobertura temporal:")
+    for name, df in [('Train', agg_train), ('Val', agg_val), ('Test', agg_test)]:
+        t0 = df['timestamp_hora'].min()
+        t1 = df['timestamp_hora'].max()
+        dias = (t1 - t0).days
+        print(f"   {name}: {t0.date()} → {t1.date()} ({dias} días, {len(df):,} registros)")
+
+    # Verificar que no hay solapamiento
+    assert agg_train['timestamp_hora'].max() < agg_val['timestamp_hora'].min(), \
+        "Solapamiento train/val"
+    assert agg_val['timestamp_hora'].max() < agg_test['timestamp_hora'].min(), \
+        "Solapamiento val/test"
+    print("   Sin solapamientos ✓")
+
+    # ── Guardar ───────────────────────────────────────────────────────────────
+    print("\n   Guardando splits agregados...")
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    agg_train.to_parquet(OUT_DIR / 'train.parquet', index=False)
+    agg_val.to_parquet(  OUT_DIR / 'val.parquet',   index=False)
+    agg_test.to_parquet( OUT_DIR / 'test.parquet',  index=False)
+
+    n_total = len(agg_train) + len(agg_val) + len(agg_test)
+    metadata = {
+        'fuente': 'agregacion directa sin sampleo (80M viajes → zona×hora)',
+        'cortes': {
+            'corte_train': str(resultado['corte_train']),
+            'corte_val':   str(resultado['corte_val']),
+        },
+        'split': {
+            s: {
+                'filas':        len(d),
+                'pct':          round(len(d) / n_total * 100, 1),
+                'fecha_inicio': str(d['timestamp_hora'].min()),
+                'fecha_fin':    str(d['timestamp_hora'].max()),
+                'dias':         (d['timestamp_hora'].max() - d['timestamp_hora'].min()).days,
+            }
+            for s, d in [('train', agg_train), ('val', agg_val), ('test', agg_test)]
         }
-        for s, d in [('train', agg_train), ('val', agg_val), ('test', agg_test)]
     }
-}
 
-with open(OUT_DIR / 'metadata.json', 'w') as f:
-    json.dump(metadata, f, indent=2, ensure_ascii=False)
+    with open(OUT_DIR / 'metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+    print(f"   train.parquet: {len(agg_train):,} filas")
+    print(f"   val.parquet:   {len(agg_val):,} filas")
+    print(f"   test.parquet:  {len(agg_test):,} filas")
+    print(f"   metadata.json")
+
+
+def main():
+    manifest = Manifest()
+    if manifest.esta_actualizado(ARTEFACTO, SALIDAS, [PARQUET_PATH], CODIGO, PARAMS):
+        print(" SKIP: splits de problema1 al día con datos_final.parquet")
+        return
+
+    print("="*60)
+    print(" AGREGACIÓN DIRECTA SIN SAMPLEO")
+    print("="*60)
+
+    print("\n1. Rango temporal y cortes (estadísticas del footer)...")
+    plan = planificar()
+
+    print("\n2. Leyendo y agregando por row groups...")
+    resultado = EscaneoCompartido(PARQUET_PATH).registrar('p1', AgregadorZonaHora(plan)).ejecutar()['p1']
+
+    print("\n3. Guardando...")
+    guardar(resultado)
+
+    print("\n" + "="*60)
+    print(" COMPLETADO — siguiente paso: agregacion.py")
+    print("="*60)
+
+    manifest.registrar(ARTEFACTO, SALIDAS, [PARQUET_PATH], CODIGO, PARAMS)
 
-print(f"   train.parquet: {len(agg_train):,} filas")
-print(f"   val.parquet:   {len(agg_val):,} filas")
-print(f"   test.parquet:  {len(agg_test):,} filas")
-print(f"   metadata.json")
 
-print("\n" + "="*60)
-print(" COMPLETADO — siguiente paso: agregacion.py")
-print("="*60)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,7 @@ Objetivo:
 - Guardar tablas CSV para poder revisarlas con calma.
 
 Ejecutar:
-    uv run python src/modelos/problema1/probar_random_forest_reales.py
+    uv run python -m src.modelos.problema1.probar_ejemplos_reales   (desde la raíz del repo)
 """
 
 from pathlib import Path
@@ -19,6 +19,8 @@ import numpy as np
 import pandas as pd
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+from src.pipelines.predicciones import AlmacenPredicciones
+
 
 DATA_DIR = Path("data/processed/tlc_clean/problema1/features")
 MODEL_CANDIDATES = [
@@ -77,9 +79,14 @@ def calc_metrics(y_true: pd.Series, y_pred: pd.Series) -> dict[str, float]:
     }
 
 
-def add_prediction_columns(df: pd.DataFrame, feature_cols: list[str], model) -> pd.DataFrame:
+def add_prediction_columns(df: pd.DataFrame, feature_cols: list[str], model, model_path: Path) -> pd.DataFrame:
     out = df.copy()
-    out["pred_rf"] = np.clip(model.predict(out[feature_cols]), 0, None)
+    # Del almacen de predicciones si el modelo, el test y las features no han cambiado
+    pred = AlmacenPredicciones().obtener(
+        "problema1/rf_test", [model_path], DATA_DIR / "test.parquet", feature_cols,
+        lambda: {"pred_rf": np.clip(model.predict(out[feature_cols]), 0, None)},
+    )
+    out["pred_rf"] = pred["pred_rf"].to_numpy()
     out["pred_naive"] = out["demanda"]
     out["pred_media_hist"] = out["media_hist"]
 
@@ -169,7 +176,7 @@ def main() -> None:
     df_test = pd.read_parquet(DATA_DIR / "test.parquet")
     model = joblib.load(model_path)
 
-    df_test = add_prediction_columns(df_test, feature_cols, model)
+    df_test = add_prediction_columns(df_test, feature_cols, model, model_path)
 
     print(f"\nModelo cargado: {model_path}")
     print(f"Filas de test: {len(df_test):,}")
@@ -0,0 +1,109 @@
+# src/modelos/problema1/secuencias.py
+"""
+Ventanas temporales por zona para los modelos secuenciales de P1
+(lstm.py, lstm2.py, transformer.py).
+
+create_sequences recorría cada zona en un doble bucle Python y copiaba cada
+ventana solapada en una lista que luego pasaba a np.array: lookback copias
+de cada fila (con lookback=24 y 25 features, ~2,4 KB por secuencia). Por eso
+lstm2/transformer se limitaban a las top N zonas y a un máximo de secuencias.
+
+Aquí las filas se ordenan una sola vez por zona y tiempo y cada secuencia es
+solo el índice de su primera fila. sliding_window_view da todas las ventanas
+como una vista sin copia, y SecuenciasZona (un keras.utils.PyDataset) monta
+cada lote al vuelo con esos índices. La memoria es la de X en float32 más un
+int64 por secuencia, así que se puede entrenar con todas las zonas.
+
+Las secuencias y su orden son los mismos que con create_sequences: por zona
+(orden de np.unique), en orden temporal, lookback filas observadas seguidas y
+el target de la fila siguiente; las zonas con menos de lookback+1 filas no
+aportan secuencias.
+
+    ds_tr = SecuenciasZona(X_train_sc, y_train_sc, zona_enc, timestamps, 24,
+                           batch_size=256, shuffle=True)
+    model.fit(ds_tr, validation_data=ds_v, epochs=...)
+    y_pred = model.predict(ds_te)      # alineado con ds_te.objetivos
+"""
+
+import math
+
+import keras
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def indices_secuencias(zona_enc, timestamps, lookback):
+    """
+    (orden, inicios): `orden` ordena las filas por zona y tiempo; `inicios`
+    son las posiciones (en ese orden) donde empieza cada secuencia completa,
+    es decir, las que tienen lookback+1 filas seguidas de la misma zona.
+    """
+    zona_enc = np.asarray(zona_enc)
+    orden = np.lexsort((np.asarray(timestamps), zona_enc))
+    if len(orden) <= lookback:
+        return orden, np.empty(0, dtype=np.int64)
+    z = zona_enc[orden]
+    # Ordenado por zona: la ventana s..s+lookback es de una sola zona si los extremos coinciden
+    inicios = np.flatnonzero(z[:-lookback] == z[lookback:])
+    return orden, inicios
+
+
+class SecuenciasZona(keras.utils.PyDataset):
+    """
+    Dataset de ventanas (lookback, n_features) que se montan por lotes.
+
+    X, y: features y target ya escalados, alineados fila a fila con
+    zona_enc y timestamps. Con max_secuencias se queda con una muestra
+    aleatoria (ordenada) de las secuencias, como el submuestreo de antes;
+    con shuffle se baraja el orden de las secuencias en cada época. El
+    submuestreo usa `rng` (compartido entre train y val si se quiere la misma
+    muestra que antes) y el barajado su propio generador con `semilla`.
+    """
+
+    def __init__(self, X, y, zona_enc, timestamps, lookback, batch_size=256,
+                 shuffle=False, max_secuencias=None, rng=None, semilla=42, **kwargs):
+        super().__init__(**kwargs)
+        orden, inicios = indices_secuencias(zona_enc, timestamps, lookback)
+        if max_secuencias is not None and len(inicios) > max_secuencias:
+            rng = rng if rng is not None else np.random.default_rng(semilla)
+            inicios = inicios[np.sort(rng.choice(len(inicios), max_secuencias, replace=False))]
+
+        # Una sola copia de X, ordenada por zona y tiempo: las ventanas son contiguas
+        self.X = np.ascontiguousarray(np.asarray(X, dtype=np.float32)[orden])
+        self.y = np.asarray(y, dtype=np.float32)[orden]
+        # (n_filas - lookback + 1, n_features, lookback), vista sin copia
+        self.ventanas = sliding_window_view(self.X, lookback, axis=0)
+        self.lookback = lookback
+        self.inicios = inicios
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.permutacion = np.arange(len(inicios))
+        self.rng = np.random.default_rng(semilla)
+        if shuffle:
+            self.rng.shuffle(self.permutacion)
+
+    @property
+    def objetivos(self):
+        """Target de cada secuencia, en el orden de predict (sin barajar)."""
+        return self.y[self.inicios + self.lookback]
+
+    @property
+    def forma(self):
+        return (len(self.inicios), self.lookback, self.X.shape[1])
+
+    def __len__(self):
+        return math.ceil(len(self.inicios) / self.batch_size)
+
+    def __getitem__(self, i):
+        sel = self.inicios[self.permutacion[i * self.batch_size:(i + 1) * self.batch_size]]
+        X_lote = np.ascontiguousarray(self.ventanas[sel].transpose(0, 2, 1))
+        return X_lote, self.y[sel + self.lookback]
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.rng.shuffle(self.permutacion)
+
+    def materializar(self):
+        """Todas las secuencias como arrays (X, y); solo para conjuntos pequeños."""
+        X = self.ventanas[self.inicios].transpose(0, 2, 1).astype(np.float32)
+        return X, self.objetivos
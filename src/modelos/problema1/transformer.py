@@ -1,4 +1,5 @@
 # src/modelos/problema1/transformer.py
+# Uso (desde la raíz del repo): python -m src.modelos.problema1.transformer
 import os, json
 os.environ['KERAS_BACKEND'] = 'jax'
 
@@ -14,6 +15,9 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from pathlib import Path
 
+from src.modelos.problema1.secuencias import SecuenciasZona
+from src.processing.codificador_zonas import CodificadorZonas
+
 np.random.seed(42)
 keras.utils.set_random_seed(42)
 
@@ -33,9 +37,9 @@ CONFIG = {
     'batch_size': 512,
     'learning_rate': 0.001,
     'patience': 15,
-    'top_n_zonas': 50,
-    'max_train_seq': 400_000,
-    'max_val_seq': 100_000,
+    'top_n_zonas': None,     # None = todas las zonas
+    'max_train_seq': None,   # None = todas (los lotes se montan al vuelo)
+    'max_val_seq': None,
 }
 
 # ── 1. Bloque Transformer ────────────────────────────────────────────────────
@@ -66,16 +70,21 @@ df_val   = pd.read_parquet(FEATURES_DIR / 'val.parquet')
 df_test  = pd.read_parquet(FEATURES_DIR / 'test.parquet')
 assert len(df_val) > 0
 
-# Filtrar top-N zonas (mismo criterio que lstm.py para comparación justa)
+# Filtrar top-N zonas (mismo criterio que lstm.py para comparación justa).
+# Opcional: con SecuenciasZona la memoria ya no obliga a limitar las zonas
 TOP_N = CONFIG['top_n_zonas']
-zonas_top = (
-    df_train.groupby('origen_id')['demanda']
-    .sum().nlargest(TOP_N).index
-)
-df_train = df_train[df_train['origen_id'].isin(zonas_top)].copy()
-df_val   = df_val[df_val['origen_id'].isin(zonas_top)].copy()
-df_test  = df_test[df_test['origen_id'].isin(zonas_top)].copy()
-print(f"  Top {TOP_N} zonas → train={len(df_train):,} | val={len(df_val):,} | test={len(df_test):,}")
+if TOP_N:
+    zonas_top = (
+        df_train.groupby('origen_id')['demanda']
+        .sum().nlargest(TOP_N).index
+    )
+    df_train = df_train[df_train['origen_id'].isin(zonas_top)].copy()
+    df_val   = df_val[df_val['origen_id'].isin(zonas_top)].copy()
+    df_test  = df_test[df_test['origen_id'].isin(zonas_top)].copy()
+    DESC_ZONAS = f'top {TOP_N} zonas'
+else:
+    DESC_ZONAS = 'todas las zonas'
+print(f"  {DESC_ZONAS.capitalize()} → train={len(df_train):,} | val={len(df_val):,} | test={len(df_test):,}")
 
 FEATURES = [
     'hora', 'dia_semana', 'dia_mes', 'mes_num', 'es_finde', 'demanda',
@@ -89,10 +98,10 @@ TARGET = 'target'
 # ── 3. Encoding zonas ─────────────────────────────────────────────────────────
 le = LabelEncoder()
 le.fit(df_train['origen_id'])
+codificador = CodificadorZonas.desde_encoder(le)
 for df in [df_train, df_val, df_test]:
-    df['zona_enc'] = df['origen_id'].apply(
-        lambda z: le.transform([z])[0] if z in le.classes_ else -1
-    )
+    # Zonas que no están en train → -1 y se excluyen
+    df['zona_enc'] = codificador.transformar(df['origen_id'])
 df_train = df_train[df_train['zona_enc'] >= 0].copy()
 df_val   = df_val[df_val['zona_enc'] >= 0].copy()
 df_test  = df_test[df_test['zona_enc'] >= 0].copy()
@@ -119,60 +128,37 @@ joblib.dump(scaler_X, MODELS_DIR / 'transformer_scaler_X.pkl')
 joblib.dump(scaler_y, MODELS_DIR / 'transformer_scaler_y.pkl')
 
 # ── 5. Secuencias ─────────────────────────────────────────────────────────────
-def create_sequences(X_sc, y_sc, zona_enc, timestamps, lookback):
-    X_list, y_list = [], []
-    for z in np.unique(zona_enc):
-        mask  = zona_enc == z
-        idx   = np.where(mask)[0]
-        order = np.argsort(timestamps[idx])
-        idx   = idx[order]
-        X_z, y_z = X_sc[idx], y_sc[idx]
-        if len(X_z) < lookback + 1:
-            continue
-        for i in range(len(X_z) - lookback):
-            X_list.append(X_z[i:i+lookback])
-            y_list.append(y_z[i+lookback])
-    return np.array(X_list, dtype=np.float32), np.array(y_list, dtype=np.float32)
-
-LB = CONFIG['lookback']
+# Las ventanas se montan por lotes desde una vista sin copia (ver secuencias.py);
+# el subsampleo (max_*_seq) es opcional y elige las mismas secuencias que antes
+LB  = CONFIG['lookback']
+rng = np.random.default_rng(42)
 print(f"Creando secuencias (lookback={LB}h)...")
 
-X_tr, y_tr = create_sequences(
+ds_tr = SecuenciasZona(
     X_train_sc, y_train_sc,
-    df_train['zona_enc'].values, df_train['timestamp_hora'].values, LB)
+    df_train['zona_enc'].values, df_train['timestamp_hora'].values, LB,
+    batch_size=CONFIG['batch_size'], shuffle=True,
+    max_secuencias=CONFIG['max_train_seq'], rng=rng)
 
-X_v, y_v = create_sequences(
+ds_v = SecuenciasZona(
     X_val_sc, y_val_sc,
-    df_val['zona_enc'].values, df_val['timestamp_hora'].values, LB)
+    df_val['zona_enc'].values, df_val['timestamp_hora'].values, LB,
+    batch_size=512, max_secuencias=CONFIG['max_val_seq'], rng=rng)
 
 y_test_log_sc = scaler_y.transform(
     np.log1p(y_test_real).reshape(-1, 1)).flatten()
-X_te, y_te_sc = create_sequences(
+ds_te = SecuenciasZona(
     X_test_sc, y_test_log_sc,
-    df_test['zona_enc'].values, df_test['timestamp_hora'].values, LB)
+    df_test['zona_enc'].values, df_test['timestamp_hora'].values, LB, batch_size=512)
 
+y_v, y_te_sc = ds_v.objetivos, ds_te.objetivos
 y_te_real_seq = np.expm1(
     scaler_y.inverse_transform(y_te_sc.reshape(-1, 1)).flatten()
 ).clip(0)
 
-print(f"  Train: {X_tr.shape} | Val: {X_v.shape} | Test: {X_te.shape}")
-
-# ── 6. Subsampleo ─────────────────────────────────────────────────────────────
-rng = np.random.default_rng(42)
-
-MAX_TR = CONFIG['max_train_seq']
-if len(X_tr) > MAX_TR:
-    idx = np.sort(rng.choice(len(X_tr), MAX_TR, replace=False))
-    X_tr, y_tr = X_tr[idx], y_tr[idx]
-    print(f"  Subsampling train → {MAX_TR:,}")
-
-MAX_V = CONFIG['max_val_seq']
-if len(X_v) > MAX_V:
-    idx_v = np.sort(rng.choice(len(X_v), MAX_V, replace=False))
-    X_v, y_v = X_v[idx_v], y_v[idx_v]
-    print(f"  Subsampling val → {MAX_V:,}")
+print(f"  Train: {ds_tr.forma} | Val: {ds_v.forma} | Test: {ds_te.forma}")
 
-# ── 7. Construir modelo Transformer ──────────────────────────────────────────
+# ── 6. Construir modelo Transformer ───────────────────────────────────────────
 print("Construyendo Transformer...")
 
 n_features = len(FEATURES)
@@ -214,7 +200,7 @@ model.compile(
 )
 model.summary()
 
-# ── 8. Entrenar ───────────────────────────────────────────────────────────────
+# ── 7. Entrenar ───────────────────────────────────────────────────────────────
 cbs = [
     callbacks.EarlyStopping(
         monitor='val_loss', patience=CONFIG['patience'],
@@ -225,16 +211,15 @@ cbs = [
 ]
 
 history = model.fit(
-    X_tr, y_tr,
-    validation_data=(X_v, y_v),
+    ds_tr,
+    validation_data=ds_v,
     epochs=CONFIG['epochs'],
-    batch_size=CONFIG['batch_size'],
     callbacks=cbs, verbose=1,
 )
 
-# ── 9. Evaluar ────────────────────────────────────────────────────────────────
-def predict_real(X):
-    pred_sc  = model.predict(X, batch_size=512, verbose=0).flatten()
+# ── 8. Evaluar ────────────────────────────────────────────────────────────────
+def predict_real(ds):
+    pred_sc  = model.predict(ds, verbose=0).flatten()
     pred_log = scaler_y.inverse_transform(pred_sc.reshape(-1, 1)).flatten()
     return np.clip(np.expm1(pred_log), 0, None)
 
@@ -249,19 +234,19 @@ def metrics(y_true, y_pred, label=""):
 
 y_v_real = np.expm1(
     scaler_y.inverse_transform(y_v.reshape(-1, 1)).flatten()).clip(0)
-y_v_pred  = predict_real(X_v)
-y_te_pred = predict_real(X_te)
+y_v_pred  = predict_real(ds_v)
+y_te_pred = predict_real(ds_te)
 
 print("\nRESULTADOS:")
 m_val  = metrics(y_v_real,      y_v_pred,  "Val ")
 m_test = metrics(y_te_real_seq, y_te_pred, "Test")
 
-# ── 10. Guardar ───────────────────────────────────────────────────────────────
+# ── 9. Guardar ────────────────────────────────────────────────────────────────
 model.save(MODELS_DIR / 'transformer_model.keras')
 
 results = {
     'modelo': 'Transformer',
-    'nota': f'Transformer encoder sobre top {TOP_N} zonas. '
+    'nota': f'Transformer encoder sobre {DESC_ZONAS}. '
             f'Positional encoding aprendido. {CONFIG["num_blocks"]} bloques, '
             f'{CONFIG["num_heads"]} cabezas de atención.',
     'config': {k: v for k, v in CONFIG.items()},
@@ -272,7 +257,7 @@ results = {
 with open(RESULTS_DIR / 'transformer_results.json', 'w') as f:
     json.dump(results, f, indent=2)
 
-# ── 11. Plots ─────────────────────────────────────────────────────────────────
+# ── 10. Plots ─────────────────────────────────────────────────────────────────
 fig, axes = plt.subplots(1, 3, figsize=(16, 4))
 
 axes[0].plot(history.history['loss'],     label='Train', color='#2c3e50')
@@ -288,11 +273,11 @@ axes[1].set_xlabel('Época'); axes[1].legend(); axes[1].grid(alpha=0.3)
 n = min(300, len(y_te_real_seq))
 axes[2].plot(y_te_real_seq[:n], label='Real',            color='#2c3e50', lw=2)
 axes[2].plot(y_te_pred[:n],     label='Transformer pred', color='#3498db', lw=1.5, alpha=0.8)
-axes[2].set_title('Predicho vs Real — Test (top zonas)', fontweight='bold')
+axes[2].set_title(f'Predicho vs Real — Test ({DESC_ZONAS})', fontweight='bold')
 axes[2].set_xlabel('Timestep'); axes[2].set_ylabel('Viajes/hora')
 axes[2].legend(); axes[2].grid(alpha=0.3)
 
-plt.suptitle(f'Transformer — Top {TOP_N} zonas (Problema 1)', fontweight='bold')
+plt.suptitle(f'Transformer — {DESC_ZONAS.capitalize()} (Problema 1)', fontweight='bold')
 plt.tight_layout()
 plt.savefig(PLOTS_DIR / 'transformer_resultados.png', dpi=150, bbox_inches='tight')
 plt.show()
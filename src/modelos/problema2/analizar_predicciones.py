@@ -1,4 +1,5 @@
 # src/modelos/problema2/analizar_predicciones.py
+# Uso (desde la raíz del repo): python -m src.modelos.problema2.analizar_predicciones
 
 import json
 import joblib
@@ -10,6 +11,9 @@ import seaborn as sns
 from pathlib import Path
 from sklearn.metrics import roc_auc_score, confusion_matrix, classification_report, precision_recall_curve
 
+from src.pipelines.predicciones import AlmacenPredicciones
+from src.processing.codificador_zonas import CodificadorZonas
+
 print("=" * 90)
 print("ANALISIS DETALLADO DE PREDICCIONES - MLP (PROBLEMA 2)")
 print("=" * 90)
@@ -20,31 +24,38 @@ MODEL_DIR    = Path('models/problema2')
 REPORTS_DIR  = Path('reports/problema2/plots')
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 
-# 1. CARGAR DATOS Y MODELO
-print("Cargando datos y modelos...")
+# 1. CARGAR DATOS
+print("Cargando datos...")
 df_test = pd.read_parquet(FEATURES_DIR / 'test.parquet')
 with open(FEATURES_DIR / 'metadata.json') as f:
     meta = json.load(f)
 
-scaler = joblib.load(MODEL_DIR / 'mlp_scaler.pkl')
-le = joblib.load(MODEL_DIR / 'zona_encoder.pkl')
-
-import keras
-model = keras.models.load_model(MODEL_DIR / 'mlp_model.keras')
+# Artefactos del modelo: forman parte de la clave del almacén de predicciones
+MODELOS_MLP = [MODEL_DIR / 'mlp_model.keras', MODEL_DIR / 'mlp_scaler.pkl', MODEL_DIR / 'zona_encoder.pkl']
 
 # 2. PREPARAR FEATURES
 # Identificar columnas según el entrenamiento (excluyendo origen_id que se codifica aparte)
 FEATURES_NUM = [f for f in meta['feature_cols'] if f != 'origen_id']
-df_test['zona_enc'] = df_test['origen_id'].apply(lambda z: le.transform([z])[0] if z in le.classes_ else -1)
 FEATURES_FINAL = FEATURES_NUM + ['zona_enc']
-
-X_test_raw = df_test[FEATURES_FINAL].fillna(0)
-X_test_sc = scaler.transform(X_test_raw)
 y_test = df_test['target'].values
 
-# 3. GENERAR PREDICCIONES
+def predecir_mlp():
+    # Solo se cargan los modelos si las predicciones no están en el almacén
+    scaler = joblib.load(MODEL_DIR / 'mlp_scaler.pkl')
+    codificador = CodificadorZonas.desde_encoder(joblib.load(MODEL_DIR / 'zona_encoder.pkl'))
+    import keras
+    model = keras.models.load_model(MODEL_DIR / 'mlp_model.keras')
+
+    zona_enc = codificador.transformar(df_test['origen_id'])
+    X_test_raw = df_test[FEATURES_NUM].assign(zona_enc=zona_enc)[FEATURES_FINAL].fillna(0)
+    X_test_sc = scaler.transform(X_test_raw)
+    return {'prob_mlp': model.predict(X_test_sc, batch_size=2048, verbose=0).flatten()}
+
+# 3. GENERAR PREDICCIONES (del almacén si modelo, test y features no han cambiado)
 print("Generando predicciones con la Red Neuronal...")
-probs = model.predict(X_test_sc, batch_size=2048, verbose=0).flatten()
+probs = AlmacenPredicciones().obtener(
+    'problema2/mlp_test', MODELOS_MLP, FEATURES_DIR / 'test.parquet', FEATURES_FINAL, predecir_mlp
+)['prob_mlp'].to_numpy()
 preds = (probs >= 0.5).astype(int)
 
 df_test['prob_mlp'] = probs
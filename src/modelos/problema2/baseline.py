@@ -1,4 +1,5 @@
 # src/modelos/problema2/baseline.py
+# Uso (desde la raíz del repo): python -m src.modelos.problema2.baseline
 import pandas as pd
 import numpy as np
 import json, joblib
@@ -10,6 +11,8 @@ from sklearn.metrics import (roc_auc_score, classification_report,
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 
+from src.processing.codificador_zonas import CodificadorZonas
+
 FEATURES_DIR = Path('data/processed/tlc_clean/problema2/features')
 MODELS_DIR   = Path('models/problema2');    MODELS_DIR.mkdir(parents=True, exist_ok=True)
 PLOTS_DIR    = Path('reports/problema2/plots');      PLOTS_DIR.mkdir(parents=True, exist_ok=True)
@@ -40,9 +43,9 @@ print(f"  Balance target — positivos: {df_train[TARGET].mean():.1%}")
 from sklearn.preprocessing import LabelEncoder
 le = LabelEncoder()
 le.fit(df_train['origen_id'])
+codificador = CodificadorZonas.desde_encoder(le)
 for df in [df_train, df_val, df_test]:
-    df['zona_enc'] = df['origen_id'].apply(
-        lambda z: le.transform([z])[0] if z in le.classes_ else -1)
+    df['zona_enc'] = codificador.transformar(df['origen_id'])
 
 FEATURES_FINAL = FEATURES_NUM + ['zona_enc']
 
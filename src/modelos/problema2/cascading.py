@@ -0,0 +1,237 @@
+# src/modelos/problema2/cascading.py
+"""
+Cascading input del Problema 1 para P2: demanda_p1 es la predicción del RF
+de P1 con features reconstruidas desde las filas de P2 (lags del cubo de
+demanda o, donde no hay, proxies de oferta_inferida y tasa_historica).
+
+features.py montaba un DataFrame float64 de 26 columnas con el split entero
+y llamaba a rf_p1.predict de una vez, y reentrenar_mlp.py hacía lo mismo en
+trozos de 500k filas en serie. Aquí, por trozos:
+  - las features se escriben en un buffer float32 que se reutiliza. Es el
+    dtype al que sklearn convierte X antes de recorrer los árboles, así que
+    las predicciones son las mismas,
+  - cada fila distinta se predice una sola vez. Las features solo dependen
+    de la zona, el calendario, el clima, la oferta y los lags horarios, y
+    en una zona y hora se repiten entre ventanas de 10 min; las filas vienen
+    ordenadas por zona y ventana, así que las repeticiones caen en el mismo
+    trozo,
+  - los trozos se predicen en un pool de procesos creado con fork: los hijos
+    heredan el modelo ya cargado (sin serializarlo) y los scripts de
+    features, que son de nivel de módulo, no se vuelven a ejecutar. Donde no
+    hay fork se predice en el propio proceso.
+
+    pred = predecir_demanda_p1(rf_p1, df, recientes=lags_del_cubo)
+
+Para un split leído por row groups, predecir_demanda_p1_lotes usa un solo
+pool para todos y forma los trozos sobre row groups consecutivos:
+
+    for df, pred in predecir_demanda_p1_lotes(rf_p1, ((df, None) for df in grupos), media):
+        ...
+"""
+
+import multiprocessing
+import os
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+
+# Features del RF de P1, en el orden con el que se entrenó
+COLUMNAS_P1 = [
+    'origen_id', 'hora', 'dia_semana', 'dia_mes', 'mes_num', 'es_finde',
+    'demanda', 'lag_1h', 'lag_2h', 'lag_3h', 'lag_6h', 'lag_12h', 'lag_24h',
+    'roll_mean_3h', 'roll_std_3h', 'roll_mean_24h', 'roll_std_24h', 'media_hist',
+    'temp_c', 'precipitation', 'viento_kmh', 'velocidad_mph',
+    'lluvia', 'nieve', 'es_festivo', 'num_eventos',
+]
+TAM_TROZO = 500_000
+
+# Modelo que heredan los procesos del pool (se fija justo antes de crearlo)
+_MODELO = None
+
+
+def _columna(df, nombre):
+    # Con su dtype original: las operaciones dan lo mismo que con la Serie de pandas
+    serie = df[nombre]
+    if isinstance(serie.dtype, np.dtype):
+        return serie.to_numpy()
+    return serie.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def features_p1(df, oferta_media, recientes=None, columnas=COLUMNAS_P1, out=None):
+    """
+    Features del RF de P1 para filas de P2 como array float32 (n, columnas).
+    `recientes` ({columna: array alineado con df}, NaN donde no hay dato)
+    sustituye a los proxies; donde es NaN queda el proxy (también roll_std
+    sin horas previas, que en el features.py original de P1 era 0); `out` es un buffer a reutilizar con al menos
+    len(df) filas.
+    """
+    oferta = _columna(df, 'oferta_inferida')
+    tasa = _columna(df, 'tasa_historica')
+    viento = _columna(df, 'viento_kmh')
+    valores = {
+        'origen_id':    _columna(df, 'origen_id'),
+        'hora':         _columna(df, 'hora'),
+        'dia_semana':   _columna(df, 'dia_semana'),
+        'dia_mes':      df['ventana_inicio'].dt.day.to_numpy(),
+        'mes_num':      _columna(df, 'mes_num'),
+        'es_finde':     _columna(df, 'es_finde'),
+        # Proxies para lag features — oferta como proxy de demanda reciente
+        'demanda':      oferta,
+        'lag_1h':       oferta,
+        'lag_2h':       oferta,
+        'lag_3h':       oferta,
+        'lag_6h':       oferta,
+        'lag_12h':      oferta,
+        'lag_24h':      tasa * oferta_media,
+        'roll_mean_3h': oferta,
+        'roll_std_3h':  oferta * 0.1,
+        'roll_mean_24h':oferta,
+        'roll_std_24h': oferta * 0.1,
+        'media_hist':   tasa * oferta_media,
+        'temp_c':       _columna(df, 'temp_c'),
+        'precipitation':_columna(df, 'precipitation'),
+        'viento_kmh':   viento,
+        'velocidad_mph':viento * 0.621,  # conversión aproximada
+        'lluvia':       _columna(df, 'lluvia'),
+        'nieve':        _columna(df, 'nieve'),
+        'es_festivo':   _columna(df, 'es_festivo'),
+        'num_eventos':  _columna(df, 'num_eventos'),
+    }
+    for col, reciente in (recientes or {}).items():
+        if col in valores:
+            valores[col] = np.where(np.isnan(reciente), valores[col], reciente)
+
+    X = np.empty((len(df), len(columnas)), dtype=np.float32) if out is None else out[:len(df)]
+    for j, col in enumerate(columnas):
+        X[:, j] = valores[col]
+    return X
+
+
+def filas_unicas(X):
+    """(filas distintas de X, inversa) comparando los bytes de cada fila."""
+    X = np.ascontiguousarray(X)
+    filas = X.view(np.dtype((np.void, X.dtype.itemsize * X.shape[1]))).ravel()
+    _, indice, inversa = np.unique(filas, return_index=True, return_inverse=True)
+    return X[indice], inversa.ravel()
+
+
+def _iniciar_worker():
+    # El paralelismo ya es por trozos: cada proceso predice con un solo hilo
+    if hasattr(_MODELO, 'n_jobs'):
+        _MODELO.n_jobs = 1
+
+
+def _predecir(X, modelo=None):
+    modelo = _MODELO if modelo is None else modelo
+    with warnings.catch_warnings():
+        # X va como array (no DataFrame); el orden de columnas ya se comprobó
+        warnings.filterwarnings('ignore', message='X does not have valid feature names')
+        return modelo.predict(X)
+
+
+def predecir_demanda_p1(modelo, df, columnas=COLUMNAS_P1, recientes=None, oferta_media=None,
+                        tam_trozo=TAM_TROZO, workers=None):
+    """
+    demanda_p1 (float64, recortada a >= 0) para cada fila de df con el RF de
+    P1 ya cargado. `oferta_media` por defecto es la media de oferta_inferida
+    de df; `workers` (por defecto todos los núcleos) = 1 predice en este
+    proceso.
+    """
+    if oferta_media is None:
+        oferta_media = float(df['oferta_inferida'].mean())
+    tam_trozo = max(min(tam_trozo, len(df)), 1)
+    (_, pred), = predecir_demanda_p1_lotes(modelo, [(df, recientes)], oferta_media, columnas, tam_trozo, workers)
+    return pred
+
+
+def predecir_demanda_p1_lotes(modelo, lotes, oferta_media, columnas=COLUMNAS_P1,
+                              tam_trozo=TAM_TROZO, workers=None):
+    """
+    predecir_demanda_p1 para una secuencia de DataFrames (p. ej. los row
+    groups de un split): `lotes` da pares (df, recientes) y se devuelven
+    (yield) pares (df, demanda_p1) en el mismo orden, en cuanto están
+    calculados. El pool se crea una vez para toda la secuencia y los trozos
+    de tam_trozo filas se forman sobre lotes consecutivos, así que las
+    repeticiones se quitan igual que con el split entero aunque caigan en
+    row groups distintos. En memoria quedan solo los lotes de los trozos en
+    vuelo (unos pocos por proceso). oferta_media va aparte porque es la de
+    toda la secuencia.
+    """
+    global _MODELO
+    columnas = list(columnas)
+    esperadas = getattr(modelo, 'feature_names_in_', None)
+    if esperadas is not None and list(esperadas) != columnas:
+        raise ValueError(f"El modelo espera las features {list(esperadas)}, no {columnas}")
+
+    workers = workers or os.cpu_count() or 1
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        workers = 1
+
+    t0 = time.perf_counter()
+    buffer = np.empty((tam_trozo, len(columnas)), dtype=np.float32)
+    n = n_unicas = en_buffer = 0
+    trozos = deque()     # (futuro o predicción, inversa) de cada trozo, en orden
+    esperando = deque()  # lotes aún no devueltos
+    listas = []          # predicciones ya calculadas que no se han devuelto
+    n_listas = 0
+
+    def cerrar_trozo():
+        nonlocal en_buffer, n_unicas
+        X_unicas, inversa = filas_unicas(buffer[:en_buffer])
+        n_unicas += len(X_unicas)
+        en_buffer = 0
+        if workers > 1:
+            trozos.append((pool.submit(_predecir, X_unicas), inversa))
+        else:
+            trozos.append((_predecir(X_unicas, modelo), inversa))
+
+    def recoger(hasta):
+        # Espera trozos hasta dejar como mucho `hasta` en vuelo y devuelve los lotes completos
+        nonlocal n_listas
+        while len(trozos) > hasta:
+            pred, inversa = trozos.popleft()
+            pred = pred.result() if workers > 1 else pred
+            listas.append(pred[inversa])
+            n_listas += len(inversa)
+        while esperando and n_listas >= len(esperando[0]):
+            todas = np.concatenate(listas) if listas else np.empty(0)
+            df = esperando.popleft()
+            k = len(df)
+            listas[:] = [todas[k:]]
+            n_listas -= k
+            yield df, np.clip(todas[:k], 0, None).astype(np.float64)
+
+    _MODELO = modelo
+    pool = (
+        ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'), initializer=_iniciar_worker)
+        if workers > 1 else nullcontext()
+    )
+    try:
+        with pool:
+            for df, recientes in lotes:
+                esperando.append(df)
+                n += len(df)
+                inicio = 0
+                while inicio < len(df):
+                    fin = min(inicio + tam_trozo - en_buffer, len(df))
+                    rec = {c: np.asarray(v)[inicio:fin] for c, v in (recientes or {}).items()}
+                    features_p1(df.iloc[inicio:fin], oferta_media, rec, columnas, out=buffer[en_buffer:])
+                    en_buffer += fin - inicio
+                    inicio = fin
+                    if en_buffer == tam_trozo:
+                        cerrar_trozo()
+                # Un trozo en vuelo por proceso (más el que se está montando)
+                yield from recoger(workers)
+            if en_buffer:
+                cerrar_trozo()
+            yield from recoger(0)
+    finally:
+        _MODELO = None
+
+    if n:
+        print(f"  demanda_p1: {n:,} filas, {n_unicas:,} distintas ({n_unicas / n:.0%}) | "
+              f"{workers} proceso(s) | {time.perf_counter() - t0:.1f}s")
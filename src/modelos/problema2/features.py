@@ -1,4 +1,5 @@
 # src/modelos/problema2/features.py
+# Uso (desde la raíz del repo): python -m src.modelos.problema2.features
 """
 Añade tasa histórica (calculada solo desde train) y
 el cascading input del Problema 1 (predicción de demanda RF).
@@ -9,6 +10,9 @@ import numpy as np
 import json, joblib
 from pathlib import Path
 
+from src.modelos.problema2.cascading import predecir_demanda_p1
+from src.processing.cubo_demanda import CUBO_DIR, CuboDemanda, demanda_reciente_cubo
+
 RAW_DIR = Path('data/processed/tlc_clean/problema2/raw')
 OUT_DIR = Path('data/processed/tlc_clean/problema2/features')
 OUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -54,47 +58,30 @@ feat_p1    = json.load(open('reports/problema1/resultados/baseline_results.json'
 # El RF usa: origen_id, hora, dia_semana, dia_mes, mes_num, es_finde,
 #            demanda, lags, rolling, media_hist, clima
 
-# Como no tenemos lags en P2, usamos la tasa_historica como proxy de demanda
-# y rellenamos los lags con la media de la zona
+# Los lags salen del cubo de demanda (src.processing.cubo_demanda): demanda
+# real de la última hora completa antes de la ventana y de las anteriores,
+# así el RF predice la demanda de la hora de la ventana sin ver el futuro.
+# Sin cubo (o fuera de su rango) se usan proxies: oferta_inferida y
+# tasa_historica. reentrenar_mlp y el despliegue usan el mismo constructor
+# (demanda_reciente en cubo_demanda)
+cubo = CuboDemanda.abrir(CUBO_DIR) if (CUBO_DIR / 'meta.json').exists() else None
+print(f"  Lags de demanda: {'cubo ' + str(CUBO_DIR) if cubo is not None else 'proxies de oferta (no hay cubo)'}")
+
+def demanda_reciente(df):
+    """demanda, lag_kh y rolling de la hora anterior a cada ventana (NaN donde el cubo no llega)."""
+    if cubo is None:
+        return {}
+    return demanda_reciente_cubo(cubo, df['origen_id'], df['ventana_inicio'])
 
 def generar_cascading(df):
     """
     Genera una estimación de demanda usando variables disponibles.
-    El RF de P1 espera lag features — usamos oferta_inferida y tasa_historica
-    como proxies razonables para las más importantes (lag_1h, media_hist).
+    El RF de P1 espera lag features — salen del cubo; donde no hay,
+    oferta_inferida y tasa_historica hacen de proxies (lag_1h, media_hist).
+    Features en float32 por trozos, filas repetidas una vez y un pool de
+    procesos (ver cascading.py).
     """
-    # Features disponibles directamente
-    feats = pd.DataFrame({
-        'origen_id':    df['origen_id'],
-        'hora':         df['hora'],
-        'dia_semana':   df['dia_semana'],
-        'dia_mes':      df['ventana_inicio'].dt.day,
-        'mes_num':      df['mes_num'],
-        'es_finde':     df['es_finde'],
-        # Proxies para lag features — oferta como proxy de demanda reciente
-        'demanda':      df['oferta_inferida'],
-        'lag_1h':       df['oferta_inferida'],
-        'lag_2h':       df['oferta_inferida'],
-        'lag_3h':       df['oferta_inferida'],
-        'lag_6h':       df['oferta_inferida'],
-        'lag_12h':      df['oferta_inferida'],
-        'lag_24h':      df['tasa_historica'] * df['oferta_inferida'].mean(),
-        'roll_mean_3h': df['oferta_inferida'],
-        'roll_std_3h':  df['oferta_inferida'] * 0.1,
-        'roll_mean_24h':df['oferta_inferida'],
-        'roll_std_24h': df['oferta_inferida'] * 0.1,
-        'media_hist':   df['tasa_historica'] * df['oferta_inferida'].mean(),
-        'temp_c':       df['temp_c'],
-        'precipitation':df['precipitation'],
-        'viento_kmh':   df['viento_kmh'],
-        'velocidad_mph':df['viento_kmh'] * 0.621,  # conversión aproximada
-        'lluvia':       df['lluvia'],
-        'nieve':        df['nieve'],
-        'es_festivo':   df['es_festivo'],
-        'num_eventos':  df['num_eventos'],
-    })
-    pred = rf_p1.predict(feats)
-    return np.clip(pred, 0, None)
+    return predecir_demanda_p1(rf_p1, df, recientes=demanda_reciente(df))
 
 df_train['demanda_p1'] = generar_cascading(df_train)
 df_val['demanda_p1']   = generar_cascading(df_val)
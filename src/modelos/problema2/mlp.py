@@ -1,4 +1,5 @@
 # src/modelos/problema2/mlp.py
+# Uso (desde la raíz del repo): python -m src.modelos.problema2.mlp
 import os, json
 os.environ['KERAS_BACKEND'] = 'jax'
 
@@ -14,6 +15,9 @@ from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import roc_auc_score, average_precision_score, classification_report
 from pathlib import Path
 
+from src.modelos.lotes_parquet import LotesParquet, Rendimiento, ajustar_scaler
+from src.processing.codificador_zonas import CodificadorZonas
+
 np.random.seed(42)
 keras.utils.set_random_seed(42)
 
@@ -32,48 +36,50 @@ CONFIG = {
 }
 
 # ── 1. Cargar ─────────────────────────────────────────────────────────────────
+# Los splits se leen por row groups al entrenar (ver src/modelos/lotes_parquet.py)
 print("Cargando features...")
-df_train = pd.read_parquet(FEATURES_DIR / 'train.parquet')
-df_val   = pd.read_parquet(FEATURES_DIR / 'val.parquet')
-df_test  = pd.read_parquet(FEATURES_DIR / 'test.parquet')
+RUTAS = {s: FEATURES_DIR / f'{s}.parquet' for s in ('train', 'val', 'test')}
 
 with open(FEATURES_DIR / 'metadata.json') as f:
     meta = json.load(f)
 
 FEATURES_NUM = [f for f in meta['feature_cols'] if f != 'origen_id']
 TARGET = 'target'
-
-print(f"  Train: {len(df_train):,} | Val: {len(df_val):,} | Test: {len(df_test):,}")
+COLUMNAS = FEATURES_NUM + ['origen_id', TARGET]
 
 # ── 2. Encoding zona ──────────────────────────────────────────────────────────
 le = joblib.load(MODELS_DIR / 'zona_encoder.pkl')
-for df in [df_train, df_val, df_test]:
-    df['zona_enc'] = df['origen_id'].apply(
-        lambda z: le.transform([z])[0] if z in le.classes_ else -1)
+codificador = CodificadorZonas.desde_encoder(le)
 
 FEATURES_FINAL = FEATURES_NUM + ['zona_enc']
 
-X_train = df_train[FEATURES_FINAL].fillna(0).values.astype(np.float32)
-X_val   = df_val[FEATURES_FINAL].fillna(0).values.astype(np.float32)
-X_test  = df_test[FEATURES_FINAL].fillna(0).values.astype(np.float32)
-y_train = df_train[TARGET].values.astype(np.float32)
-y_val   = df_val[TARGET].values.astype(np.float32)
-y_test  = df_test[TARGET].values.astype(np.float32)
+def matriz(df):
+    """Features finales (con zona_enc) de un trozo como float32."""
+    df = df.assign(zona_enc=codificador.transformar(df['origen_id']))
+    return df[FEATURES_FINAL].fillna(0).to_numpy(dtype=np.float32)
 
 # ── 3. Normalizar ─────────────────────────────────────────────────────────────
-scaler = StandardScaler()
-X_train = scaler.fit_transform(X_train)
-X_val   = scaler.transform(X_val)
-X_test  = scaler.transform(X_test)
+# Scaler ajustado row group a row group (partial_fit), sin cargar train entero
+scaler = ajustar_scaler(RUTAS['train'], matriz, columnas=COLUMNAS)
 joblib.dump(scaler, MODELS_DIR / 'mlp_scaler.pkl')
 
+def preparar(df):
+    return scaler.transform(matriz(df)).astype(np.float32), df[TARGET].to_numpy(dtype=np.float32)
+
 # Balance de clases
 pos_weight = 0.5  # Esto hará que el modelo sea un poco más exigente para dar un "1"
 # pos_weight = float((y_train == 0).sum() / (y_train == 1).sum())
 print(f"  Peso clase positiva: {pos_weight:.2f}")
 
+# Lotes float32 servidos desde el parquet (los pesos de clase van en cada lote)
+ds_train = LotesParquet(RUTAS['train'], preparar, CONFIG['batch_size'], columnas=COLUMNAS,
+                        shuffle=True, pesos_clase={0: pos_weight, 1: 1.0})
+ds_val   = LotesParquet(RUTAS['val'],  preparar, 1024, columnas=COLUMNAS)
+ds_test  = LotesParquet(RUTAS['test'], preparar, 1024, columnas=COLUMNAS)
+print(f"  Train: {ds_train.num_filas:,} | Val: {ds_val.num_filas:,} | Test: {ds_test.num_filas:,}")
+
 # ── 4. Modelo MLP ─────────────────────────────────────────────────────────────
-inputs = keras.Input(shape=(X_train.shape[1],))
+inputs = keras.Input(shape=(len(FEATURES_FINAL),))
 x = inputs
 for units in CONFIG['hidden_layers']:
     x = layers.Dense(units, activation='relu')(x)
@@ -96,14 +102,13 @@ cbs = [
     callbacks.ReduceLROnPlateau(monitor='val_AUC', factor=0.5, patience=5,
                                 min_lr=1e-6, verbose=1, mode='max'),
 ]
+rendimiento = Rendimiento(ds_train)
 
 history = model.fit(
-    X_train, y_train,
-    validation_data=(X_val, y_val),
+    ds_train,
+    validation_data=ds_val,
     epochs=CONFIG['epochs'],
-    batch_size=CONFIG['batch_size'],
-    class_weight={0: pos_weight, 1: 1.0},
-    callbacks=cbs, verbose=1,
+    callbacks=cbs + [rendimiento], verbose=1,
 )
 
 # ── 6. Evaluar ────────────────────────────────────────────────────────────────
@@ -117,8 +122,9 @@ def metrics(y_true, y_prob, label=""):
         print(f"  {label}: AUC={auc:.4f}  AP={ap:.4f}  F1={f1:.4f}")
     return {'auc': auc, 'ap': ap, 'f1': f1}
 
-prob_val  = model.predict(X_val,  batch_size=1024, verbose=0).flatten()
-prob_test = model.predict(X_test, batch_size=1024, verbose=0).flatten()
+prob_val  = model.predict(ds_val,  verbose=0).flatten()
+prob_test = model.predict(ds_test, verbose=0).flatten()
+y_val, y_test = ds_val.objetivos(), ds_test.objetivos()
 
 print("\nRESULTADOS:")
 m_val  = metrics(y_val,  prob_val,  "Val ")
@@ -135,6 +141,7 @@ results = {
     'nota': 'Incluye demanda_p1 como cascading input del Problema 1',
     'config': CONFIG,
     'features': FEATURES_FINAL,
+    'muestras_s': [round(v) for v in rendimiento.muestras_s],
     'val':  m_val,
     'test': m_test,
 }
@@ -6,68 +6,42 @@ Agrega el dataset raw a zona×ventana10min y añade:
             (zona relativamente buena en ese momento — ~50% positivos)
 
 División temporal: 70/15/15 por fecha (igual que Problema 1).
+
+El rango temporal y los cortes salen del footer del parquet; oferta y
+agregados, del mismo pase del escaneo compartido (src.processing.escaneo).
+Antes se leía datos_final dos veces.
+
+El percentil 67 de cada ventana (target) se calcula vectorizado sobre los
+desplazamientos de cada grupo ordenado; con --paridad se compara con el
+groupby/transform de pandas sobre los splits guardados.
+
+Uso (desde la raíz del repo): python -m src.modelos.problema2.preparar_datos [--paridad]
 """
 
-import pyarrow.parquet as pq
-import pyarrow.compute as pc
 import pandas as pd
 import numpy as np
-import json, os
+import json
+import sys
+import time
 from pathlib import Path
 
+from src.pipelines.manifest import Manifest, hash_codigo
+from src.processing import acumulador, escaneo, lectura
+from src.processing.acumulador import AcumuladorGrupos, clave_zona_ventana, tabla_zona_ventana, unir_por_clave
+from src.processing.escaneo import Consumidor, EscaneoCompartido
+from src.processing.lectura import planificar_cortes
+
 PARQUET_PATH = 'data/processed/tlc_clean/datos_final.parquet'
 OUT_DIR      = Path('data/processed/tlc_clean/problema2/raw')
-OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 SPLIT = (0.70, 0.85)
 
-print("="*60)
-print(" PROBLEMA 2 — PREPARACIÓN DE DATOS")
-print("="*60)
-
-# ── 1. Rango temporal ─────────────────────────────────────────────────────────
-print("\n1. Calculando rango temporal...")
-pf = pq.ParquetFile(PARQUET_PATH)
-t_min, t_max = None, None
-
-for i in range(pf.num_row_groups):
-    batch = pf.read_row_group(i, columns=['fecha_inicio'])
-    col   = batch.column('fecha_inicio')
-    bmin  = pd.Timestamp(pc.min(col).as_py())
-    bmax  = pd.Timestamp(pc.max(col).as_py())
-    t_min = bmin if t_min is None else min(t_min, bmin)
-    t_max = bmax if t_max is None else max(t_max, bmax)
-    print(f"\r   Row group {i+1}/{pf.num_row_groups}...", end='', flush=True)
-
-rango       = t_max - t_min
-corte_train = (t_min + rango * SPLIT[0]).floor('10min')
-corte_val   = (t_min + rango * SPLIT[1]).floor('10min')
-print(f"\n   Período: {t_min} → {t_max}")
-print(f"   Corte train: {corte_train}")
-print(f"   Corte val:   {corte_val}")
-
-# ── 2. Calcular oferta inferida global ────────────────────────────────────────
-print("\n2. Calculando oferta inferida (destino × ventana_fin)...")
-
-chunks_oferta = []
-for i in range(pf.num_row_groups):
-    batch = pf.read_row_group(i, columns=['destino_id', 'fecha_fin'])
-    df_o  = batch.to_pandas()
-    df_o['fecha_fin']      = pd.to_datetime(df_o['fecha_fin'])
-    df_o['ventana_oferta'] = df_o['fecha_fin'].dt.floor('10min')
-    agg = (df_o.groupby(['destino_id', 'ventana_oferta'])
-               .size().reset_index(name='oferta_inferida'))
-    chunks_oferta.append(agg)
-    print(f"\r   Row group {i+1}/{pf.num_row_groups}...", end='', flush=True)
-
-oferta = (pd.concat(chunks_oferta, ignore_index=True)
-            .groupby(['destino_id', 'ventana_oferta'])['oferta_inferida']
-            .sum().reset_index())
-del chunks_oferta
-print(f"\n   Registros oferta: {len(oferta):,}")
-
-# ── 3. Agregar viajes a zona×ventana10min ─────────────────────────────────────
-print("\n3. Agregando viajes por zona y ventana de 10 min...")
+# Ejecución incremental: si datos_final.parquet y este script no han cambiado,
+# los splits existentes siguen siendo válidos
+ARTEFACTO = 'problema2/raw'
+SALIDAS   = [OUT_DIR / f'{s}.parquet' for s in ('train', 'val', 'test')] + [OUT_DIR / 'metadata.json']
+CODIGO    = hash_codigo(__file__, escaneo, lectura, acumulador)
+PARAMS    = {'split': SPLIT}
 
 COLS = [
     'fecha_inicio', 'origen_id', 'espera_min',
@@ -76,148 +50,285 @@ COLS = [
     'temp_c', 'precipitation', 'viento_kmh', 'lluvia', 'nieve',
     'es_festivo', 'num_eventos',
 ]
+COLS_OFERTA = ['destino_id', 'fecha_fin']
+
+
+def planificar(ruta=PARQUET_PATH):
+    """Rango temporal y cortes train/val/test leídos del footer (sin leer columnas)."""
+    plan = planificar_cortes(ruta, SPLIT, '10min')
+    print(f"   Período: {plan['t_min']} → {plan['t_max']}")
+    print(f"   Corte train: {plan['corte_train']}")
+    print(f"   Corte val:   {plan['corte_val']}")
+    est = plan['filas_estimadas']
+    print(f"   Viajes estimados: train={est['train']:,} val={est['val']:,} test={est['test']:,}")
+    return plan
+
+
+# Agregación zona×ventana10min, exacta aunque una ventana caiga en varios
+# row groups (se acumulan sumas y conteos, no medias de cada chunk)
+AGREGACIONES = {
+    'n_viajes':      ('espera_min',    'count'),
+    'tasa_exito':    ('exito',         'mean'),
+    'espera_media':  ('espera_min',    'mean'),
+    'hora':          ('hora',          'first'),
+    'dia_semana':    ('dia_semana',    'first'),
+    'es_finde':      ('es_fin_semana', 'first'),
+    'hora_sen':      ('hora_sen',      'first'),
+    'hora_cos':      ('hora_cos',      'first'),
+    'mes_num':       ('mes_num',       'first'),
+    'temp_c':        ('temp_c',        'mean'),
+    'precipitation': ('precipitation', 'mean'),
+    'viento_kmh':    ('viento_kmh',    'mean'),
+    'lluvia':        ('lluvia',        'max'),
+    'nieve':         ('nieve',         'max'),
+    'es_festivo':    ('es_festivo',    'max'),
+    'num_eventos':   ('num_eventos',   'mean'),
+}
+
 
-chunks_train, chunks_val, chunks_test = [], [], []
-
-for i in range(pf.num_row_groups):
-    batch = pf.read_row_group(i, columns=COLS)
-    df    = batch.to_pandas()
-    df['fecha_inicio']   = pd.to_datetime(df['fecha_inicio'])
-    df['ventana_inicio'] = df['fecha_inicio'].dt.floor('10min')
-    df['exito']          = (df['espera_min'] <= 10).astype(np.int8)
-
-    agg = df.groupby(['origen_id', 'ventana_inicio']).agg(
-        n_viajes      = ('espera_min',    'count'),
-        tasa_exito    = ('exito',         'mean'),
-        espera_media  = ('espera_min',    'mean'),
-        hora          = ('hora',          'first'),
-        dia_semana    = ('dia_semana',    'first'),
-        es_finde      = ('es_fin_semana', 'first'),
-        hora_sen      = ('hora_sen',      'first'),
-        hora_cos      = ('hora_cos',      'first'),
-        mes_num       = ('mes_num',       'first'),
-        temp_c        = ('temp_c',        'mean'),
-        precipitation = ('precipitation', 'mean'),
-        viento_kmh    = ('viento_kmh',    'mean'),
-        lluvia        = ('lluvia',        'max'),
-        nieve         = ('nieve',         'max'),
-        es_festivo    = ('es_festivo',    'max'),
-        num_eventos   = ('num_eventos',   'mean'),
-    ).reset_index()
-
-    # Merge con oferta
-    agg = agg.merge(
-        oferta,
-        left_on  = ['origen_id', 'ventana_inicio'],
-        right_on = ['destino_id', 'ventana_oferta'],
-        how='left'
-    ).drop(columns=['destino_id', 'ventana_oferta'], errors='ignore')
-    agg['oferta_inferida'] = agg['oferta_inferida'].fillna(0).astype(np.float32)
-
-    # Partir por período
-    mask_tr = agg['ventana_inicio'] <  corte_train
-    mask_v  = (agg['ventana_inicio'] >= corte_train) & (agg['ventana_inicio'] < corte_val)
-    mask_te = agg['ventana_inicio'] >= corte_val
-
-    if mask_tr.any(): chunks_train.append(agg[mask_tr])
-    if mask_v.any():  chunks_val.append(agg[mask_v])
-    if mask_te.any(): chunks_test.append(agg[mask_te])
-
-    del df, batch, agg
-    print(f"\r   Row group {i+1}/{pf.num_row_groups}...", end='', flush=True)
-
-print()
-
-# ── 4. Consolidar ─────────────────────────────────────────────────────────────
-print("\n4. Consolidando...")
-
-def consolidar(chunks):
-    df = pd.concat(chunks, ignore_index=True)
-    return df.groupby(['origen_id', 'ventana_inicio']).agg(
-        n_viajes        = ('n_viajes',        'sum'),
-        tasa_exito      = ('tasa_exito',      'mean'),
-        espera_media    = ('espera_media',    'mean'),
-        hora            = ('hora',            'first'),
-        dia_semana      = ('dia_semana',      'first'),
-        es_finde        = ('es_finde',        'first'),
-        hora_sen        = ('hora_sen',        'first'),
-        hora_cos        = ('hora_cos',        'first'),
-        mes_num         = ('mes_num',         'first'),
-        temp_c          = ('temp_c',          'mean'),
-        precipitation   = ('precipitation',   'mean'),
-        viento_kmh      = ('viento_kmh',      'mean'),
-        lluvia          = ('lluvia',          'max'),
-        nieve           = ('nieve',           'max'),
-        es_festivo      = ('es_festivo',      'max'),
-        num_eventos     = ('num_eventos',     'mean'),
-        oferta_inferida = ('oferta_inferida', 'sum'),
-    ).reset_index()
-
-agg_train = consolidar(chunks_train); del chunks_train
-agg_val   = consolidar(chunks_val);   del chunks_val
-agg_test  = consolidar(chunks_test);  del chunks_test
-
-# ── 5. TARGET: top-33% zonas por tasa_exito en cada ventana ──────────────────
-# Solo el tercio mejor de zonas en cada momento = 1.
-# Más exigente → mejor discriminación → ~33% positivos.
-print("\n5. Calculando target relativo...")
-
-for df in [agg_train, agg_val, agg_test]:
+# Percentil de tasa_exito por ventana que separa el tercio mejor de zonas
+CUANTIL_TARGET = 0.67
+
+
+def cuantil_por_grupo(valores, grupos, q):
+    """
+    Cuantil q de `valores` dentro de cada grupo, repetido en cada fila (como
+    groupby(grupos).transform(lambda x: x.quantile(q))) sin llamar a Python
+    por grupo. Se ordena una vez por (grupo, valor), los NaN quedan al final
+    de cada grupo y se ignoran, y con los desplazamientos de cada grupo se
+    toman los dos vecinos del índice virtual (n-1)·q. La interpolación lineal
+    es la de numpy (_lerp), así que el resultado es idéntico bit a bit.
+    Grupos nulos o sin valores válidos dan NaN.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    codigos = pd.factorize(grupos)[0]
+    resultado = np.full(len(valores), np.nan)
+    if len(valores) == 0:
+        return resultado
+
+    orden = np.lexsort((valores, codigos))
+    v, c = valores[orden], codigos[orden]
+    inicio = np.flatnonzero(np.r_[True, c[1:] != c[:-1]])
+    tamanos = np.diff(np.r_[inicio, len(v)])
+    n = np.add.reduceat(~np.isnan(v), inicio)
+
+    virtual = (n - 1) * q
+    previo = np.floor(virtual)
+    gamma = virtual - previo
+    previo = np.maximum(previo.astype(np.intp), 0)
+    siguiente = np.minimum(previo + 1, np.maximum(n - 1, 0))
+    a, b = v[inicio + previo], v[inicio + siguiente]
+
+    # Igual que numpy: a + (b-a)·γ, o b - (b-a)·(1-γ) si γ >= 0.5
+    diferencia = b - a
+    cuantil = np.where(gamma >= 0.5, b - diferencia * (1 - gamma), a + diferencia * gamma)
+    cuantil[(n == 0) | (c[inicio] < 0)] = np.nan
+    resultado[orden] = np.repeat(cuantil, tamanos)
+    return resultado
+
+
+def target_relativo(df):
+    # Solo el tercio mejor de zonas en cada momento = 1.
+    # Más exigente → mejor discriminación → ~33% positivos.
+    p67 = cuantil_por_grupo(df['tasa_exito'].to_numpy(), df['ventana_inicio'].to_numpy(), CUANTIL_TARGET)
+    df['target'] = (df['tasa_exito'].to_numpy() >= p67).astype(np.int8)
+    return df
+
+
+def target_relativo_pandas(df):
+    """Implementación anterior (un lambda por ventana), como referencia de paridad."""
     p67 = df.groupby('ventana_inicio')['tasa_exito'].transform(
-        lambda x: x.quantile(0.67)
+        lambda x: x.quantile(CUANTIL_TARGET)
     )
     df['target'] = (df['tasa_exito'] >= p67).astype(np.int8)
+    return df
+
+
+def paridad_target(df) -> dict:
+    """Compara el percentil y el target vectorizados con los de pandas, con tiempos."""
+    t0 = time.perf_counter()
+    rapido = cuantil_por_grupo(df['tasa_exito'].to_numpy(), df['ventana_inicio'].to_numpy(), CUANTIL_TARGET)
+    t_rapido = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    referencia = df.groupby('ventana_inicio')['tasa_exito'].transform(
+        lambda x: x.quantile(CUANTIL_TARGET)
+    ).to_numpy(dtype=np.float64)
+    t_referencia = time.perf_counter() - t0
+
+    iguales = (rapido == referencia) | (np.isnan(rapido) & np.isnan(referencia))
+    tasa = df['tasa_exito'].to_numpy()
+    return {
+        'ok': bool(iguales.all()) and bool(((tasa >= rapido) == (tasa >= referencia)).all()),
+        'filas_distintas': int((~iguales).sum()),
+        'ventanas': int(df['ventana_inicio'].nunique()),
+        'segundos': {'vectorizado': round(t_rapido, 3), 'pandas': round(t_referencia, 3)},
+    }
+
 
-print(f"   Train: {len(agg_train):,} | target positivo: {agg_train['target'].mean():.1%}")
-print(f"   Val:   {len(agg_val):,}   | target positivo: {agg_val['target'].mean():.1%}")
-print(f"   Test:  {len(agg_test):,}  | target positivo: {agg_test['target'].mean():.1%}")
-
-# Verificar cobertura temporal
-print("\n   Cobertura temporal:")
-for name, df in [('Train', agg_train), ('Val', agg_val), ('Test', agg_test)]:
-    t0 = df['ventana_inicio'].min()
-    t1 = df['ventana_inicio'].max()
-    print(f"   {name}: {t0.date()} → {t1.date()} ({(t1-t0).days} días)")
-
-assert agg_train['ventana_inicio'].max() < agg_val['ventana_inicio'].min(), \
-    "Solapamiento train/val"
-assert agg_val['ventana_inicio'].max() < agg_test['ventana_inicio'].min(), \
-    "Solapamiento val/test"
-print("   Sin solapamientos ✓")
-
-# ── 6. Guardar ────────────────────────────────────────────────────────────────
-print("\n6. Guardando...")
-agg_train.to_parquet(OUT_DIR / 'train.parquet', index=False)
-agg_val.to_parquet(  OUT_DIR / 'val.parquet',   index=False)
-agg_test.to_parquet( OUT_DIR / 'test.parquet',  index=False)
-
-n_total  = len(agg_train) + len(agg_val) + len(agg_test)
-metadata = {
-    'cortes': {
-        'corte_train': str(corte_train),
-        'corte_val':   str(corte_val),
-    },
-    'target': 'target (1 = zona con tasa_exito > media de su ventana temporal)',
-    'split': {
-        s: {
-            'filas':        len(d),
-            'pct':          round(len(d) / n_total * 100, 1),
-            'fecha_inicio': str(d['ventana_inicio'].min()),
-            'fecha_fin':    str(d['ventana_inicio'].max()),
-            'dias':         (d['ventana_inicio'].max() - d['ventana_inicio'].min()).days,
-            'pct_positivos': round(float(d['target'].mean()) * 100, 1),
+class AgregadorZonaVentana(Consumidor):
+    """
+    Oferta inferida (destino × ventana_fin) y agregados zona×ventana10min en
+    el mismo pase, cada uno en su AcumuladorGrupos. La oferta se une al
+    final porque hasta terminar el escaneo no está completa; las dos
+    tablas comparten la clave zona×ventana, así que la unión es un
+    searchsorted sobre las claves y no un merge de DataFrames.
+    """
+
+    columnas = COLS + COLS_OFERTA
+
+    def __init__(self, plan):
+        # Cortes planificados con el footer antes de leer (ver planificar)
+        self.corte_train, self.corte_val = plan['corte_train'], plan['corte_val']
+        # Estadísticos por zona × ventana en arrays (memoria ∝ grupos, no chunks)
+        self.acumulador = AcumuladorGrupos(AGREGACIONES)
+        self.acumulador_oferta = AcumuladorGrupos({'oferta_inferida': ('destino_id', 'count')})
+        self.tipo_zona, self.unidad = np.int16, 'datetime64[us]'
+
+    def procesar(self, df):
+        # ── Oferta inferida ───────────────────────────────────────────────────
+        df_o = df[COLS_OFERTA].dropna()
+        claves = clave_zona_ventana(df_o['destino_id'], pd.to_datetime(df_o['fecha_fin']), '10min')
+        self.acumulador_oferta.actualizar(claves, df_o)
+        del df_o
+
+        # ── Viajes a zona×ventana10min ────────────────────────────────────────
+        df = df[COLS].dropna(subset=['origen_id', 'fecha_inicio'])
+        df['fecha_inicio'] = pd.to_datetime(df['fecha_inicio'])
+        df['exito']        = (df['espera_min'] <= 10).astype(np.int8)
+        self.tipo_zona, self.unidad = df['origen_id'].dtype, df['fecha_inicio'].dtype
+
+        claves = clave_zona_ventana(df['origen_id'], df['fecha_inicio'], '10min')
+        self.acumulador.actualizar(claves, df)
+
+    def finalizar(self, info):
+        corte_train, corte_val = self.corte_train, self.corte_val
+
+        agg = tabla_zona_ventana(self.acumulador, '10min', 'origen_id', 'ventana_inicio', self.tipo_zona, self.unidad)
+        print(f"   Registros zona×ventana: {len(agg):,}")
+
+        # Oferta de la misma zona×ventana: mismas claves empaquetadas (zona << 32 | ventana),
+        # así que basta un searchsorted sobre las claves ordenadas de la oferta (sin merge)
+        claves_oferta, oferta = self.acumulador_oferta.resultado()
+        print(f"   Registros oferta: {len(claves_oferta):,}")
+        agg['oferta_inferida'] = unir_por_clave(
+            self.acumulador.claves, claves_oferta, oferta['oferta_inferida'], relleno=0
+        ).astype(np.float32)
+        self.acumulador = self.acumulador_oferta = None
+        del claves_oferta, oferta
+
+        # Partir por período
+        mask_tr = agg['ventana_inicio'] <  corte_train
+        mask_v  = (agg['ventana_inicio'] >= corte_train) & (agg['ventana_inicio'] < corte_val)
+        mask_te = agg['ventana_inicio'] >= corte_val
+
+        # ── TARGET: top-33% zonas por tasa_exito en cada ventana ──────────────
+        print("\n   Calculando target relativo...")
+        splits = {
+            'train': target_relativo(agg[mask_tr].reset_index(drop=True)),
+            'val':   target_relativo(agg[mask_v].reset_index(drop=True)),
+            'test':  target_relativo(agg[mask_te].reset_index(drop=True)),
+        }
+        return {'splits': splits, 'corte_train': corte_train, 'corte_val': corte_val}
+
+
+def guardar(resultado):
+    """Comprueba la cobertura temporal y escribe los splits + metadata.json."""
+    splits = resultado['splits']
+    agg_train, agg_val, agg_test = splits['train'], splits['val'], splits['test']
+
+    print(f"   Train: {len(agg_train):,} | target positivo: {agg_train['target'].mean():.1%}")
+    print(f"   Val:   {len(agg_val):,}   | target positivo: {agg_val['target'].mean():.1%}")
+    print(f"   Test:  {len(agg_test):,}  | target positivo: {agg_test['target'].mean():.1%}")
+
+    # Verificar cobertura temporal
+    print("\n   Cobertura temporal:")
+    for name, df in [('Train', agg_train), ('Val', agg_val), ('Test', agg_test)]:
+        t0 = df['ventana_inicio'].min()
+        t1 = df['ventana_inicio'].max()
+        print(f"   {name}: {t0.date()} → {t1.date()} ({(t1-t0).days} días)")
+
+    assert agg_train['ventana_inicio'].max() < agg_val['ventana_inicio'].min(), \
+        "Solapamiento train/val"
+    assert agg_val['ventana_inicio'].max() < agg_test['ventana_inicio'].min(), \
+        "Solapamiento val/test"
+    print("   Sin solapamientos ✓")
+
+    print("\n   Guardando...")
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    agg_train.to_parquet(OUT_DIR / 'train.parquet', index=False)
+    agg_val.to_parquet(  OUT_DIR / 'val.parquet',   index=False)
+    agg_test.to_parquet( OUT_DIR / 'test.parquet',  index=False)
+
+    n_total  = len(agg_train) + len(agg_val) + len(agg_test)
+    metadata = {
+        'cortes': {
+            'corte_train': str(resultado['corte_train']),
+            'corte_val':   str(resultado['corte_val']),
+        },
+        'target': 'target (1 = zona con tasa_exito > media de su ventana temporal)',
+        'split': {
+            s: {
+                'filas':        len(d),
+                'pct':          round(len(d) / n_total * 100, 1),
+                'fecha_inicio': str(d['ventana_inicio'].min()),
+                'fecha_fin':    str(d['ventana_inicio'].max()),
+                'dias':         (d['ventana_inicio'].max() - d['ventana_inicio'].min()).days,
+                'pct_positivos': round(float(d['target'].mean()) * 100, 1),
+            }
+            for s, d in [('train', agg_train), ('val', agg_val), ('test', agg_test)]
         }
-        for s, d in [('train', agg_train), ('val', agg_val), ('test', agg_test)]
     }
-}
-with open(OUT_DIR / 'metadata.json', 'w') as f:
-    json.dump(metadata, f, indent=2, ensure_ascii=False)
+    with open(OUT_DIR / 'metadata.json', 'w') as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+    print(f"   train.parquet: {len(agg_train):,} filas")
+    print(f"   val.parquet:   {len(agg_val):,} filas")
+    print(f"   test.parquet:  {len(agg_test):,} filas")
+    print(f"   metadata.json")
+
+
+def comprobar_paridad():
+    """Percentil vectorizado vs groupby/lambda sobre los splits ya guardados."""
+    for split in ('train', 'val', 'test'):
+        df = pd.read_parquet(OUT_DIR / f'{split}.parquet', columns=['ventana_inicio', 'tasa_exito'])
+        r = paridad_target(df)
+        seg = r['segundos']
+        print(f"   {split:5s}: {len(df):,} filas, {r['ventanas']:,} ventanas | "
+              f"vectorizado {seg['vectorizado']:.2f}s vs pandas {seg['pandas']:.2f}s "
+              f"(×{seg['pandas'] / max(seg['vectorizado'], 1e-9):.0f}) | "
+              + ('paridad OK ✓' if r['ok'] else f"⚠️ {r['filas_distintas']:,} filas distintas"))
+
+
+def main():
+    if '--paridad' in sys.argv:
+        print("Comprobando el target relativo vectorizado contra pandas...")
+        comprobar_paridad()
+        return
+
+    manifest = Manifest()
+    if manifest.esta_actualizado(ARTEFACTO, SALIDAS, [PARQUET_PATH], CODIGO, PARAMS):
+        print(" SKIP: splits de problema2 al día con datos_final.parquet")
+        return
+
+    print("="*60)
+    print(" PROBLEMA 2 — PREPARACIÓN DE DATOS")
+    print("="*60)
+
+    print("\n1. Rango temporal y cortes (estadísticas del footer)...")
+    plan = planificar()
+
+    print("\n2. Agregando viajes y oferta por zona y ventana de 10 min...")
+    resultado = EscaneoCompartido(PARQUET_PATH).registrar('p2', AgregadorZonaVentana(plan)).ejecutar()['p2']
+
+    print("\n3. Guardando...")
+    guardar(resultado)
+
+    print("\n" + "="*60)
+    print(" COMPLETADO — siguiente paso: features.py")
+    print("="*60)
+
+    manifest.registrar(ARTEFACTO, SALIDAS, [PARQUET_PATH], CODIGO, PARAMS)
 
-print(f"   train.parquet: {len(agg_train):,} filas")
-print(f"   val.parquet:   {len(agg_val):,} filas")
-print(f"   test.parquet:  {len(agg_test):,} filas")
-print(f"   metadata.json")
 
-print("\n" + "="*60)
-print(" COMPLETADO — siguiente paso: features.py")
-print("="*60)
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 # src/modelos/problema2/probar_ejemplos_reales.py
+# Uso (desde la raíz del repo): python -m src.modelos.problema2.probar_ejemplos_reales
 
 from pathlib import Path
 import json
@@ -7,6 +8,9 @@ import numpy as np
 import pandas as pd
 from sklearn.metrics import classification_report, confusion_matrix, accuracy_score, f1_score
 
+from src.pipelines.predicciones import AlmacenPredicciones
+from src.processing.codificador_zonas import CodificadorZonas
+
 print("=" * 88)
 print("PRUEBA DE EJEMPLOS REALES - MLP (PROBLEMA 2)")
 print("=" * 88)
@@ -33,35 +37,45 @@ DISPLAY_COLS = [
     "es_festivo"
 ]
 
+# Artefactos del modelo: forman parte de la clave del almacén de predicciones
+MODELOS_MLP = [MODEL_DIR / "mlp_model.keras", MODEL_DIR / "mlp_scaler.pkl", MODEL_DIR / "zona_encoder.pkl"]
+
 def load_assets():
-    """Carga de datos y modelos entrenados."""
-    print("Cargando datos de test y modelos...")
+    """Carga de datos de test (los modelos solo si hay que predecir)."""
+    print("Cargando datos de test...")
     df_test = pd.read_parquet(DATA_DIR / "test.parquet")
     with open(DATA_DIR / "metadata.json", "r") as f:
         meta = json.load(f)
     
+    return df_test, meta
+
+def predict_mlp(df, features_num, features_final):
+    """Carga los modelos entrenados y predice (solo si no está en el almacén)."""
     scaler = joblib.load(MODEL_DIR / "mlp_scaler.pkl")
-    le = joblib.load(MODEL_DIR / "zona_encoder.pkl")
+    codificador = CodificadorZonas.desde_encoder(joblib.load(MODEL_DIR / "zona_encoder.pkl"))
     
     # Importación local de keras para evitar logs innecesarios al inicio
     import keras
     model = keras.models.load_model(MODEL_DIR / "mlp_model.keras")
     
-    return df_test, meta, scaler, le, model
+    # Codificar origen_id usando el LabelEncoder cargado
+    zona_enc = codificador.transformar(df['origen_id'])
+    X_sc = scaler.transform(df[features_num].assign(zona_enc=zona_enc)[features_final].fillna(0))
+    return {"prob_mlp": model.predict(X_sc, batch_size=2048, verbose=0).flatten()}
 
-def run_inference(df, meta, scaler, le, model):
-    """Ejecuta la predicción y prepara baselines."""
+def run_inference(df, meta):
+    """Ejecuta la predicción (o la lee del almacén) y prepara baselines."""
     out = df.copy()
     
-    # 1. Preparar features (debe coincidir con el entrenamiento)
+    # 1. Features (debe coincidir con el entrenamiento)
     FEATURES_NUM = [f for f in meta['feature_cols'] if f != 'origen_id']
-    # Codificar origen_id usando el LabelEncoder cargado
-    out['zona_enc'] = out['origen_id'].apply(lambda z: le.transform([z])[0] if z in le.classes_ else -1)
     FEATURES_FINAL = FEATURES_NUM + ['zona_enc']
     
-    # 2. Escalar y Predecir
-    X_sc = scaler.transform(out[FEATURES_FINAL].fillna(0))
-    probs = model.predict(X_sc, batch_size=2048, verbose=0).flatten()
+    # 2. Predicciones: del almacén si modelo, test y features no han cambiado
+    probs = AlmacenPredicciones().obtener(
+        "problema2/mlp_test", MODELOS_MLP, DATA_DIR / "test.parquet", FEATURES_FINAL,
+        lambda: predict_mlp(df, FEATURES_NUM, FEATURES_FINAL),
+    )["prob_mlp"].to_numpy()
     
     out["prob_mlp"] = probs
     out["pred_mlp"] = (probs >= 0.5).astype(int)
@@ -79,8 +93,8 @@ def run_inference(df, meta, scaler, le, model):
 
 def main():
     # Cargar y Predecir
-    df_test, meta, scaler, le, model = load_assets()
-    df_res = run_inference(df_test, meta, scaler, le, model)
+    df_test, meta = load_assets()
+    df_res = run_inference(df_test, meta)
 
     # --- MÉTRICAS GLOBALES ---
     print("\n" + "=" * 88)
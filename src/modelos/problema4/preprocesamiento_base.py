@@ -1,3 +1,4 @@
+# Uso (desde la raíz del repo): python -m src.modelos.problema4.preprocesamiento_base
 """
 DESCRIPCIÓN:
     Este script es el núcleo de preparación de datos para el Problema 4 (Tráfico y Clima).
@@ -5,7 +6,9 @@ DESCRIPCIÓN:
 
 FLUJO DE TRABAJO:
     1. CARGA OPTIMIZADA: Solo columnas necesarias y tipos de datos ligeros.
-    2. FILTRADO: Velocidades entre 2 y 85 mph.
+       Se lee con pyarrow.dataset y filtros por mes, así cada split solo lee
+       sus fragmentos (particiones month=... o row groups de mes_num).
+    2. FILTRADO: Velocidades entre 2 y 85 mph (empujado al escaneo).
     3. CLIMA: Imputación de nulos y creación de flags (hay_lluvia/nieve).
     4. SPLIT TEMPORAL TRIPLE:
        - Train: Dic 2024 - Ago 2025.
@@ -18,42 +21,68 @@ import pandas as pd
 import numpy as np
 import os
 from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from src.pipelines.manifest import Manifest, hash_codigo
+from src.processing import escaneo
+from src.processing.escaneo import Consumidor
+from src.processing.particionado import abrir_dataset, entrada_datos_final, filtro_meses
 
 # --- CONFIGURACIÓN DE RUTAS ---
 BASE_DIR = Path(__file__).resolve().parents[3]
-INPUT_PATH = os.path.join(BASE_DIR, 'data', 'processed', 'tlc_clean', 'datos_final.parquet')
+ARCHIVO_FINAL = os.path.join(BASE_DIR, 'data', 'processed', 'tlc_clean', 'datos_final.parquet')
 OUTPUT_DIR = os.path.join(BASE_DIR, 'data', 'processed', 'tlc_clean', 'problema4')
 
+# La versión particionada de datos_final (service=/year=/month=) solo si el
+# manifest la da al día con datos_final.parquet; si no, se lee el fichero
+INPUT_PATH = entrada_datos_final(ARCHIVO_FINAL)
+
+# Split temporal por mes_num: Oct-Nov test, Sep validación, resto (Dic, Ene-Ago) train
+MESES_SPLIT = {
+    'train': [12, 1, 2, 3, 4, 5, 6, 7, 8],
+    'val': [9],
+    'test': [10, 11],
+}
+
 # Crear el directorio de salida si no existe
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def flujo_preprocesamiento_base():
+# Columnas de entrada (solo las necesarias para ahorrar RAM)
+COLS_INTERES = [
+    'fecha_inicio', 'origen_id', 'destino_id', 'velocidad_mph', 
+    'temp_c', 'precipitation', 'viento_kmh', 'lluvia', 'nieve', 
+    'es_festivo', 'num_eventos', 'mes_num', 'dia_semana', 
+    'es_fin_semana', 'hora_sen', 'hora_cos', 'tipo_vehiculo', 'franja_horaria'
+]
+
+def flujo_preprocesamiento_base(meses=None):
     if not os.path.exists(INPUT_PATH):
         raise FileNotFoundError(f"No se encuentra el archivo en: {INPUT_PATH}")
     
     # 1. CARGA OPTIMIZADA (Seleccionamos columnas para ahorrar RAM de entrada)
     print("1. Cargando columnas seleccionadas...")
-    cols_interes = [
-        'fecha_inicio', 'origen_id', 'destino_id', 'velocidad_mph', 
-        'temp_c', 'precipitation', 'viento_kmh', 'lluvia', 'nieve', 
-        'es_festivo', 'num_eventos', 'mes_num', 'dia_semana', 
-        'es_fin_semana', 'hora_sen', 'hora_cos', 'tipo_vehiculo', 'franja_horaria'
-    ]
     
-    df = pd.read_parquet(INPUT_PATH, columns=cols_interes)
-    
-    # 2. FILTRADO DE CALIDAD
+    # 2. FILTRADO DE CALIDAD (dentro del escaneo: solo se leen los meses pedidos)
     print("2. Filtrando ruido y optimizando tipos de datos...")
-    df = df[(df['velocidad_mph'] >= 2) & (df['velocidad_mph'] <= 85)]
+    dataset = abrir_dataset(INPUT_PATH)
+    filtro = (pc.field('velocidad_mph') >= 2) & (pc.field('velocidad_mph') <= 85)
+    if meses is not None:
+        filtro = filtro & filtro_meses(dataset, meses)
+    df = dataset.to_table(columns=COLS_INTERES, filter=filtro).to_pandas()
     
+    # 3. TRATAMIENTO DE CLIMA
+    print("3. Procesando variables climáticas...")
+    return preparar_bloque(df)
+
+def preparar_bloque(df):
+    """Tipos ligeros, imputación de clima y flags de un bloque ya filtrado."""
     # Optimizar RAM: Convertir float64 a float32 e int64 a int32
     for col in df.select_dtypes(include=['float64']).columns:
         df[col] = df[col].astype('float32')
     for col in df.select_dtypes(include=['int64']).columns:
         df[col] = df[col].astype('int32')
 
-    # 3. TRATAMIENTO DE CLIMA
-    print("3. Procesando variables climáticas...")
     cols_clima = ['temp_c', 'precipitation', 'viento_kmh', 'lluvia', 'nieve']
     df[cols_clima] = df[cols_clima].fillna(0)
     
@@ -62,38 +91,80 @@ def flujo_preprocesamiento_base():
 
     return df
 
-def realizar_split_y_guardar(df):
+def realizar_split_y_guardar():
     """
-    Divide en 3 sets cronológicos y los guarda en disco.
+    Genera los 3 sets cronológicos y los guarda en disco.
+    Cada split se lee por separado con su filtro de meses, de modo que
+    nunca hay más de un split en memoria.
     """
     print("4. Realizando Split Temporal Triple (Train / Val / Test)...")
     
-    # Definimos cortes
-    # Mes 10 y 11 -> Test
-    # Mes 9 -> Validación
-    # Resto (12, 1-8) -> Train
-    
-    df_test = df[df['mes_num'].isin([10, 11])].copy()
-    df_val = df[df['mes_num'] == 9].copy()
-    df_train = df[~df['mes_num'].isin([9, 10, 11])].copy()
-    
-    # Liberar memoria del dataframe original
-    del df
-    
-    print(f"   > Train: {len(df_train):,} filas")
-    print(f"   > Val:   {len(df_val):,} filas")
-    print(f"   > Test:  {len(df_test):,} filas")
-    
-    # 5. GUARDADO FÍSICO
-    print(f"5. Guardando archivos en {OUTPUT_DIR}...")
-    df_train.to_parquet(os.path.join(OUTPUT_DIR, 'train_p4.parquet'), index=False)
-    df_val.to_parquet(os.path.join(OUTPUT_DIR, 'val_p4.parquet'), index=False)
-    df_test.to_parquet(os.path.join(OUTPUT_DIR, 'test_p4.parquet'), index=False)
+    for nombre, meses in MESES_SPLIT.items():
+        print(f"\n   [{nombre}] meses {meses}")
+        df_split = flujo_preprocesamiento_base(meses)
+        print(f"   > {nombre.capitalize()}: {len(df_split):,} filas")
+        
+        # 5. GUARDADO FÍSICO
+        print(f"5. Guardando {nombre}_p4.parquet en {OUTPUT_DIR}...")
+        df_split.to_parquet(os.path.join(OUTPUT_DIR, f'{nombre}_p4.parquet'), index=False)
+        del df_split
+
+class SinkSplitsP4(Consumidor):
+    """
+    Versión en streaming para el escaneo compartido (src.processing.escaneo):
+    cada row group se filtra, se prepara igual que arriba y se reparte por
+    mes_num entre los tres ficheros de salida. El esquema de los tres se
+    fija con el primer bloque.
+    """
+
+    columnas = COLS_INTERES
+
+    def __init__(self, output_dir=OUTPUT_DIR):
+        self.output_dir = output_dir
+        self.writers = {}
+        self.filas = {nombre: 0 for nombre in MESES_SPLIT}
+        self.esquema = None
+
+    def procesar(self, df):
+        df = df[(df['velocidad_mph'] >= 2) & (df['velocidad_mph'] <= 85)]
+        if df.empty:
+            return
+        df = preparar_bloque(df.copy())
+        for nombre, meses in MESES_SPLIT.items():
+            parte = df[df['mes_num'].isin(meses)]
+            if parte.empty:
+                continue
+            tabla = pa.Table.from_pandas(parte, preserve_index=False)
+            if nombre not in self.writers:
+                self.esquema = self.esquema or tabla.schema
+                self.writers[nombre] = pq.ParquetWriter(
+                    os.path.join(self.output_dir, f'{nombre}_p4.parquet'), self.esquema
+                )
+            self.writers[nombre].write_table(tabla.cast(self.esquema))
+            self.filas[nombre] += len(parte)
+
+    def finalizar(self, info):
+        for nombre in MESES_SPLIT:
+            if nombre in self.writers:
+                self.writers.pop(nombre).close()
+            elif self.esquema is not None:
+                # Split sin filas: fichero vacío con el mismo esquema, como antes
+                pq.write_table(self.esquema.empty_table(), os.path.join(self.output_dir, f'{nombre}_p4.parquet'))
+            print(f"   > {nombre.capitalize()}: {self.filas[nombre]:,} filas")
+        return self.filas
+
+SALIDAS = [os.path.join(OUTPUT_DIR, f'{s}_p4.parquet') for s in ('train', 'val', 'test')]
+CODIGO = hash_codigo(__file__, escaneo)
 
 if __name__ == "__main__":
     try:
-        datos = flujo_preprocesamiento_base()
-        realizar_split_y_guardar(datos)
-        print("\n[ÉXITO] Archivos generados y guardados correctamente.")
+        manifest = Manifest()
+        codigo = CODIGO
+        if manifest.esta_actualizado("problema4", SALIDAS, [INPUT_PATH], codigo):
+            print("\n[SKIP] Los splits de P4 ya están al día con datos_final.parquet.")
+        else:
+            realizar_split_y_guardar()
+            manifest.registrar("problema4", SALIDAS, [INPUT_PATH], codigo)
+            print("\n[ÉXITO] Archivos generados y guardados correctamente.")
     except Exception as e:
-        print(f"\n[ERROR] Ocurrió un problema: {e}")
\ No newline at end of file
+        print(f"\n[ERROR] Ocurrió un problema: {e}")
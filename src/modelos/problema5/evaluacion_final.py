@@ -1,3 +1,4 @@
+# Uso (desde la raíz del repo): python -m src.modelos.problema5.evaluacion_final
 import pandas as pd
 import numpy as np
 import os
@@ -14,6 +15,8 @@ from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from xgboost import XGBRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
+from src.pipelines.predicciones import AlmacenPredicciones
+
 # --- CONFIGURACIÓN DE RUTAS ---
 BASE_DIR = Path(__file__).resolve().parents[3] 
 DATA_DIR = BASE_DIR / 'data' / 'processed' / 'tlc_clean' / 'problema5'
@@ -27,6 +30,7 @@ REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 TRAIN_FILE = DATA_DIR / 'train.parquet'
 VAL_FILE = DATA_DIR / 'val.parquet'
 TEST_FILE = DATA_DIR / 'test.parquet'
+MUESTRA_TEST = 6_000_000
 
 def optimizar_tipos(df):
     for col in df.select_dtypes(include=['float64']).columns:
@@ -79,7 +83,7 @@ def evaluacion_final():
     print("Leyendo todos los datos...")
     df_train = leer_datos_finales(TRAIN_FILE, 28_000_000)
     df_val = leer_datos_finales(VAL_FILE, 6_000_000)
-    df_test = leer_datos_finales(TEST_FILE, 6_000_000)
+    df_test = leer_datos_finales(TEST_FILE, MUESTRA_TEST)
 
     # 2. JUNTAR TRAIN Y VAL (Maximizando el conocimiento)
     print("Combinando Train y Validación para el reentrenamiento...")
@@ -137,9 +141,18 @@ def evaluacion_final():
     print("Reentrenando XGBoost con todos los datos...")
     pipeline_xgb_final.fit(X_train_final, y_train_final)
 
+    # Se guarda antes de predecir: su hash forma parte de la clave del almacén
+    joblib.dump(pipeline_xgb_final, MODELS_DIR / 'model_final.joblib')
+
     # 7. EL EXAMEN FINAL (TEST)
+    # Las predicciones quedan en el almacén (modelo + test + features + muestra)
+    # para que los informes las lean sin volver a pasar el modelo
     print("\nEnfrentando el modelo al conjunto de Test...")
-    y_pred = pipeline_xgb_final.predict(X_test)
+    pred = AlmacenPredicciones().obtener(
+        'problema5/xgb_test', [MODELS_DIR / 'model_final.joblib'], TEST_FILE, list(X_test.columns),
+        lambda: {'pred_xgb': pipeline_xgb_final.predict(X_test)}, extra={'muestra': MUESTRA_TEST},
+    )
+    y_pred = pred['pred_xgb'].to_numpy()
     
     # 8. CÁLCULO DE MÉTRICAS OFICIALES
     metrics_finales_dict = calcular_metricas(y_test, y_pred, "test")
@@ -168,7 +181,5 @@ def evaluacion_final():
     
     with open(os.path.join(REPORTS_DIR, 'final_test_metrics.json'), 'w') as f:
         json.dump(final_metrics, f, indent=4)
-
-    joblib.dump(pipeline_xgb_final, MODELS_DIR / 'model_final.joblib')
 if __name__ == "__main__":
     evaluacion_final()
\ No newline at end of file
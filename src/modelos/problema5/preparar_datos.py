@@ -1,7 +1,16 @@
+# Uso (desde la raíz del repo): python -m src.modelos.problema5.preparar_datos
 import pandas as pd
 import numpy as np
 import os
 from pathlib import Path
+import tempfile
+from src.pipelines.manifest import Manifest, hash_codigo
+import pyarrow as pa
+import pyarrow.parquet as pq
+from src.processing import escaneo, ordenacion
+from src.processing.escaneo import Consumidor, EscaneoCompartido
+from src.processing.lectura import resumen_footer
+from src.processing.ordenacion import declarado_ordenado, ordenar_parquet
 
 # --- CONFIGURACIÓN DE RUTAS ---
 BASE_DIR = Path(__file__).resolve().parents[3] 
@@ -16,20 +25,8 @@ TRAIN_PCT = 0.70
 VAL_PCT = 0.15
 # El Test será el resto (15%)
 
-def preparar_y_dividir_datos(ruta_input, directorio_output):
-    print(" Iniciando preparación de datos para modelado del problema 5...")
-    
-    if not os.path.exists(ruta_input):
-        print(f" Error: No se encuentra {ruta_input}")
-        return
-
-    # 1. Cargar datos
-    print(" Cargando dataset enriquecido...")
-    df = pd.read_parquet(ruta_input, engine='pyarrow')
-    
-    # 2. --- NUEVAS VARIABLES ---
-    print(" Creando nuevas variables...")
-    
+def nuevas_variables(df):
+    """Variables derivadas del problema 5 (se calculan bloque a bloque)."""
     # Rentabilidad base por minuto
     df['rentabilidad_base_min'] = np.where(
         df['duracion_min'] > 0, 
@@ -39,36 +36,115 @@ def preparar_y_dividir_datos(ruta_input, directorio_output):
 
     # Tráfico denso (1 si va a menos de 10 mph, 0 en caso contrario)
     df['trafico_denso'] = (df['velocidad_mph'] < 10).astype('int8')    
+    return df
+
+
+class SinkSplitsP5(Consumidor):
+    """
+    Corte train/val/test por posición en streaming. El total de filas se
+    conoce por el footer antes de leer, así que los índices de corte se
+    calculan de entrada y cada row group se reparte entre los tres ficheros
+    según su posición global. Requiere que la entrada esté en orden
+    cronológico (lo comprueba quien lo registra).
+    """
+
+    columnas = None  # el modelo usa todas las columnas
+
+    def __init__(self, n_total, directorio_output=OUTPUT_DIR):
+        self.n_total = n_total
+        self.directorio_output = directorio_output
+        self.idx_train = int(n_total * TRAIN_PCT)
+        self.idx_val = int(n_total * (TRAIN_PCT + VAL_PCT))
+        self.tramos = {
+            'train': (0, self.idx_train),
+            'val': (self.idx_train, self.idx_val),
+            'test': (self.idx_val, n_total),
+        }
+        self.posicion = 0
+        self.fechas = {}
+        self.writers = {}
+        self.esquema = None
+
+    def procesar(self, df):
+        inicio, fin = self.posicion, self.posicion + len(df)
+        self.posicion = fin
+        if df.empty:
+            return
+
+        # Fechas en los bordes de cada partición, para el resumen
+        for pos in (0, self.idx_train - 1, self.idx_train, self.idx_val - 1, self.idx_val, self.n_total - 1):
+            if inicio <= pos < fin:
+                self.fechas[pos] = df['fecha_inicio'].iloc[pos - inicio].date()
+
+        df = nuevas_variables(df)
+        columnas_a_eliminar = [col for col in ('fecha_inicio', 'fecha_fin') if col in df.columns]
+        df = df.drop(columns=columnas_a_eliminar)
+
+        for nombre, (a, b) in self.tramos.items():
+            lo, hi = max(a, inicio), min(b, fin)
+            if lo >= hi:
+                continue
+            tabla = pa.Table.from_pandas(df.iloc[lo - inicio:hi - inicio], preserve_index=False)
+            if nombre not in self.writers:
+                self.esquema = self.esquema or tabla.schema
+                self.writers[nombre] = pq.ParquetWriter(
+                    os.path.join(self.directorio_output, f'{nombre}.parquet'), self.esquema
+                )
+            self.writers[nombre].write_table(tabla.cast(self.esquema))
+
+    def finalizar(self, info):
+        for nombre in self.tramos:
+            if nombre in self.writers:
+                self.writers.pop(nombre).close()
+            elif self.esquema is not None:
+                pq.write_table(self.esquema.empty_table(), os.path.join(self.directorio_output, f'{nombre}.parquet'))
+
+        n, f = self.n_total, self.fechas
+        print(f" Total de registros procesados: {n:,}")
+        print(f"   -> Train: {self.idx_train:,} ({TRAIN_PCT*100:.0f}%) | Fechas: {f.get(0)} a {f.get(self.idx_train-1)}")
+        print(f"   -> Val:   {self.idx_val-self.idx_train:,} ({VAL_PCT*100:.0f}%) | Fechas: {f.get(self.idx_train)} a {f.get(self.idx_val-1)}")
+        print(f"   -> Test:  {n-self.idx_val:,} ({(1-TRAIN_PCT-VAL_PCT)*100:.0f}%) | Fechas: {f.get(self.idx_val)} a {f.get(n-1)}")
+        return {nombre: b - a for nombre, (a, b) in self.tramos.items()}
+
+
+def filas_totales(ruta):
+    return resumen_footer(ruta)['filas']
+
+
+def preparar_y_dividir_datos(ruta_input, directorio_output):
+    print(" Iniciando preparación de datos para modelado del problema 5...")
     
-    # 3. Cálculo de índices para el corte temporal
-    n_total = len(df)
-    idx_train = int(n_total * TRAIN_PCT)
-    idx_val = int(n_total * (TRAIN_PCT + VAL_PCT))
-    
-    print(f" Total de registros procesados: {n_total:,}")
-    
-    # Mostrar hasta qué fecha llega cada partición ANTES de borrar las fechas
-    print(f"   -> Train: {idx_train:,} ({TRAIN_PCT*100:.0f}%) | Fechas: {df['fecha_inicio'].iloc[0].date()} a {df['fecha_inicio'].iloc[idx_train-1].date()}")
-    print(f"   -> Val:   {idx_val-idx_train:,} ({VAL_PCT*100:.0f}%) | Fechas: {df['fecha_inicio'].iloc[idx_train].date()} a {df['fecha_inicio'].iloc[idx_val-1].date()}")
-    print(f"   -> Test:  {n_total-idx_val:,} ({(1-TRAIN_PCT-VAL_PCT)*100:.0f}%) | Fechas: {df['fecha_inicio'].iloc[idx_val].date()} a {df['fecha_inicio'].iloc[-1].date()}")
-
-    print("Eliminando columnas que el modelo no necesita ...")
-    columnas_a_eliminar = ['fecha_inicio', 'fecha_fin']
-    columnas_a_eliminar = [col for col in columnas_a_eliminar if col in df.columns]
-    df = df.drop(columns=columnas_a_eliminar)
-    
-    # 4. División (Slicing) de los datos (manteniendo propina dentro)
-    df_train = df.iloc[:idx_train]
-    df_val = df.iloc[idx_train:idx_val]
-    df_test = df.iloc[idx_val:]
-    
-    # 5. Guardar los sets generados
-    print(f"Guardando archivos parquet en: {directorio_output}")
-    df_train.to_parquet(os.path.join(directorio_output, 'train.parquet'), index=False)
-    df_val.to_parquet(os.path.join(directorio_output, 'val.parquet'), index=False)
-    df_test.to_parquet(os.path.join(directorio_output, 'test.parquet'), index=False)
+    if not os.path.exists(ruta_input):
+        print(f" Error: No se encuentra {ruta_input}")
+        return
+
+    # El corte train/val/test es por posición, así que el fichero tiene que
+    # estar en orden cronológico. datos_final lo declara en el footer; si no,
+    # se ordena primero con la ordenación externa. Después se recorre por row
+    # groups y cada uno va a su split: no se carga el dataset entero
+    print(" Leyendo dataset enriquecido por row groups y creando nuevas variables...")
+    if declarado_ordenado(ruta_input, 'fecha_inicio'):
+        sink = SinkSplitsP5(filas_totales(ruta_input), directorio_output)
+        EscaneoCompartido(ruta_input).registrar('p5', sink).ejecutar()
+    else:
+        print(" El dataset no está declarado en orden cronológico: ordenando por fecha_inicio...")
+        with tempfile.TemporaryDirectory(dir=directorio_output) as tmp:
+            ruta_ordenada = os.path.join(tmp, 'ordenado.parquet')
+            ordenar_parquet(ruta_input, ruta_ordenada, 'fecha_inicio')
+            sink = SinkSplitsP5(filas_totales(ruta_ordenada), directorio_output)
+            EscaneoCompartido(ruta_ordenada).registrar('p5', sink).ejecutar()
     
     print("¡Datos preparados y guardados con éxito!")
 
+SALIDAS = [os.path.join(OUTPUT_DIR, f'{s}.parquet') for s in ('train', 'val', 'test')]
+CODIGO = hash_codigo(__file__, ordenacion, escaneo)
+PARAMS = {'train_pct': TRAIN_PCT, 'val_pct': VAL_PCT}
+
 if __name__ == "__main__":
-    preparar_y_dividir_datos(INPUT_FILE, OUTPUT_DIR)
\ No newline at end of file
+    manifest = Manifest()
+    if manifest.esta_actualizado("problema5", SALIDAS, [INPUT_FILE], CODIGO, PARAMS):
+        print(" SKIP: los splits del problema 5 ya están al día con datos_final.parquet.")
+    else:
+        preparar_y_dividir_datos(INPUT_FILE, OUTPUT_DIR)
+        if os.path.exists(INPUT_FILE) and all(os.path.exists(s) for s in SALIDAS):
+            manifest.registrar("problema5", SALIDAS, [INPUT_FILE], CODIGO, PARAMS)
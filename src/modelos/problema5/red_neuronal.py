@@ -1,3 +1,4 @@
+# Uso (desde la raíz del repo): python -m src.modelos.problema5.red_neuronal
 import pandas as pd
 import numpy as np
 import os
@@ -15,6 +16,8 @@ from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from tensorflow.keras import models, layers, callbacks, Input, optimizers
 from tensorflow.keras.layers import BatchNormalization
 
+from src.modelos.lotes_parquet import LotesParquet, Rendimiento, ajustar_scaler, valores_unicos
+
 # --- CONFIGURACIÓN DE RUTAS ---
 BASE_DIR = Path(__file__).resolve().parents[3] 
 DATA_DIR = BASE_DIR / 'data' / 'processed' / 'tlc_clean' / 'problema5'
@@ -29,27 +32,20 @@ TRAIN_FILE = DATA_DIR / 'train.parquet'
 VAL_FILE = DATA_DIR / 'val.parquet'
 TEST_FILE = DATA_DIR / 'test.parquet'
 
-def optimizar_tipos(df):
-    """Reduce el uso de memoria convirtiendo tipos de datos."""
-    for col in df.select_dtypes(include=['float64']).columns:
-        df[col] = df[col].astype('float32')
-    for col in df.select_dtypes(include=['int64']).columns:
-        df[col] = df[col].astype('int32')
-    return df
-
-def leer_datos_optimizados(ruta, sample_size=2000000):
-    """Lee el archivo con muestreo para no saturar la RAM."""
-    print(f"Leyendo {ruta.name}...")
-    parquet_file = pq.ParquetFile(ruta)
-    total_rows = parquet_file.metadata.num_rows
-    
+def fraccion_muestra(ruta, sample_size=2000000):
+    """Fracción de filas a leer para quedarse con ~sample_size (None si el fichero cabe entero)."""
+    total_rows = pq.ParquetFile(ruta).metadata.num_rows
     if total_rows > sample_size:
-        print(f"   Archivo muy grande ({total_rows:,} filas). Muestreando {sample_size:,}...")
-        df = pd.read_parquet(ruta).sample(n=sample_size, random_state=42)
-    else:
-        df = pd.read_parquet(ruta)
-    
-    return optimizar_tipos(df)
+        print(f"   {ruta.name} muy grande ({total_rows:,} filas). Muestreando {sample_size:,}...")
+        return sample_size / total_rows
+    return None
+
+def codificar(valores, le):
+    """Como le.transform, pero las categorías nuevas van al índice extra del embedding (len(classes_))."""
+    valores = valores.astype(str).to_numpy()
+    codigos = np.searchsorted(le.classes_, valores)
+    codigos = np.minimum(codigos, len(le.classes_) - 1)
+    return np.where(le.classes_[codigos] == valores, codigos, len(le.classes_)).astype(np.int32)
 
 # Función para calcular las métricas del modelo
 def calcular_metricas(y_true, y_pred, nombre_set):
@@ -71,46 +67,45 @@ def calcular_metricas(y_true, y_pred, nombre_set):
 def entrenar_red_neuronal():
     print("Iniciando entrenamiento de la Red Neuronal (MLP) ...")
 
-    # CARGAR DATOS
-    df_train = leer_datos_optimizados(TRAIN_FILE, sample_size=28000000)
-    df_val = leer_datos_optimizados(VAL_FILE, sample_size=6000000)
-    df_test = leer_datos_optimizados(TEST_FILE, sample_size=6000000)
+    # CARGAR DATOS (por row groups al entrenar; ver src/modelos/lotes_parquet.py)
+    fracciones = {
+        'train': fraccion_muestra(TRAIN_FILE, sample_size=28000000),
+        'val': fraccion_muestra(VAL_FILE, sample_size=6000000),
+        'test': fraccion_muestra(TEST_FILE, sample_size=6000000),
+    }
 
     # Definir variables
     target = 'propina'
     columnas_a_ignorar = [target, 'origen_id', 'destino_id', 'destino_zona', 'destino_barrio']
     columnas_embeddings = ['tipo_vehiculo', 'origen_zona', 'origen_barrio', 'evento_tipo', 'franja_horaria']
 
-    columnas_numericas = [c for c in df_train.columns if c not in columnas_embeddings + columnas_a_ignorar]
+    columnas_train = pq.read_schema(TRAIN_FILE).names
+    columnas_numericas = [c for c in columnas_train if c not in columnas_embeddings + columnas_a_ignorar]
+    columnas = columnas_embeddings + columnas_numericas + [target]
 
     # 3. PREPROCESAMIENTO
     encoders = {}
-    X_emb_train, X_emb_val, X_emb_test = [], [], []
-
     for col in columnas_embeddings:
         le = LabelEncoder()
-        # Asegurar que todos sean string y manejar valores desconocidos
-        df_train[col] = df_train[col].astype(str)
-        df_val[col] = df_val[col].astype(str)
-        df_test[col] = df_test[col].astype(str)
-
-        X_emb_train.append(le.fit_transform(df_train[col]))
-        # Mapeo de seguridad para evitar errores de categorías nuevas en val/test
-        X_emb_val.append(le.transform(df_val[col]))
-        X_emb_test.append(le.transform(df_test[col]))
+        # Asegurar que todos sean string; las categorías nuevas de val/test van al índice extra
+        le.fit(valores_unicos(TRAIN_FILE, col, transformar=lambda v: v.astype(str)))
         encoders[col] = le
 
-    scaler = StandardScaler()
-    X_num_train = scaler.fit_transform(df_train[columnas_numericas])
-    X_num_val = scaler.transform(df_val[columnas_numericas])
-    X_num_test = scaler.transform(df_test[columnas_numericas])
+    scaler = ajustar_scaler(
+        TRAIN_FILE, lambda df: df[columnas_numericas].astype('float32'),
+        columnas=columnas_numericas, fraccion=fracciones['train'],
+    )
 
-    y_train = df_train[target].values
-    y_val = df_val[target].values
-    y_test = df_test[target].values
+    def preparar(df):
+        X_emb = [codificar(df[col], encoders[col]) for col in columnas_embeddings]
+        X_num = scaler.transform(df[columnas_numericas].astype('float32')).astype(np.float32)
+        return X_emb + [X_num], df[target].to_numpy(dtype=np.float32)
 
-    # Liberar X original para ganar RAM
-    del df_train, df_val, df_test
+    ds_train = LotesParquet(TRAIN_FILE, preparar, 2048, columnas=columnas,
+                            shuffle=True, fraccion=fracciones['train'])
+    ds_val = LotesParquet(VAL_FILE, preparar, 2048, columnas=columnas, fraccion=fracciones['val'])
+    ds_test = LotesParquet(TEST_FILE, preparar, 2048, columnas=columnas, fraccion=fracciones['test'])
+    rendimiento = Rendimiento(ds_train)
 
     # CONSTRUIR LA RED NEURONAL (Arquitectura MLP)
     print("Construyendo la arquitectura de la red...")
@@ -151,18 +146,18 @@ def entrenar_red_neuronal():
     )
 
     history = model.fit(
-        X_emb_train + [X_num_train], y_train,
+        ds_train,           # Lotes de 2048 viajes leídos del parquet
         epochs=30,          # Máximo de vueltas
-        batch_size=2048,     # Le pasamos los viajes de 512 en 512 para que aprenda rápido
-        validation_data=(X_emb_val + [X_num_val], y_val), # Examen en cada vuelta
-        callbacks=[early_stopping],
+        validation_data=ds_val, # Examen en cada vuelta
+        callbacks=[early_stopping, rendimiento],
         verbose=1           # Muestra la barra de progreso
     )
 
     # EVALUACIÓN Y MÉTRICAS
     print("\nEvaluando en Test...")
-    y_pred_val = model.predict(X_emb_val + [X_num_val], batch_size=2048).flatten()
-    y_pred_test = model.predict(X_emb_test + [X_num_test], batch_size=2048).flatten() # flatten() lo aplana para poder restarlo con y_val
+    y_pred_val = model.predict(ds_val).flatten()
+    y_pred_test = model.predict(ds_test).flatten() # flatten() lo aplana para poder restarlo con y_val
+    y_val, y_test = ds_val.objetivos(), ds_test.objetivos()
     
     metrics_val = calcular_metricas(y_val, y_pred_val, "val")
     metrics_test = calcular_metricas(y_test, y_pred_test, "test")
@@ -170,9 +165,10 @@ def entrenar_red_neuronal():
     resultados = {
         "model_name": "DeepLearning_MLP_28M",
         "data_info": {
-            "train_samples": len(y_train),
+            "train_samples": ds_train.num_filas,
             "val_samples": len(y_val),
-            "test_samples": len(y_test)
+            "test_samples": len(y_test),
+            "muestras_s": [round(v) for v in rendimiento.muestras_s]
         },
         **metrics_val,
         **metrics_test
@@ -0,0 +1,170 @@
+"""Genera los datasets de todos los problemas con una sola lectura de datos_final.
+
+P1, P2, P4 y P5 preparan sus splits, las funcionalidades de demanda y
+mapa calculan sus agregados y el cubo de demanda se rellena recorriendo
+datos_final.parquet cada uno por su cuenta (unos ocho escaneos completos). Aquí se registran todos como
+consumidores de src.processing.escaneo y datos_final se lee una vez.
+
+Cada objetivo respeta el manifest igual que su script: los que están al
+día no se registran, y si no queda ninguno no se lee nada. Los scripts de
+cada problema siguen funcionando solos.
+
+Uso (desde la raíz del repo):
+    python -m src.pipelines.escaneo_compartido
+    python -m src.pipelines.escaneo_compartido --solo p1 p2 demanda
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from src.pipelines.manifest import Manifest
+from src.processing.escaneo import EscaneoCompartido
+from src.processing.lectura import resumen_footer
+from src.processing.ordenacion import declarado_ordenado
+
+ENTRADA = Path("data/processed/tlc_clean/datos_final.parquet")
+OBJETIVOS = ["p1", "p2", "p4", "p5", "demanda", "mapa", "cubo"]
+
+
+def _misma_ruta(a, b) -> bool:
+    return Path(a).resolve() == Path(b).resolve()
+
+
+def _objetivo_splits(modulo, artefacto, salidas, entradas, consumidor, guardar):
+    return {
+        "manifest": (artefacto, salidas, entradas, modulo.CODIGO, getattr(modulo, "PARAMS", None)),
+        "consumidores": lambda: {artefacto: consumidor()},
+        "guardar": lambda res: guardar(res[artefacto]),
+    }
+
+
+def construir_objetivo(nombre: str, entrada: Path) -> dict | str:
+    """
+    Definición de un objetivo: entrada del manifest (o None), fábrica de
+    consumidores y función que escribe los artefactos con sus resultados.
+    Si el objetivo no puede ir en el escaneo compartido devuelve el motivo.
+    """
+    if nombre == "p1":
+        from src.modelos.problema1 import preparar_datos as p1
+        if not _misma_ruta(p1.PARQUET_PATH, entrada):
+            return f"lee {p1.PARQUET_PATH}"
+        return _objetivo_splits(
+            p1, p1.ARTEFACTO, p1.SALIDAS, [p1.PARQUET_PATH], lambda: p1.AgregadorZonaHora(p1.planificar()), p1.guardar
+        )
+
+    if nombre == "p2":
+        from src.modelos.problema2 import preparar_datos as p2
+        if not _misma_ruta(p2.PARQUET_PATH, entrada):
+            return f"lee {p2.PARQUET_PATH}"
+        return _objetivo_splits(
+            p2, p2.ARTEFACTO, p2.SALIDAS, [p2.PARQUET_PATH], lambda: p2.AgregadorZonaVentana(p2.planificar()), p2.guardar
+        )
+
+    if nombre == "p4":
+        from src.modelos.problema4 import preprocesamiento_base as p4
+        if not _misma_ruta(p4.INPUT_PATH, entrada):
+            # Con la versión particionada P4 lee solo sus meses: mejor aparte
+            return f"lee {p4.INPUT_PATH}"
+        return _objetivo_splits(p4, "problema4", p4.SALIDAS, [p4.INPUT_PATH], p4.SinkSplitsP4, lambda res: None)
+
+    if nombre == "p5":
+        from src.modelos.problema5 import preparar_datos as p5
+        if not _misma_ruta(p5.INPUT_FILE, entrada):
+            return f"lee {p5.INPUT_FILE}"
+        if not declarado_ordenado(entrada, "fecha_inicio"):
+            # El corte por posición necesita el orden cronológico
+            return "la entrada no está declarada en orden cronológico"
+        n_total = resumen_footer(entrada)["filas"]
+        return _objetivo_splits(
+            p5, "problema5", p5.SALIDAS, [p5.INPUT_FILE], lambda: p5.SinkSplitsP5(n_total), lambda res: None
+        )
+
+    if nombre == "demanda":
+        from src.funcionalidades import demanda_zona_franja as dzf
+        return {
+            "manifest": None,
+            "consumidores": lambda: {"demanda": dzf.AgregadorDemandaZonaHora()},
+            "guardar": lambda res: dzf.generar_informe(dzf.tipos_demanda(res["demanda"]), [entrada]),
+        }
+
+    if nombre == "mapa":
+        from src.funcionalidades import mapa_coropletico as mapa
+        if not _misma_ruta(mapa.DATA_PATH, entrada):
+            return f"lee {mapa.DATA_PATH}"
+        return {
+            "manifest": None,
+            "consumidores": lambda: {
+                f"mapa/{col}": mapa.AgregadorIndiceEconomico(col) for col in ("origen_barrio", "origen_id")
+            },
+            "guardar": lambda res: mapa.generar_mapa_plotly(res["mapa/origen_barrio"], res["mapa/origen_id"]),
+        }
+
+    if nombre == "cubo":
+        from src.processing import cubo_demanda as cubo
+        return {
+            "manifest": (cubo.ARTEFACTO, cubo.salidas(), [entrada], cubo.CODIGO, cubo.PARAMS),
+            "consumidores": lambda: {"cubo": cubo.ConstructorCubo(entrada)},
+            "guardar": lambda res: None,
+        }
+
+    raise ValueError(f"Objetivo desconocido: {nombre}")
+
+
+def ejecutar(objetivos: list[str], entrada: Path = ENTRADA) -> dict[str, str]:
+    """Registra los objetivos pendientes, hace un único escaneo y guarda. Devuelve el estado de cada uno."""
+    if not entrada.exists():
+        raise FileNotFoundError(f"No se encuentra {entrada}")
+
+    manifest = Manifest()
+    estado: dict[str, str] = {}
+    pendientes: dict[str, dict] = {}
+    escaneo = EscaneoCompartido(entrada)
+
+    for nombre in objetivos:
+        objetivo = construir_objetivo(nombre, entrada)
+        if isinstance(objetivo, str):
+            estado[nombre] = f"FUERA ({objetivo}): ejecutar su script aparte"
+            continue
+        if objetivo["manifest"] is not None and manifest.esta_actualizado(*objetivo["manifest"]):
+            estado[nombre] = "SKIP (al día)"
+            continue
+        for clave, consumidor in objetivo["consumidores"]().items():
+            escaneo.registrar(clave, consumidor)
+        pendientes[nombre] = objetivo
+
+    if not pendientes:
+        print("Nada que recalcular: no se lee datos_final.")
+        return estado
+
+    print(f"Escaneo compartido de {entrada} para: {', '.join(pendientes)}")
+    t0 = time.perf_counter()
+    resultados = escaneo.ejecutar()
+
+    for nombre, objetivo in pendientes.items():
+        print(f"\n── {nombre} ──")
+        objetivo["guardar"](resultados)
+        if objetivo["manifest"] is not None:
+            manifest.registrar(*objetivo["manifest"])
+        estado[nombre] = "OK"
+
+    print(f"\nTotal: {time.perf_counter() - t0:.1f}s")
+    return estado
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser("Datasets de todos los problemas en un solo escaneo de datos_final")
+    parser.add_argument("--solo", nargs="+", choices=OBJETIVOS, default=OBJETIVOS)
+    parser.add_argument("--entrada", type=Path, default=ENTRADA)
+    args = parser.parse_args()
+
+    estado = ejecutar(args.solo, args.entrada)
+    print("\nResumen:")
+    for nombre in args.solo:
+        print(f"  {nombre:8s} {estado.get(nombre, '-')}")
+
+
+if __name__ == "__main__":
+    main()
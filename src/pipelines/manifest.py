@@ -0,0 +1,208 @@
+"""Manifest de artefactos del pipeline.
+
+Cada artefacto producido (mes limpio, dataset intermedio, datos_final,
+splits de cada problema) queda registrado con el hash de contenido de sus
+entradas, la versión del código que lo generó y los parámetros usados.
+Una etapa solo se recalcula si alguna de esas tres cosas cambia.
+
+Como las entradas de una etapa son las salidas de la anterior, la
+invalidación se propaga sola: si se regenera un mes con otro contenido,
+cambia su hash y quedan obsoletos dataset_intermedio, datos_final y los
+datasets de cada problema.
+
+Uso (estado de todos los artefactos):
+    python -m src.pipelines.manifest
+    python -m src.pipelines.manifest --invalidar problema1/raw
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from src.config import PROCESSED_DIR, PROJECT_ROOT
+
+MANIFEST_PATH = PROCESSED_DIR / "manifest.json"
+VERSION_MANIFEST = 1
+_BLOQUE = 8 * 1024 * 1024
+
+
+def _clave_ruta(path) -> str:
+    """Ruta relativa a la raíz del repo (o absoluta si está fuera)."""
+    path = Path(path).resolve()
+    try:
+        return path.relative_to(PROJECT_ROOT).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def hash_archivo(path) -> str:
+    """SHA-256 del contenido de un fichero, leído por bloques."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(_BLOQUE), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def hash_codigo(*fuentes) -> str:
+    """
+    Versión de código: hash de los ficheros fuente que implementan la etapa.
+    Acepta rutas o módulos importados (se usa su __file__).
+    """
+    h = hashlib.sha256()
+    for fuente in fuentes:
+        path = Path(getattr(fuente, "__file__", fuente))
+        h.update(_clave_ruta(path).encode())
+        h.update(path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+class Manifest:
+    """Registro JSON de artefactos con sus entradas, código y parámetros."""
+
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = Path(path)
+        self.datos = {"version": VERSION_MANIFEST, "artefactos": {}, "hashes": {}}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                cargado = json.load(f)
+            if cargado.get("version") == VERSION_MANIFEST:
+                self.datos = cargado
+
+    # ── Hashes con caché por (tamaño, mtime) ─────────────────────────────────
+    def hash(self, path) -> str | None:
+        """
+        Hash de contenido de un fichero (o de un directorio, combinando sus ficheros).
+        Se reutiliza el hash guardado mientras tamaño y mtime no cambien, para
+        no releer los parquets grandes en cada ejecución.
+        """
+        path = Path(path)
+        if path.is_dir():
+            h = hashlib.sha256()
+            for hijo in sorted(p for p in path.rglob("*") if p.is_file()):
+                h.update(hijo.relative_to(path).as_posix().encode())
+                h.update((self.hash(hijo) or "").encode())
+            return h.hexdigest()
+        if not path.exists():
+            return None
+
+        st = path.stat()
+        clave = _clave_ruta(path)
+        cache = self.datos["hashes"].get(clave)
+        if cache and cache["size"] == st.st_size and cache["mtime_ns"] == st.st_mtime_ns:
+            return cache["sha256"]
+
+        digest = hash_archivo(path)
+        self.datos["hashes"][clave] = {
+            "size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest,
+        }
+        return digest
+
+    def firma(self, entradas, codigo: str, params: dict | None = None) -> dict:
+        return {
+            "entradas": {_clave_ruta(p): self.hash(p) for p in entradas},
+            "codigo": codigo,
+            "params": json.loads(json.dumps(params or {}, default=str)),
+        }
+
+    # ── Consulta / registro ──────────────────────────────────────────────────
+    def esta_actualizado(
+        self, artefacto: str, salidas, entradas, codigo: str, params: dict | None = None
+    ) -> bool:
+        """True si las salidas existen, no se han tocado y entradas/código/params coinciden."""
+        entrada = self.datos["artefactos"].get(artefacto)
+        if entrada is None:
+            return False
+        salidas_actuales = {_clave_ruta(p): self.hash(p) for p in salidas}
+        if None in salidas_actuales.values() or salidas_actuales != entrada["salidas"]:
+            return False
+        firma = self.firma(entradas, codigo, params)
+        return all(entrada.get(k) == v for k, v in firma.items())
+
+    def registrar(
+        self, artefacto: str, salidas, entradas, codigo: str, params: dict | None = None
+    ) -> None:
+        self.datos["artefactos"][artefacto] = {
+            **self.firma(entradas, codigo, params),
+            "salidas": {_clave_ruta(p): self.hash(p) for p in salidas},
+        }
+        self.guardar()
+
+    def invalidar(self, artefacto: str) -> bool:
+        existia = self.datos["artefactos"].pop(artefacto, None) is not None
+        self.guardar()
+        return existia
+
+    def guardar(self) -> None:
+        """Escritura atómica (tmp + rename) para no dejar un manifest a medias."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.datos, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    # ── Estado global ────────────────────────────────────────────────────────
+    def estado(self) -> dict[str, str]:
+        """
+        Estado de cada artefacto registrado: 'ok', 'obsoleto' o 'falta'.
+        Un artefacto también es obsoleto si alguna de sus entradas la produce
+        otro artefacto obsoleto (invalidación en cascada).
+        """
+        artefactos = self.datos["artefactos"]
+        productor = {
+            salida: nombre for nombre, a in artefactos.items() for salida in a["salidas"]
+        }
+        resultado: dict[str, str] = {}
+
+        def evaluar(nombre: str) -> str:
+            if nombre in resultado:
+                return resultado[nombre]
+            resultado[nombre] = "ok"  # evita ciclos
+            a = artefactos[nombre]
+            actuales = {s: self.hash(PROJECT_ROOT / s) for s in a["salidas"]}
+            if None in actuales.values():
+                estado = "falta"
+            elif actuales != a["salidas"]:
+                estado = "obsoleto"
+            elif any(self.hash(PROJECT_ROOT / e) != h for e, h in a["entradas"].items()):
+                estado = "obsoleto"
+            elif any(
+                e in productor and evaluar(productor[e]) != "ok" for e in a["entradas"]
+            ):
+                estado = "obsoleto"
+            else:
+                estado = "ok"
+            resultado[nombre] = estado
+            return estado
+
+        for nombre in artefactos:
+            evaluar(nombre)
+        return resultado
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser("Estado del manifest de artefactos")
+    parser.add_argument("--manifest", type=Path, default=MANIFEST_PATH)
+    parser.add_argument("--invalidar", nargs="+", default=[], help="Artefactos a forzar")
+    args = parser.parse_args()
+
+    manifest = Manifest(args.manifest)
+    for nombre in args.invalidar:
+        ok = manifest.invalidar(nombre)
+        print(f"{'INVALIDADO' if ok else 'NO EXISTE '} {nombre}")
+
+    estado = manifest.estado()
+    if not estado:
+        print("Manifest vacío: no hay artefactos registrados.")
+        return
+    for nombre, valor in sorted(estado.items()):
+        print(f"{valor.upper():9s} {nombre}")
+    manifest.guardar()
+
+
+if __name__ == "__main__":
+    main()
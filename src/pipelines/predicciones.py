@@ -0,0 +1,170 @@
+"""Almacén de predicciones en Parquet.
+
+Los scripts de análisis y evaluación (analizar_predicciones,
+probar_ejemplos_reales, evaluacion_final, ...) releían el test y volvían a
+pasar el modelo entero cada vez que se cambiaba una gráfica o una tabla.
+
+Aquí cada conjunto de predicciones se guarda como un parquet con una
+clave que combina:
+  - el hash de contenido de los artefactos del modelo (modelo, scaler,
+    encoder...),
+  - el hash del dataset de entrada,
+  - la lista de features (en orden) y, opcionalmente, parámetros extra
+    (muestreo, umbral...).
+
+Si la clave ya existe se lee el parquet; si no, se llama a la función de
+predicción y se guarda. Cambiar el modelo, el dataset o las features
+cambia la clave, así que solo se recalcula lo obsoleto. Los hashes de
+ficheros reutilizan la caché por (tamaño, mtime) del manifest.
+
+    almacen = AlmacenPredicciones()
+    pred = almacen.obtener(
+        'p1/rf_test', [MODEL_DIR / 'baseline_random_forest.pkl'], DATA_DIR / 'test.parquet',
+        FEATURE_COLS, lambda: {'pred_rf': np.clip(rf.predict(df_test[FEATURE_COLS]), 0, None)},
+    )
+    df_test['pred_rf'] = pred['pred_rf'].to_numpy()
+
+Las predicciones van alineadas fila a fila con el dataset tal como se lee.
+
+Uso (listar entradas y borrar las obsoletas):
+    python -m src.pipelines.predicciones
+    python -m src.pipelines.predicciones --purgar
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import DATA_DIR, PROJECT_ROOT
+from src.pipelines.manifest import Manifest, _clave_ruta
+
+ALMACEN_DIR = DATA_DIR / "outputs" / "predicciones"
+INDICE = "indice.json"
+
+
+class AlmacenPredicciones:
+    """Predicciones en parquet indexadas por (artefactos del modelo, dataset, features)."""
+
+    def __init__(self, directorio: Path = ALMACEN_DIR, manifest: Manifest | None = None):
+        self.directorio = Path(directorio)
+        self.manifest = manifest or Manifest()
+        self.indice = {}
+        ruta_indice = self.directorio / INDICE
+        if ruta_indice.exists():
+            with open(ruta_indice, encoding="utf-8") as f:
+                self.indice = json.load(f)
+
+    # ── Clave ────────────────────────────────────────────────────────────────
+    def firma(self, modelos, dataset, features, extra: dict | None = None) -> dict:
+        """Lo que identifica un conjunto de predicciones (hashes de contenido, no rutas)."""
+        modelos = [modelos] if isinstance(modelos, (str, Path)) else list(modelos)
+        h_modelos = {_clave_ruta(p): self.manifest.hash(p) for p in modelos}
+        h_dataset = {_clave_ruta(dataset): self.manifest.hash(dataset)}
+        faltan = [p for p, h in {**h_modelos, **h_dataset}.items() if h is None]
+        if faltan:
+            raise FileNotFoundError(f"No existen: {faltan}")
+        return {
+            "modelos": h_modelos,
+            "dataset": h_dataset,
+            "features": [str(c) for c in features],
+            "extra": json.loads(json.dumps(extra or {}, default=str)),
+        }
+
+    @staticmethod
+    def clave(firma: dict) -> str:
+        return hashlib.sha256(json.dumps(firma, sort_keys=True).encode()).hexdigest()[:20]
+
+    def ruta(self, nombre: str, clave: str) -> Path:
+        return self.directorio / nombre / f"{clave}.parquet"
+
+    # ── Lectura / escritura ──────────────────────────────────────────────────
+    def obtener(self, nombre: str, modelos, dataset, features, predecir, extra: dict | None = None) -> pd.DataFrame:
+        """
+        Predicciones de `nombre` para esta firma. `predecir()` solo se llama si
+        no hay una entrada válida y debe devolver un DataFrame, o un dict de
+        columnas, alineado con las filas del dataset.
+        """
+        firma = self.firma(modelos, dataset, features, extra)
+        clave = self.clave(firma)
+        ruta = self.ruta(nombre, clave)
+        if ruta.exists():
+            print(f"   Predicciones {nombre}: del almacén ({ruta.name})")
+            return pd.read_parquet(ruta)
+
+        print(f"   Predicciones {nombre}: calculando...")
+        t0 = time.perf_counter()
+        pred = pd.DataFrame(predecir()).reset_index(drop=True)
+        segundos = time.perf_counter() - t0
+        self.guardar(nombre, clave, firma, pred, segundos)
+        print(f"   Predicciones {nombre}: {len(pred):,} filas en {segundos:.1f}s → {ruta}")
+        return pred
+
+    def guardar(self, nombre: str, clave: str, firma: dict, pred: pd.DataFrame, segundos: float) -> None:
+        ruta = self.ruta(nombre, clave)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = ruta.with_suffix(".parquet.tmp")
+        pred.to_parquet(tmp, index=False)
+        os.replace(tmp, ruta)
+        self.indice[f"{nombre}/{clave}"] = {
+            **firma, "filas": len(pred), "columnas": list(pred.columns), "segundos": round(segundos, 2),
+        }
+        self.guardar_indice()
+        # Persistir la caché de hashes del manifest (no registra artefactos)
+        self.manifest.guardar()
+
+    def guardar_indice(self) -> None:
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        tmp = self.directorio / f"{INDICE}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.indice, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.directorio / INDICE)
+
+    # ── Estado ───────────────────────────────────────────────────────────────
+    def estado(self) -> dict[str, str]:
+        """'ok' si los artefactos y el dataset de cada entrada siguen iguales, 'obsoleta' si no."""
+        resultado = {}
+        for entrada, info in self.indice.items():
+            hashes = {**info["modelos"], **info["dataset"]}
+            vigente = all(self.manifest.hash(PROJECT_ROOT / p) == h for p, h in hashes.items())
+            existe = (self.directorio / f"{entrada}.parquet").exists()
+            resultado[entrada] = "ok" if vigente and existe else "obsoleta"
+        return resultado
+
+    def purgar(self) -> list[str]:
+        """Borra las entradas obsoletas (ya no se volverían a leer)."""
+        borradas = [e for e, estado in self.estado().items() if estado == "obsoleta"]
+        for entrada in borradas:
+            (self.directorio / f"{entrada}.parquet").unlink(missing_ok=True)
+            del self.indice[entrada]
+        self.guardar_indice()
+        return borradas
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser("Almacén de predicciones")
+    parser.add_argument("--directorio", type=Path, default=ALMACEN_DIR)
+    parser.add_argument("--purgar", action="store_true", help="borrar las entradas obsoletas")
+    args = parser.parse_args()
+
+    almacen = AlmacenPredicciones(args.directorio)
+    if args.purgar:
+        for entrada in almacen.purgar():
+            print(f"BORRADA  {entrada}")
+
+    estado = almacen.estado()
+    if not estado:
+        print("Almacén vacío.")
+    for entrada, e in sorted(estado.items()):
+        info = almacen.indice[entrada]
+        print(f"{e.upper():9s} {entrada}  ({info['filas']:,} filas, {info['segundos']}s)")
+
+
+if __name__ == "__main__":
+    main()
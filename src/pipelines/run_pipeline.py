@@ -1,3 +1,4 @@
+# Uso (desde la raíz del repo): python -m src.pipelines.run_pipeline
 import argparse
 from pathlib import Path
 
@@ -14,6 +15,15 @@ from src.processing.clean_tlc import clean_file
 from src.processing.enrich_tlc import enrich_data
 
 from src.processing.stats import print_dataset_stats
+from src.processing.particionado import DATASET_DIR, escribir_mes_particionado
+
+# Manifest de artefactos (ejecución incremental)
+from src.pipelines.manifest import Manifest, hash_codigo
+import src.processing.clean_tlc as clean_tlc
+import src.processing.columnas as columnas
+import src.processing.enrich_tlc as enrich_tlc
+import src.processing.escritura as escritura
+import src.processing.ordenacion as ordenacion
 
 
 
@@ -24,6 +34,10 @@ def main():
     parser.add_argument("--services", nargs="+", default=["yellow"])
     parser.add_argument("--overwrite", action="store_true")
     parser.add_argument("--skip-enrich", action="store_true", help="Saltar el enriquecimiento de zonas")
+    parser.add_argument(
+        "--particionado", action="store_true",
+        help=f"Escribir también el dataset Hive service=/year=/month= en {DATASET_DIR}",
+    )
 
     args = parser.parse_args()
 
@@ -75,6 +89,12 @@ def main():
     print("LIMPIEZA Y ENRIQUECIMIENTO")
     print("="*60)
     
+    manifest = Manifest()
+    codigo_limpieza = hash_codigo(clean_tlc, columnas, enrich_tlc, escritura, ordenacion)
+    entradas_enrich = [] if args.skip_enrich else [
+        p for p in (LOOKUP_PATH, WEATHER_PATH, HOLIDAYS_PATH, EVENTS_PATH) if p.exists()
+    ]
+
     months = month_range(args.start, args.end)
     for service in services:
         for mm in months:
@@ -92,25 +112,48 @@ def main():
                 print(f"FAIL {in_path.name} (no descargado)")
                 continue
 
+            # Solo se rehace el mes si cambió el raw, algún auxiliar o el código
+            artefacto = f"tlc_clean/{service}/{mm}"
+            entradas = [in_path] + entradas_enrich
+            params = {"service": service, "enrich": not args.skip_enrich}
+            particion = DATASET_DIR / f"service={service}" / f"year={int(year)}" / f"month={int(mm[5:])}"
+            if not args.overwrite and manifest.esta_actualizado(
+                artefacto, [out_path], entradas, codigo_limpieza, params
+            ):
+                print(f"SKIP {out_path.name} (sin cambios)")
+                if args.particionado and not particion.exists():
+                    print(escribir_mes_particionado(out_path, service, int(year), int(mm[5:])))
+                continue
+
             # Limpiar
-            msg = clean_file(in_path, out_path, service=service, overwrite=args.overwrite)
+            msg = clean_file(in_path, out_path, service=service, overwrite=True)
             print(msg)
+            if not msg.startswith("OK"):
+                continue
 
             # Enriquecer
             if not args.skip_enrich and out_path.exists():
                 if not LOOKUP_PATH.exists():
                     print(f"   No encuentro {LOOKUP_PATH}")
-                else:
-                    msg_enrich = enrich_data(
-                        out_path, 
-                        LOOKUP_PATH, 
-                        WEATHER_PATH if WEATHER_PATH.exists() else None,
-                        HOLIDAYS_PATH if HOLIDAYS_PATH.exists() else None,
-                        EVENTS_PATH if EVENTS_PATH.exists() else None,
-                    )
-                    print(f"  {msg_enrich}")
-
-            print_dataset_stats(out_path)
+                    continue
+                msg_enrich = enrich_data(
+                    out_path, 
+                    LOOKUP_PATH, 
+                    WEATHER_PATH if WEATHER_PATH.exists() else None,
+                    HOLIDAYS_PATH if HOLIDAYS_PATH.exists() else None,
+                    EVENTS_PATH if EVENTS_PATH.exists() else None,
+                )
+                print(f"  {msg_enrich}")
+                if not msg_enrich.startswith(f" {out_path.name} ("):
+                    continue
+
+            manifest.registrar(artefacto, [out_path], entradas, codigo_limpieza, params)
+            if args.particionado:
+                print(escribir_mes_particionado(out_path, service, int(year), int(mm[5:])))
+
+            print_dataset_stats(
+                out_path, json_path=PROCESSED_DIR / "stats" / service / f"{out_path.stem}.json"
+            )
 
 
 
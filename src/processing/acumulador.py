@@ -0,0 +1,214 @@
+"""Agregados por grupo exactos y combinables, para groupbys por chunks.
+
+Los preparar_datos de P1/P2 agregaban cada row group con pandas, guardaban
+todos los parciales en listas y al final hacían concat + groupby otra vez,
+promediando las medias de cada chunk (incorrecto cuando un grupo cae en
+dos row groups) y con memoria proporcional al número de chunks.
+
+AcumuladorGrupos guarda por clave (int64) los estadísticos suficientes en
+arrays: suma y conteo (para media), mínimo, máximo y primer valor. Cada
+chunk se reduce a sus claves únicas y se encola; cuando lo encolado supera
+a lo ya consolidado se fusiona todo con un sort + reduceat. El coste
+amortizado es O(n log n) y la memoria, proporcional a las claves distintas.
+Dos acumuladores se pueden combinar (p. ej. resultados de varios procesos).
+
+La clave típica es zona × ventana temporal empaquetada en un int64:
+
+    claves = clave_zona_ventana(df['origen_id'], df['fecha_inicio'], '1h')
+    acc = AcumuladorGrupos({'demanda': ('fecha_inicio', 'count'),
+                            'temp_c': ('temp_c', 'mean')})
+    acc.actualizar(claves, df)
+    claves, valores = acc.resultado()
+    zona, ventana = separar_clave(claves, '1h')
+
+Para unir dos agregados con la misma clave (p. ej. oferta por destino y
+demanda por origen) basta con unir_por_clave, sin pasar por un merge.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+OPERACIONES = ("sum", "count", "mean", "min", "max", "first")
+# Bits bajos de la clave para el índice de ventana (segundos desde epoch / paso)
+BITS_VENTANA = 32
+# Tamaño mínimo de lo encolado antes de fusionar
+MIN_PENDIENTE = 1 << 16
+
+
+def _paso_segundos(frecuencia) -> int:
+    return int(pd.Timedelta(frecuencia).total_seconds())
+
+
+def clave_zona_ventana(zonas, fechas, frecuencia) -> np.ndarray:
+    """zona << 32 | índice de la ventana (floor) de `frecuencia` desde epoch."""
+    segundos = np.asarray(fechas, dtype="datetime64[s]").astype(np.int64)
+    ventana = segundos // _paso_segundos(frecuencia)
+    return (np.asarray(zonas, dtype=np.int64) << BITS_VENTANA) | ventana
+
+
+def separar_clave(claves: np.ndarray, frecuencia, unidad: str = "datetime64[us]"):
+    """Inversa de clave_zona_ventana: (zonas int64, inicio de ventana como datetime64)."""
+    zonas = claves >> BITS_VENTANA
+    ventana = claves & ((1 << BITS_VENTANA) - 1)
+    inicio = (ventana * _paso_segundos(frecuencia)).astype("datetime64[s]").astype(unidad)
+    return zonas, inicio
+
+
+def unir_por_clave(claves, claves_tabla: np.ndarray, valores_tabla: np.ndarray, relleno=np.nan) -> np.ndarray:
+    """
+    Left join por clave int64 con searchsorted: el valor de `valores_tabla`
+    para cada clave de `claves`, o `relleno` si no está. `claves_tabla` debe
+    estar ordenada y sin repetidos (como las de AcumuladorGrupos.resultado).
+    """
+    claves = np.asarray(claves, dtype=np.int64)
+    valores_tabla = np.asarray(valores_tabla)
+    resultado = np.full(len(claves), relleno, dtype=np.result_type(valores_tabla, relleno))
+    if len(claves_tabla) == 0:
+        return resultado
+    pos = np.minimum(np.searchsorted(claves_tabla, claves), len(claves_tabla) - 1)
+    encontrada = claves_tabla[pos] == claves
+    resultado[encontrada] = valores_tabla[pos[encontrada]]
+    return resultado
+
+
+def _reducir(claves: np.ndarray, estados: dict, ops: dict):
+    """Agrupa filas (o parciales) por clave conservando el orden de llegada en empates."""
+    orden = np.argsort(claves, kind="stable")
+    claves = claves[orden]
+    inicio = np.flatnonzero(np.r_[True, claves[1:] != claves[:-1]])
+    reducidos = {}
+    for nombre, valores in estados.items():
+        v = valores[orden]
+        op = ops[nombre]
+        if op in ("sum", "count"):
+            reducidos[nombre] = np.add.reduceat(v, inicio) if len(v) else v
+        elif op == "min":
+            reducidos[nombre] = np.fmin.reduceat(v, inicio) if len(v) else v
+        elif op == "max":
+            reducidos[nombre] = np.fmax.reduceat(v, inicio) if len(v) else v
+        else:  # first: el primero que llegó
+            reducidos[nombre] = v[inicio]
+    return claves[inicio], reducidos
+
+
+class AcumuladorGrupos:
+    """
+    Agregación exacta por clave int64 en streaming.
+
+    agregaciones: {nombre_salida: (columna, operación)} con operación en
+    sum, count, mean, min, max o first. Como en pandas, sum/mean/count
+    ignoran nulos y min/max también; first toma el valor de la primera
+    fila que llegó con esa clave.
+    """
+
+    def __init__(self, agregaciones: dict):
+        for nombre, (_, op) in agregaciones.items():
+            if op not in OPERACIONES:
+                raise ValueError(f"Operación no soportada para {nombre}: {op}")
+        self.agregaciones = dict(agregaciones)
+        self.claves = np.empty(0, dtype=np.int64)
+        self.estados: dict[str, np.ndarray] = {}
+        self.ops: dict[str, str] = {}
+        self.tipos: dict[str, np.dtype] = {}
+        self._pendientes: list = []
+        self._filas_pendientes = 0
+
+    # ── Estados por fila ──────────────────────────────────────────────────────
+    def _estados_fila(self, df: pd.DataFrame) -> dict:
+        estados = {}
+        for nombre, (columna, op) in self.agregaciones.items():
+            serie = df[columna]
+            nulos = serie.isna().to_numpy()
+            self.tipos.setdefault(nombre, serie.dtype)
+            if op in ("count", "mean"):
+                estados[f"{nombre}:n"] = (~nulos).astype(np.int64)
+                self.ops[f"{nombre}:n"] = "count"
+            if op in ("sum", "mean"):
+                valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+                estados[f"{nombre}:s"] = np.where(nulos, 0.0, valores)
+                self.ops[f"{nombre}:s"] = "sum"
+            if op in ("min", "max"):
+                estados[f"{nombre}:{op}"] = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+                self.ops[f"{nombre}:{op}"] = op
+            if op == "first":
+                estados[f"{nombre}:f"] = serie.to_numpy()
+                self.ops[f"{nombre}:f"] = "first"
+        return estados
+
+    # ── Actualización / fusión ────────────────────────────────────────────────
+    def actualizar(self, claves, df: pd.DataFrame) -> None:
+        """Añade las filas de un chunk (claves alineadas con df)."""
+        claves = np.asarray(claves, dtype=np.int64)
+        if len(claves) == 0:
+            return
+        self._encolar(*_reducir(claves, self._estados_fila(df), self.ops))
+
+    def _encolar(self, claves, estados) -> None:
+        self._pendientes.append((claves, estados))
+        self._filas_pendientes += len(claves)
+        if self._filas_pendientes >= max(len(self.claves), MIN_PENDIENTE):
+            self.compactar()
+
+    def compactar(self) -> None:
+        """Fusiona lo encolado con lo consolidado (lo consolidado va primero: first)."""
+        if not self._pendientes:
+            return
+        partes = ([(self.claves, self.estados)] if len(self.claves) else []) + self._pendientes
+        claves = np.concatenate([c for c, _ in partes])
+        estados = {k: np.concatenate([e[k] for _, e in partes]) for k in partes[0][1]}
+        self.claves, self.estados = _reducir(claves, estados, self.ops)
+        self._pendientes, self._filas_pendientes = [], 0
+
+    def combinar(self, otro: "AcumuladorGrupos") -> None:
+        """Suma los grupos de otro acumulador con las mismas agregaciones."""
+        if otro.agregaciones != self.agregaciones:
+            raise ValueError("Los acumuladores no tienen las mismas agregaciones")
+        otro.compactar()
+        if len(otro.claves) == 0:
+            return
+        self.ops.update(otro.ops)
+        for nombre, tipo in otro.tipos.items():
+            self.tipos.setdefault(nombre, tipo)
+        self._encolar(otro.claves, otro.estados)
+
+    def __len__(self) -> int:
+        self.compactar()
+        return len(self.claves)
+
+    # ── Resultado ─────────────────────────────────────────────────────────────
+    def resultado(self) -> tuple[np.ndarray, dict]:
+        """(claves ordenadas, {nombre: array}) con las agregaciones finales."""
+        self.compactar()
+        valores = {}
+        for nombre, (_, op) in self.agregaciones.items():
+            tipo = self.tipos.get(nombre)
+            flotante = tipo is not None and pd.api.types.is_float_dtype(tipo)
+            if op == "count":
+                valores[nombre] = self.estados[f"{nombre}:n"]
+            elif op == "sum":
+                valores[nombre] = self.estados[f"{nombre}:s"]
+            elif op == "mean":
+                n = self.estados[f"{nombre}:n"]
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    media = np.where(n > 0, self.estados[f"{nombre}:s"] / n, np.nan)
+                # Como pandas: media de floats conserva su precisión, de enteros es float64
+                valores[nombre] = media.astype(tipo) if flotante else media
+            elif op in ("min", "max"):
+                v = self.estados[f"{nombre}:{op}"]
+                enteros = tipo is not None and pd.api.types.is_integer_dtype(tipo) and not np.isnan(v).any()
+                valores[nombre] = v.astype(tipo) if (flotante or enteros) else v
+            else:
+                valores[nombre] = self.estados[f"{nombre}:f"]
+        return self.claves, valores
+
+
+def tabla_zona_ventana(
+    acumulador: AcumuladorGrupos, frecuencia, nombre_zona: str, nombre_ventana: str,
+    tipo_zona=np.int64, unidad: str = "datetime64[us]",
+) -> pd.DataFrame:
+    """Resultado de un acumulador con claves zona × ventana como DataFrame ordenado por zona y ventana."""
+    claves, valores = acumulador.resultado()
+    zonas, ventanas = separar_clave(claves, frecuencia, unidad)
+    return pd.DataFrame({nombre_zona: zonas.astype(tipo_zona), nombre_ventana: ventanas, **valores})
@@ -7,6 +7,7 @@ import numpy as np
 
 # Importación de configuraciones externas
 from src.processing.columnas import COLUMNAS_YELLOW, COLUMNAS_FHVHV
+from src.processing.escritura import escribir_parquet
 
 # Definición de columnas troncales
 COMMON_COLS = ["fecha_inicio", "fecha_fin", "origen_id", "destino_id", "distancia", "propina", "tipo_pago"]
@@ -241,7 +242,7 @@ def clean_file(in_path: Path, out_path: Path, service: str, overwrite: bool = Fa
         # Pasamos el mes detectado a la limpieza
         df_clean = clean_df(df, service=service, month_filter=mes_a_filtrar)
         
-        df_clean.to_parquet(out_path, index=False)
+        escribir_parquet(df_clean, out_path)
         return f"OK   {out_path.name} ({len(df_clean):,} registros procesados)"
     except Exception as e:
         return f"ERROR en {out_path.name}: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Codificación de ids de zona con la tabla de un LabelEncoder ya ajustado.
+
+Los scripts de P1/P2 codificaban las zonas con
+
+    df['origen_id'].apply(lambda z: le.transform([z])[0] if z in le.classes_ else -1)
+
+es decir, una llamada a sklearn por fila (millones) y una búsqueda lineal
+en classes_ para cada una. Los ids de zona son enteros pequeños (1..265),
+así que basta una tabla densa id → código construida una vez a partir de
+las clases del encoder guardado, y codificar es un take de numpy:
+
+    le = joblib.load(MODELS_DIR / 'zona_encoder.pkl')
+    codificador = CodificadorZonas.desde_encoder(le)
+    df['zona_enc'] = codificador.transformar(df['origen_id'])
+
+Los códigos son los mismos que los de le.transform. Una zona que el encoder
+no ha visto (o un id nulo, negativo o no entero) recibe el código
+`desconocida`: ZONA_DESCONOCIDA (-1) en entrenamiento, que luego se filtra;
+en el despliegue se usa el código de la primera clase.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+# Código para zonas que el encoder no ha visto
+ZONA_DESCONOCIDA = -1
+
+
+class CodificadorZonas:
+    """Tabla densa id de zona → código del LabelEncoder, con código explícito para desconocidas."""
+
+    def __init__(self, clases, desconocida: int = ZONA_DESCONOCIDA):
+        clases = np.asarray(clases)
+        enteras = clases.astype(np.int64)
+        if len(clases) == 0 or (enteras != clases).any() or enteras.min() < 0:
+            raise ValueError("Las clases deben ser ids de zona enteros no negativos")
+        self.clases = enteras
+        self.desconocida = int(desconocida)
+        self.tabla = np.full(int(enteras.max()) + 1, self.desconocida, dtype=np.int64)
+        # classes_ de LabelEncoder está ordenado: el código es la posición
+        self.tabla[enteras] = np.arange(len(enteras))
+
+    @classmethod
+    def desde_encoder(cls, encoder, desconocida: int = ZONA_DESCONOCIDA) -> "CodificadorZonas":
+        return cls(encoder.classes_, desconocida)
+
+    def __len__(self) -> int:
+        return len(self.clases)
+
+    def transformar(self, ids) -> np.ndarray:
+        """Códigos (int64) de un array o Serie de ids de zona."""
+        if isinstance(ids, pd.Series):
+            ids = ids.to_numpy(dtype=np.float64, na_value=np.nan) if ids.hasnans else ids.to_numpy()
+        ids = np.asarray(ids)
+        if ids.dtype.kind in "iu":
+            validos = (ids >= 0) & (ids < len(self.tabla))
+        else:
+            ids = ids.astype(np.float64)
+            with np.errstate(invalid="ignore"):
+                validos = (ids >= 0) & (ids < len(self.tabla)) & (ids == np.floor(ids))
+        codigos = np.full(ids.shape, self.desconocida, dtype=np.int64)
+        codigos[validos] = self.tabla[ids[validos].astype(np.int64)]
+        return codigos
+
+    def transformar_uno(self, valor) -> int:
+        """Código de un solo id (el formulario de la web)."""
+        return int(self.transformar(np.array([float(valor)]))[0])
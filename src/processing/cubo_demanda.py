@@ -0,0 +1,589 @@
+"""Cubo denso de demanda zona × tiempo (ventanas de 10 min) en memory-map.
+
+La demanda agregada solo existía como filas dispersas (origen_id,
+timestamp_hora): las horas sin viajes no aparecen, así que un
+groupby().shift(k) es "k filas observadas antes", no "k horas antes".
+
+Aquí cada capa es una matriz densa [zona, ventana] guardada como .npy y
+abierta con np.load(mmap_mode='r'). La fila es el id de zona (índice
+directo, sin diccionarios) y la columna la ventana desde t0 (medianoche
+del primer día). Capas:
+  - viajes:   salidas por origen_id / fecha_inicio (la demanda de P1)
+  - llegadas: llegadas por destino_id / fecha_fin (la oferta inferida de P2)
+  - espera_min_n / _suma / _suma2: estadísticos suficientes de la espera
+    (media y desviación exactas a cualquier resolución)
+
+Los agregados a 1 h y 1 día se guardan al construir. Las ventanas y los
+lags son slices de la matriz, vistas sin copia:
+
+    cubo = CuboDemanda.abrir()
+    horas = cubo.capa('viajes', '1h')                  # [zona, hora]
+    ult = cubo.ventana('viajes', '2025-03-01', '2025-03-02', '1h', zona=161)
+    lag3 = cubo.lag('viajes', 3, '1h')                 # lag3[:, j] = 3 h antes de horas[:, 3 + j]
+
+Construcción en un pase de datos_final (también desde el escaneo
+compartido: python -m src.pipelines.escaneo_compartido --solo cubo):
+    python -m src.processing.cubo_demanda
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.pipelines.manifest import Manifest, hash_codigo
+from src.processing.escaneo import Consumidor, EscaneoCompartido
+from src.processing.lectura import resumen_footer
+
+ENTRADA = Path("data/processed/tlc_clean/datos_final.parquet")
+CUBO_DIR = Path("data/processed/tlc_clean/cubo_demanda")
+FRECUENCIA_BASE = "10min"
+ROLLUPS = ("1h", "1D")
+# Lags y ventanas de rolling (en horas) de las features de demanda de P1
+LAGS_HORAS = (1, 2, 3, 6, 12, 24)
+VENTANAS_HORAS = (3, 24)
+
+# Conteos: capa -> (columna de zona, columna de tiempo)
+CONTEOS = {
+    "viajes":   ("origen_id", "fecha_inicio"),
+    "llegadas": ("destino_id", "fecha_fin"),
+}
+# Estadísticos suficientes (n, suma, suma de cuadrados) por zona de origen
+ESTADISTICOS = {
+    "espera_min": ("origen_id", "fecha_inicio"),
+}
+
+ARTEFACTO = "cubo_demanda"
+CODIGO = hash_codigo(__file__)
+PARAMS = {"frecuencia": FRECUENCIA_BASE, "conteos": list(CONTEOS), "estadisticos": list(ESTADISTICOS)}
+
+
+def _segundos(frecuencia) -> int:
+    return int(pd.Timedelta(frecuencia).total_seconds())
+
+
+def _datetime64(t) -> np.ndarray:
+    return np.asarray(pd.to_datetime(t), dtype="datetime64[s]")
+
+
+def capas_estadistico(variable: str) -> list[str]:
+    return [f"{variable}_n", f"{variable}_suma", f"{variable}_suma2"]
+
+
+def salidas(directorio=CUBO_DIR) -> list[Path]:
+    directorio = Path(directorio)
+    nombres = list(CONTEOS) + [c for v in ESTADISTICOS for c in capas_estadistico(v)]
+    return [directorio / "meta.json"] + [directorio / f"{n}_{FRECUENCIA_BASE}.npy" for n in nombres]
+
+
+class CuboDemanda:
+    """
+    Capas densas [zona, ventana] a una frecuencia base, con t0 en medianoche
+    y un número entero de días. Los agregados a frecuencias múltiplo de la
+    base se leen del disco si existen o se calculan (y se guardan en memoria).
+    """
+
+    def __init__(self, capas: dict, t0, frecuencia: str = FRECUENCIA_BASE, directorio=None, rango=None):
+        self.capas = dict(capas)
+        self.t0 = np.datetime64(pd.Timestamp(t0), "s")
+        self.frecuencia = frecuencia
+        self.directorio = Path(directorio) if directorio is not None else None
+        # Primer y último instante con datos: fuera de ahí las celdas a 0 no son "cero viajes"
+        self.rango = None if rango is None else tuple(pd.Timestamp(t) for t in rango)
+        self._rollups: dict[tuple[str, int], np.ndarray] = {}
+        forma = {c.shape for c in self.capas.values()}
+        if len(forma) != 1:
+            raise ValueError(f"Las capas del cubo no tienen la misma forma: {forma}")
+        self.n_zonas, self.n_ventanas = forma.pop()
+
+    # ── Construcción / apertura ───────────────────────────────────────────────
+    @classmethod
+    def abrir(cls, directorio=CUBO_DIR) -> "CuboDemanda":
+        """Abre un cubo guardado; las capas quedan en memory-map de solo lectura."""
+        directorio = Path(directorio)
+        with open(directorio / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        capas = {
+            nombre: np.load(directorio / f"{nombre}_{meta['frecuencia']}.npy", mmap_mode="r")
+            for nombre in meta["capas"]
+        }
+        return cls(capas, meta["t0"], meta["frecuencia"], directorio, (meta["t_min"], meta["t_max"]))
+
+    @classmethod
+    def desde_tabla(
+        cls, df: pd.DataFrame, zona: str, tiempo: str, capas: dict, frecuencia: str = "1h"
+    ) -> "CuboDemanda":
+        """
+        Cubo en memoria desde una tabla ya agregada (p. ej. los splits zona×hora
+        de P1). capas: {nombre_capa: columna}; las celdas sin fila quedan a 0.
+        """
+        t = _datetime64(df[tiempo])
+        t0 = t.min().astype("datetime64[D]")
+        dias = int((t.max().astype("datetime64[D]") - t0).astype(int)) + 1
+        por_dia = _segundos("1D") // _segundos(frecuencia)
+        fila = df[zona].to_numpy(dtype=np.int64)
+        columna = (t - t0.astype("datetime64[s]")).astype(np.int64) // _segundos(frecuencia)
+        matrices = {}
+        for nombre, col in capas.items():
+            valores = df[col].to_numpy()
+            m = np.zeros((int(fila.max()) + 1, dias * por_dia), dtype=valores.dtype)
+            m[fila, columna] = valores
+            matrices[nombre] = m
+        return cls(matrices, t0, frecuencia, rango=(t.min(), t.max()))
+
+    # ── Ejes ──────────────────────────────────────────────────────────────────
+    def factor(self, frecuencia=None) -> int:
+        """Ventanas base que forman una ventana de `frecuencia`."""
+        if frecuencia is None:
+            return 1
+        paso, base = _segundos(frecuencia), _segundos(self.frecuencia)
+        if paso % base or (self.n_ventanas * base) % paso:
+            raise ValueError(f"{frecuencia} no es múltiplo de la frecuencia del cubo ({self.frecuencia})")
+        return paso // base
+
+    def tiempos(self, frecuencia=None) -> np.ndarray:
+        """Inicio de cada ventana (datetime64[s]) a la resolución pedida."""
+        paso = _segundos(frecuencia or self.frecuencia)
+        n = self.n_ventanas // self.factor(frecuencia)
+        return self.t0 + np.arange(n, dtype=np.int64) * np.timedelta64(paso, "s")
+
+    def indice_tiempo(self, t, frecuencia=None) -> np.ndarray:
+        """Columna de la ventana que contiene t (floor). Puede quedar fuera de [0, n)."""
+        paso = _segundos(frecuencia or self.frecuencia)
+        return (_datetime64(t) - self.t0).astype(np.int64) // paso
+
+    def columnas_datos(self, frecuencia=None) -> tuple[int, int]:
+        """Primera y última columna (inclusive) con datos a la resolución pedida."""
+        if self.rango is None:
+            return 0, self.n_ventanas // self.factor(frecuencia) - 1
+        i0, i1 = self.indice_tiempo(list(self.rango), frecuencia)
+        return int(i0), int(i1)
+
+    def cubre(self, inicio, fin) -> bool:
+        """True si [inicio, fin] cae dentro del rango con datos del cubo."""
+        lo, hi = self.columnas_datos()
+        i0, i1 = self.indice_tiempo([inicio, fin])
+        return lo <= i0 and i1 <= hi
+
+    # ── Capas y agregados ─────────────────────────────────────────────────────
+    def capa(self, nombre: str, frecuencia=None) -> np.ndarray:
+        """Matriz [zona, ventana] de la capa a la frecuencia pedida (vista sin copia si existe)."""
+        f = self.factor(frecuencia)
+        if f == 1:
+            return self.capas[nombre]
+        clave = (nombre, f)
+        if clave not in self._rollups:
+            ruta = self.directorio / f"{nombre}_{frecuencia}.npy" if self.directorio else None
+            if ruta is not None and ruta.exists():
+                self._rollups[clave] = np.load(ruta, mmap_mode="r")
+            else:
+                base = self.capas[nombre]
+                self._rollups[clave] = base.reshape(self.n_zonas, -1, f).sum(axis=2, dtype=base.dtype)
+        return self._rollups[clave]
+
+    def media(self, variable: str, frecuencia=None) -> np.ndarray:
+        """Media exacta de una variable con estadísticos (NaN donde no hay viajes)."""
+        n, suma, _ = (self.capa(c, frecuencia) for c in capas_estadistico(variable))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(n > 0, suma / n, np.nan)
+
+    def desviacion(self, variable: str, frecuencia=None) -> np.ndarray:
+        """Desviación típica muestral (ddof=1, como pandas); NaN con menos de dos viajes."""
+        n, suma, suma2 = (self.capa(c, frecuencia) for c in capas_estadistico(variable))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (suma2 - suma * suma / n) / (n - 1)
+        return np.where(n > 1, np.sqrt(np.maximum(var, 0.0)), np.nan)
+
+    # ── Accesos por tiempo (vistas) ───────────────────────────────────────────
+    def _rango(self, inicio, fin, frecuencia, desplazamiento: int = 0) -> slice:
+        n = self.n_ventanas // self.factor(frecuencia)
+        i0 = 0 if inicio is None else int(self.indice_tiempo(inicio, frecuencia))
+        i1 = n if fin is None else int(self.indice_tiempo(fin, frecuencia))
+        i0, i1 = i0 - desplazamiento, i1 - desplazamiento
+        if i0 < 0 or i1 > n or i0 > i1:
+            raise ValueError(
+                f"Ventana fuera del cubo ({self.tiempos(frecuencia)[0]} → {n} ventanas de {frecuencia or self.frecuencia})"
+            )
+        return slice(i0, i1)
+
+    def ventana(self, nombre: str, inicio=None, fin=None, frecuencia=None, zona=None) -> np.ndarray:
+        """Capa entre [inicio, fin) para todas las zonas o para una (vista sin copia)."""
+        m = self.capa(nombre, frecuencia)
+        rango = self._rango(inicio, fin, frecuencia)
+        return m[:, rango] if zona is None else m[int(zona), rango]
+
+    def lag(self, nombre: str, k: int, frecuencia=None, inicio=None, fin=None, zona=None) -> np.ndarray:
+        """
+        La ventana [inicio, fin) desplazada k pasos atrás: su columna j es el
+        valor k ventanas antes que la columna j de ventana(inicio, fin). Sin
+        inicio empieza en la primera ventana que tiene lag. Vista sin copia.
+        """
+        m = self.capa(nombre, frecuencia)
+        if inicio is None:
+            inicio = self.tiempos(frecuencia)[k]
+        rango = self._rango(inicio, fin, frecuencia, desplazamiento=k)
+        return m[:, rango] if zona is None else m[int(zona), rango]
+
+    def valores(self, nombre: str, zonas, tiempos, frecuencia=None, lag: int = 0) -> np.ndarray:
+        """Valor de la capa en cada par (zona, t - lag ventanas); NaN fuera del cubo."""
+        m = self.capa(nombre, frecuencia)
+        fila = np.asarray(zonas, dtype=np.int64)
+        columna = self.indice_tiempo(tiempos, frecuencia) - lag
+        dentro = (columna >= 0) & (columna < m.shape[1]) & (fila >= 0) & (fila < m.shape[0])
+        out = np.full(len(fila), np.nan)
+        out[dentro] = m[fila[dentro], columna[dentro]]
+        return out
+
+    def perfil_semanal(self, nombre: str, frecuencia: str = "1h", hasta=None) -> np.ndarray:
+        """
+        Media por [zona, día de la semana, ventana del día] (lunes = 0) con
+        las semanas anteriores a `hasta`. Sirve de "lag" cuando el instante
+        pedido cae fuera del cubo (p. ej. en el despliegue).
+        """
+        m = self.capa(nombre, frecuencia)
+        por_dia = _segundos("1D") // _segundos(frecuencia)
+        dias = m.shape[1] // por_dia
+        if hasta is not None:
+            dias = min(dias, max(int(self.indice_tiempo(hasta, "1D")), 0))
+        m = np.asarray(m[:, : dias * por_dia], dtype=np.float64).reshape(self.n_zonas, dias, por_dia)
+        dow = (pd.Timestamp(self.t0).dayofweek + np.arange(dias)) % 7
+        perfil = np.full((self.n_zonas, 7, por_dia), np.nan)
+        for d in range(7):
+            if (dow == d).any():
+                perfil[:, d] = m[:, dow == d].mean(axis=1)
+        return perfil
+
+
+def rezagos_y_ventanas(matriz: np.ndarray, filas, columnas, lags, ventanas, validas=None) -> dict[str, np.ndarray]:
+    """
+    Features de demanda de P1 sobre una matriz densa [zona, hora]: para cada
+    (fila, columna) el valor actual, el de la hora siguiente (target), sus
+    lags y media/std de las `w` horas anteriores (min_periods=1, como el
+    rolling de pandas: sin horas anteriores media y std son NaN, con una sola
+    la std es 0). Fuera de las columnas `validas` (primera, última) no hay
+    dato: NaN.
+
+    Diferencia con el features.py original: allí la std pasaba por
+    fillna(0) y valía 0 también sin horas anteriores (la primera hora de
+    cada zona). Aquí es NaN, como la media, y quien la use decide: P1 tira
+    esas filas (lag_1h también es NaN) y features_p1 / el despliegue usan
+    el proxy oferta*0.1 en vez de 0. paridad_rezagos lo cuenta aparte.
+
+    Todo con índices y sumas acumuladas por zona, sin bucles por zona: la
+    suma de las horas [a, b) es S[b] - S[a]. Con conteos enteros las sumas
+    son exactas en float64 (ver paridad_rezagos).
+    """
+    filas = np.asarray(filas, dtype=np.int64)
+    columnas = np.asarray(columnas, dtype=np.int64)
+    n_zonas, n_col = matriz.shape
+    lo, hi = validas if validas is not None else (0, n_col - 1)
+    zona_ok = (filas >= 0) & (filas < n_zonas)
+
+    # Copia float con NaN fuera del rango con datos, márgenes de NaN a los
+    # lados y una fila NaN para zonas desconocidas: cada feature es un take
+    # con índice plano, sin máscaras
+    margen = max(lags, default=0) + 3
+    ancho = n_col + 2 * margen
+    x = np.full((n_zonas + 1, ancho), np.nan)
+    x[:n_zonas, margen + lo:margen + hi + 1] = matriz[:, lo:hi + 1]
+    # Más allá de estos límites todas las posiciones que se leen son NaN
+    plano = (
+        np.where(zona_ok, filas, n_zonas) * ancho
+        + np.clip(columnas, -2, n_col + margen - 2) + margen
+    )
+
+    def tomar(k):
+        """Valor k columnas antes (k < 0: después) de cada fila."""
+        return x.take(plano - k)
+
+    features = {"demanda": tomar(0), "target": tomar(-1)}
+    for k in lags:
+        features[f"lag_{k}h"] = tomar(k)
+    x = x[:n_zonas, margen:margen + n_col]
+    fila_seg = np.where(zona_ok, filas, 0)
+
+    acum = np.zeros((n_zonas, n_col + 1))
+    acum2 = np.zeros_like(acum)
+    np.cumsum(np.nan_to_num(x, nan=0.0), axis=1, out=acum[:, 1:])
+    np.cumsum(np.nan_to_num(x * x, nan=0.0), axis=1, out=acum2[:, 1:])
+    del x
+    plano_acum = fila_seg * (n_col + 1)
+
+    # Horas anteriores a la fila: [c - w, c) recortado al rango con datos
+    fin = np.clip(columnas, lo, hi + 1)
+    for w in ventanas:
+        inicio = np.clip(columnas - w, lo, hi + 1)
+        n = np.where(zona_ok, np.maximum(fin - inicio, 0), 0)
+        suma = acum.take(plano_acum + fin) - acum.take(plano_acum + inicio)
+        suma2 = acum2.take(plano_acum + fin) - acum2.take(plano_acum + inicio)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            media = np.where(n > 0, suma / n, np.nan)
+            # n·Σx² - (Σx)² es exacto con enteros: sin restos negativos ni std ≠ 0 en horas iguales
+            var = np.where(n > 1, (n * suma2 - suma * suma) / (n * (n - 1.0)), np.where(n == 1, 0.0, np.nan))
+        features[f"roll_mean_{w}h"] = media
+        features[f"roll_std_{w}h"] = np.sqrt(np.maximum(var, 0.0))
+    return features
+
+
+def demanda_reciente(matriz: np.ndarray, filas, columnas, validas=None) -> dict[str, np.ndarray]:
+    """
+    Lags y rolling de demanda con los que se alimenta el RF de P1 desde P2
+    (features.py y reentrenar_mlp) y desde el despliegue, para instantes que
+    caen en la hora `columnas` de la matriz [zona, hora]. Se leen desde la
+    última hora completa (columnas - 1): 'demanda' es la de la hora anterior
+    y el RF predice la de la hora en curso sin verla. Devuelve demanda,
+    lag_kh y roll_mean/std_wh (NaN donde no hay dato); media_hist no sale de
+    aquí, en los tres sitios es el proxy tasa_historica · oferta media.
+    """
+    columnas = np.asarray(columnas, dtype=np.int64) - 1
+    features = rezagos_y_ventanas(matriz, filas, columnas, LAGS_HORAS, VENTANAS_HORAS, validas)
+    del features["target"]
+    return features
+
+
+def demanda_reciente_cubo(cubo: "CuboDemanda", zonas, tiempos) -> dict[str, np.ndarray]:
+    """demanda_reciente de cada (zona, instante) con la capa horaria de viajes del cubo."""
+    return demanda_reciente(
+        cubo.capa("viajes", "1h"), zonas, cubo.indice_tiempo(tiempos, "1h"), cubo.columnas_datos("1h"),
+    )
+
+
+def demanda_reciente_perfil(perfil: np.ndarray, zona: int, dia_semana: int, hora: int) -> dict[str, float]:
+    """
+    demanda_reciente de una zona en el despliegue, donde el instante pedido
+    cae fuera del cubo: la serie de la zona es su perfil semanal
+    (CuboDemanda.perfil_semanal, [zona, día, hora]) repetido dos semanas, y
+    se lee igual que el cubo en entrenamiento.
+    """
+    semana = np.asarray(perfil[int(zona)], dtype=np.float64).reshape(1, -1)
+    columna = semana.shape[1] + int(dia_semana) * perfil.shape[2] + int(hora)
+    recientes = demanda_reciente(np.tile(semana, (1, 2)), [0], [columna])
+    return {col: float(valores[0]) for col, valores in recientes.items()}
+
+
+def rezagos_y_ventanas_pandas(matriz: np.ndarray, filas, columnas, lags, ventanas, validas=None) -> dict[str, np.ndarray]:
+    """
+    Referencia lenta con el código original de features.py (groupby + shift
+    + rolling con lambda por zona) sobre la rejilla densa zona×hora. Solo
+    para comprobar la paridad de rezagos_y_ventanas.
+    """
+    filas = np.asarray(filas, dtype=np.int64)
+    columnas = np.asarray(columnas, dtype=np.int64)
+    lo, hi = validas if validas is not None else (0, matriz.shape[1] - 1)
+    zonas = np.unique(filas)
+    largo = hi - lo + 1
+
+    denso = pd.DataFrame({
+        "zona": np.repeat(zonas, largo),
+        "columna": np.tile(np.arange(lo, hi + 1), len(zonas)),
+    })
+    denso["demanda"] = np.asarray(matriz)[denso["zona"], denso["columna"]].astype(np.float64)
+    g = denso.groupby("zona")["demanda"]
+    denso["target"] = g.shift(-1)
+    for k in lags:
+        denso[f"lag_{k}h"] = g.shift(k)
+    for w in ventanas:
+        denso[f"roll_mean_{w}h"] = g.transform(lambda x: x.shift(1).rolling(w, min_periods=1).mean())
+        denso[f"roll_std_{w}h"] = g.transform(lambda x: x.shift(1).rolling(w, min_periods=1).std().fillna(0))
+
+    dentro = (columnas >= lo) & (columnas <= hi)
+    posicion = np.searchsorted(zonas, filas) * largo + (columnas - lo)
+    features = {}
+    for col in denso.columns.drop(["zona", "columna"]):
+        out = np.full(len(filas), np.nan)
+        out[dentro] = denso[col].to_numpy()[posicion[dentro]]
+        features[col] = out
+    return features
+
+
+def paridad_rezagos(matriz: np.ndarray, filas, columnas, lags, ventanas, validas=None, tolerancia=1e-6) -> dict:
+    """
+    Compara rezagos_y_ventanas con la referencia de pandas en las filas
+    dentro de `validas`. Devuelve por feature la diferencia máxima y las
+    filas con NaN distinto, y los tiempos. La tolerancia es por el rolling
+    std de pandas, que acumula error (~1e-7 en ventanas de valores iguales,
+    donde el vectorizado da 0 exacto).
+
+    La única diferencia buscada es roll_std sin horas anteriores (NaN aquí,
+    0 en el original): esas filas, las que tienen roll_mean NaN en la
+    referencia, se cuentan en "nan_sin_previas" y no en "nan_distinto".
+    """
+    t0 = time.perf_counter()
+    rapido = rezagos_y_ventanas(matriz, filas, columnas, lags, ventanas, validas)
+    t_rapido = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    referencia = rezagos_y_ventanas_pandas(matriz, filas, columnas, lags, ventanas, validas)
+    t_referencia = time.perf_counter() - t0
+
+    columnas = np.asarray(columnas, dtype=np.int64)
+    lo, hi = validas if validas is not None else (0, np.shape(matriz)[1] - 1)
+    dentro = (columnas >= lo) & (columnas <= hi)
+    diferencias = {}
+    for col, ref in referencia.items():
+        a, ref = rapido[col][dentro], ref[dentro]
+        distinto = np.isnan(a) != np.isnan(ref)
+        sin_previas = np.zeros_like(distinto)
+        if col.startswith("roll_std_"):
+            media_ref = referencia[col.replace("roll_std_", "roll_mean_")][dentro]
+            sin_previas = distinto & np.isnan(a) & (ref == 0) & np.isnan(media_ref)
+        ambos = ~np.isnan(a) & ~np.isnan(ref)
+        maxima = float(np.abs(a[ambos] - ref[ambos]).max()) if ambos.any() else 0.0
+        diferencias[col] = {
+            "max_abs": maxima,
+            "nan_distinto": int((distinto & ~sin_previas).sum()),
+            "nan_sin_previas": int(sin_previas.sum()),
+        }
+    return {
+        "ok": all(d["max_abs"] <= tolerancia and d["nan_distinto"] == 0 for d in diferencias.values()),
+        "diferencias": diferencias,
+        "segundos": {"vectorizado": round(t_rapido, 3), "pandas": round(t_referencia, 3)},
+    }
+
+
+class ConstructorCubo(Consumidor):
+    """Rellena las capas del cubo (memmaps en disco) row group a row group."""
+
+    def __init__(self, ruta=ENTRADA, directorio=CUBO_DIR):
+        self.directorio = Path(directorio)
+        self.tmp = self.directorio.with_name(self.directorio.name + ".tmp")
+        self.columnas = list(dict.fromkeys(
+            [c for par in CONTEOS.values() for c in par]
+            + [c for v, par in ESTADISTICOS.items() for c in (*par, v)]
+        ))
+
+        # Dimensiones del footer: días completos del rango de fecha_inicio y
+        # filas hasta el mayor id de zona (índice directo)
+        footer = resumen_footer(ruta)
+        if footer["min"] is None:
+            raise ValueError(f"{ruta} no tiene valores de fecha_inicio")
+        t0 = footer["min"].floor("D")
+        dias = (footer["max"].floor("D") - t0).days + 1
+        zona_max = max(
+            int(resumen_footer(ruta, col)["max"] or 0) for col in {z for z, _ in CONTEOS.values()}
+        )
+        self.t0 = np.datetime64(t0, "s")
+        self.forma = (zona_max + 1, dias * (_segundos("1D") // _segundos(FRECUENCIA_BASE)))
+        self.fuera = 0
+
+        if self.tmp.exists():
+            shutil.rmtree(self.tmp)
+        self.tmp.mkdir(parents=True)
+        self.capas = {}
+        for nombre in CONTEOS:
+            self.capas[nombre] = self._crear(nombre, np.int32)
+        for variable in ESTADISTICOS:
+            n, suma, suma2 = capas_estadistico(variable)
+            self.capas[n] = self._crear(n, np.int32)
+            self.capas[suma] = self._crear(suma, np.float64)
+            self.capas[suma2] = self._crear(suma2, np.float64)
+
+    def _crear(self, nombre, dtype):
+        ruta = self.tmp / f"{nombre}_{FRECUENCIA_BASE}.npy"
+        # open_memmap deja el .npy inicializado a ceros sin ocupar RAM
+        return np.lib.format.open_memmap(ruta, mode="w+", dtype=dtype, shape=self.forma)
+
+    def _posiciones(self, df, col_zona, col_tiempo, mascara=None):
+        """Fila y columna de cada viaje válido (y la máscara usada)."""
+        valido = df[col_zona].notna().to_numpy() & df[col_tiempo].notna().to_numpy()
+        if mascara is not None:
+            valido &= mascara
+        fila = df[col_zona].to_numpy(dtype=np.float64, na_value=-1).astype(np.int64)
+        t = np.asarray(df[col_tiempo], dtype="datetime64[s]")
+        columna = (t - self.t0).astype(np.int64) // _segundos(FRECUENCIA_BASE)
+        valido &= (fila >= 0) & (fila < self.forma[0]) & (columna >= 0) & (columna < self.forma[1])
+        return fila, columna, valido
+
+    def _sumar(self, destino, fila, columna, pesos=None):
+        """Suma en el bloque de columnas que toca el chunk (estrecho si viene ordenado)."""
+        if len(fila) == 0:
+            return
+        c0, c1 = int(columna.min()), int(columna.max()) + 1
+        ancho = c1 - c0
+        bloque = np.bincount(fila * ancho + (columna - c0), weights=pesos, minlength=self.forma[0] * ancho)
+        destino[:, c0:c1] += bloque.reshape(self.forma[0], ancho).astype(destino.dtype, copy=False)
+
+    def procesar(self, df):
+        for nombre, (col_zona, col_tiempo) in CONTEOS.items():
+            if col_zona not in df.columns or col_tiempo not in df.columns:
+                continue
+            fila, columna, valido = self._posiciones(df, col_zona, col_tiempo)
+            self.fuera += int((~valido).sum())
+            self._sumar(self.capas[nombre], fila[valido], columna[valido])
+
+        for variable, (col_zona, col_tiempo) in ESTADISTICOS.items():
+            if not {variable, col_zona, col_tiempo}.issubset(df.columns):
+                continue
+            valores = df[variable].to_numpy(dtype=np.float64, na_value=np.nan)
+            fila, columna, valido = self._posiciones(df, col_zona, col_tiempo, ~np.isnan(valores))
+            fila, columna, valores = fila[valido], columna[valido], valores[valido]
+            n, suma, suma2 = capas_estadistico(variable)
+            self._sumar(self.capas[n], fila, columna)
+            self._sumar(self.capas[suma], fila, columna, valores)
+            self._sumar(self.capas[suma2], fila, columna, valores * valores)
+
+    def finalizar(self, info):
+        for capa in self.capas.values():
+            capa.flush()
+        cubo = CuboDemanda(self.capas, self.t0, FRECUENCIA_BASE, rango=(info["t_min"], info["t_max"]))
+        for frecuencia in ROLLUPS:
+            for nombre in self.capas:
+                np.save(self.tmp / f"{nombre}_{frecuencia}.npy", cubo.capa(nombre, frecuencia))
+        self.capas = None
+        del cubo
+
+        meta = {
+            "t0": str(pd.Timestamp(self.t0)),
+            "t_min": str(info["t_min"]),
+            "t_max": str(info["t_max"]),
+            "frecuencia": FRECUENCIA_BASE,
+            "rollups": list(ROLLUPS),
+            "zonas": self.forma[0],
+            "ventanas": self.forma[1],
+            "capas": list(CONTEOS) + [c for v in ESTADISTICOS for c in capas_estadistico(v)],
+            "filas_fuente": info["filas"],
+            "fuera_de_rango": self.fuera,
+        }
+        with open(self.tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+
+        if self.directorio.exists():
+            shutil.rmtree(self.directorio)
+        self.tmp.rename(self.directorio)
+
+        mb = sum(p.stat().st_size for p in self.directorio.glob("*.npy")) / 1024**2
+        print(
+            f"   Cubo {self.forma[0]} zonas × {self.forma[1]:,} ventanas de {FRECUENCIA_BASE} "
+            f"desde {meta['t0']} ({mb:,.0f} MB en {self.directorio}, {self.fuera:,} fuera de rango)"
+        )
+        return CuboDemanda.abrir(self.directorio)
+
+
+def construir_cubo(ruta=ENTRADA, directorio=CUBO_DIR) -> CuboDemanda:
+    """Un pase de datos_final para construir el cubo."""
+    escaneo = EscaneoCompartido(ruta).registrar("cubo", ConstructorCubo(ruta, directorio))
+    return escaneo.ejecutar()["cubo"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser("Cubo denso de demanda zona × 10 min")
+    parser.add_argument("--entrada", type=Path, default=ENTRADA)
+    parser.add_argument("--salida", type=Path, default=CUBO_DIR)
+    args = parser.parse_args()
+
+    manifest = Manifest()
+    entradas, sal = [args.entrada], salidas(args.salida)
+    if manifest.esta_actualizado(ARTEFACTO, sal, entradas, CODIGO, PARAMS):
+        print(f" SKIP: {args.salida} al día con {args.entrada}")
+        return
+    construir_cubo(args.entrada, args.salida)
+    manifest.registrar(ARTEFACTO, sal, entradas, CODIGO, PARAMS)
+
+
+if __name__ == "__main__":
+    main()
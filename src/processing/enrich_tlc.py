@@ -2,9 +2,126 @@
 información externa (clima, barrios, festivos) para dar más
 valor"""
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.processing.escritura import escribir_parquet
+
+
+# Todas las claves de los joins (LocationID, hora, día) son enteros de dominio
+# pequeño, así que en vez de DataFrame.merge usamos arrays indexados con take.
+
+def _indices_lookup(claves: np.ndarray, tamano: int) -> np.ndarray:
+    """Devuelve las claves como posiciones válidas del array de lookup (-1 si caen fuera)."""
+    claves = np.asarray(claves, dtype=np.int64)
+    fuera = (claves < 0) | (claves >= tamano)
+    return np.where(fuera, -1, claves)
+
+
+def _take_con_nulo(valores: np.ndarray, indices: np.ndarray, nulo):
+    """np.take que devuelve `nulo` donde el índice es -1."""
+    if len(valores) == 0:
+        return np.full(len(indices), nulo)
+    out = np.take(valores, np.clip(indices, 0, None), mode="clip")
+    if (indices < 0).any():
+        out = out.copy()
+        out[indices < 0] = nulo
+    return out
+
+
+def _horas_epoch(fechas: pd.Series) -> np.ndarray:
+    """Horas enteras desde epoch (equivale a floor('h')) sin crear columnas temporales."""
+    fechas = pd.to_datetime(fechas)
+    if fechas.dt.tz is not None:
+        fechas = fechas.dt.tz_localize(None)
+    return fechas.to_numpy().astype("datetime64[h]").astype(np.int64)
+
+
+def _dias_epoch(fechas: pd.Series) -> np.ndarray:
+    """Días enteros desde epoch; sustituye a las columnas object de .dt.date."""
+    fechas = pd.to_datetime(fechas)
+    if fechas.dt.tz is not None:
+        fechas = fechas.dt.tz_localize(None)
+    return fechas.to_numpy().astype("datetime64[D]").astype(np.int64)
+
+
+def _tabla_zonas(zones: pd.DataFrame) -> tuple[np.ndarray, pd.Index, np.ndarray, pd.Index]:
+    """
+    Construye los arrays LocationID -> código de zona y LocationID -> código de barrio.
+    Las categorías se comparten entre origen y destino (y entre meses),
+    así que las columnas quedan codificadas como diccionario.
+    """
+    ids = zones["LocationID"].to_numpy(dtype=np.int64)
+    tamano = int(ids.max()) + 1 if len(ids) else 0
+
+    cod_zona, cat_zona = pd.factorize(zones["Zone"])
+    cod_barrio, cat_barrio = pd.factorize(zones["Borough"])
+
+    lut_zona = np.full(tamano, -1, dtype=np.int32)
+    lut_barrio = np.full(tamano, -1, dtype=np.int32)
+    lut_zona[ids] = cod_zona
+    lut_barrio[ids] = cod_barrio
+    return lut_zona, cat_zona, lut_barrio, cat_barrio
+
+
+def _asignar_zonas(df: pd.DataFrame, col_id: str, prefijo: str, tabla) -> np.ndarray:
+    """Añade {prefijo}_zona y {prefijo}_barrio; devuelve los códigos de barrio."""
+    lut_zona, cat_zona, lut_barrio, cat_barrio = tabla
+    idx = _indices_lookup(
+        df[col_id].to_numpy(dtype=np.int64, na_value=-1), len(lut_zona)
+    )
+    cod_zona = _take_con_nulo(lut_zona, idx, -1)
+    cod_barrio = _take_con_nulo(lut_barrio, idx, -1)
+    df[f"{prefijo}_zona"] = pd.Categorical.from_codes(cod_zona, categories=cat_zona)
+    df[f"{prefijo}_barrio"] = pd.Categorical.from_codes(cod_barrio, categories=cat_barrio)
+    return cod_barrio
+
+
+def _asignar_clima(
+    df: pd.DataFrame, df_weather: pd.DataFrame, cod_barrio: np.ndarray, cat_barrio: pd.Index
+) -> None:
+    """Clima por matriz barrio × hora-epoch: una lectura take por variable."""
+    horas_w = _horas_epoch(df_weather["fecha_hora"])
+    fila_w = cat_barrio.get_indexer(df_weather["borough"])
+    validos = fila_w >= 0
+    horas_w, fila_w = horas_w[validos], fila_w[validos]
+    cols_clima = [c for c in df_weather.columns if c not in ("fecha_hora", "borough")]
+
+    horas_viaje = _horas_epoch(df["fecha_inicio"])
+    if len(horas_w) == 0:
+        for col in cols_clima:
+            df[col] = np.nan
+        return
+
+    h0 = int(horas_w.min())
+    n_horas = int(horas_w.max()) - h0 + 1
+    n_barrios = len(cat_barrio)
+
+    # Posición plana en la matriz (barrio, hora); -1 si no hay clima para ese viaje
+    col_viaje = _indices_lookup(horas_viaje - h0, n_horas)
+    pos_viaje = np.where(
+        (col_viaje >= 0) & (cod_barrio >= 0), cod_barrio.astype(np.int64) * n_horas + col_viaje, -1
+    )
+    pos_w = fila_w.astype(np.int64) * n_horas + (horas_w - h0)
+
+    for col in cols_clima:
+        matriz = np.full(n_barrios * n_horas, np.nan, dtype=np.float64)
+        matriz[pos_w] = df_weather[col].to_numpy(dtype=np.float64, na_value=np.nan)[validos]
+        df[col] = _take_con_nulo(matriz, pos_viaje, np.nan)
+
+
+def _calendario_diario(fechas: pd.Series) -> tuple[int, int, np.ndarray]:
+    """Devuelve (día inicial, nº de días, posición en el array de cada fecha)."""
+    dias = _dias_epoch(fechas)
+    d0 = int(dias.min()) if len(dias) else 0
+    n_dias = int(dias.max()) - d0 + 1 if len(dias) else 0
+    return d0, n_dias, dias - d0
+
+
 def enrich_data(
     file_path: Path, 
     lookup_path: Path, 
@@ -26,26 +143,11 @@ def enrich_data(
             
         zones = pd.read_csv(lookup_path)
         zones = zones.drop_duplicates(subset=['LocationID'])
-        
-        # Merge origen
-        df = df.merge(
-            zones[['LocationID', 'Zone', 'Borough']], 
-            left_on='origen_id', 
-            right_on='LocationID', 
-            how='left'
-        )
-        df.rename(columns={'Zone': 'origen_zona', 'Borough': 'origen_barrio'}, inplace=True)
-        df.drop(columns=['LocationID'], inplace=True, errors='ignore')
-
-        # Merge destino
-        df = df.merge(
-            zones[['LocationID', 'Zone', 'Borough']], 
-            left_on='destino_id', 
-            right_on='LocationID', 
-            how='left'
-        )
-        df.rename(columns={'Zone': 'destino_zona', 'Borough': 'destino_barrio'}, inplace=True)
-        df.drop(columns=['LocationID'], inplace=True, errors='ignore')
+        tabla_zonas = _tabla_zonas(zones)
+        cat_barrio = tabla_zonas[3]
+
+        cod_barrio_origen = _asignar_zonas(df, 'origen_id', 'origen', tabla_zonas)
+        _asignar_zonas(df, 'destino_id', 'destino', tabla_zonas)
         
         log_msg.append("Zones")
 
@@ -53,20 +155,10 @@ def enrich_data(
         if weather_lookup_path and weather_lookup_path.exists() and "origen_barrio" in df.columns:
             df_weather = pd.read_parquet(weather_lookup_path)
 
-            # Normaliza timezone (evita merges que no matchean por tz)
+            # Normaliza timezone (evita lookups que no casan por tz)
             df_weather["fecha_hora"] = pd.to_datetime(df_weather["fecha_hora"]).dt.tz_localize(None)
 
-            # Asegura fecha_inicio sin tz + floor hora
-            df["temp_hora_join"] = pd.to_datetime(df["fecha_inicio"]).dt.tz_localize(None).dt.floor("h")
-
-            df = df.merge(
-                df_weather,
-                left_on=["temp_hora_join", "origen_barrio"],
-                right_on=["fecha_hora", "borough"],
-                how="left",
-            )
-
-            df.drop(columns=["temp_hora_join", "fecha_hora", "borough"], inplace=True, errors="ignore")
+            _asignar_clima(df, df_weather, cod_barrio_origen, cat_barrio)
             log_msg.append("Weather")
 
 
@@ -93,53 +185,55 @@ def enrich_data(
         # ===== FESTIVOS =====
         if holidays_path and holidays_path.exists():
             df_holidays = pd.read_parquet(holidays_path)
-            df['fecha_date'] = df['fecha_inicio'].dt.date
-            df_holidays['fecha_date'] = df_holidays['fecha'].dt.date
-            
-            # SOLO tomar fecha_date y es_festivo
-            df = df.merge(
-                df_holidays[['fecha_date', 'es_festivo']],
-                on='fecha_date',
-                how='left'
-            )
-            
-            # Limpiar columnas temporales
-            df.drop(columns=['fecha_date'], inplace=True, errors='ignore')
-            
-            # Convertir a binario (0 o 1)
-            df['es_festivo'] = df['es_festivo'].fillna(0).astype('int8')
+            d0, n_dias, pos_cal = _calendario_diario(df_holidays['fecha'])
+
+            # Array diario indexado por día-epoch (0 = no festivo / fuera de rango)
+            festivos = np.zeros(n_dias, dtype=np.int8)
+            festivos[pos_cal] = df_holidays['es_festivo'].fillna(0).to_numpy(dtype=np.int8)
+
+            idx = _indices_lookup(_dias_epoch(df['fecha_inicio']) - d0, n_dias)
+            df['es_festivo'] = _take_con_nulo(festivos, idx, 0).astype('int8')
             
             log_msg.append("Holidays")
             
         # ===== EVENTOS (Impacto + Cantidad) =====
         if events_path and events_path.exists():
             df_events = pd.read_parquet(events_path)
-            df['fecha_date'] = df['fecha_inicio'].dt.date
-            df_events['fecha_date'] = df_events['fecha'].dt.date
-            
-            # Merge de ambas columnas nuevas
-            df = df.merge(
-                df_events[['fecha_date', 'evento_tipo', 'num_eventos']],
-                on='fecha_date',
-                how='left'
+            d0, n_dias, pos_cal = _calendario_diario(df_events['fecha'])
+
+            # Tipo de evento como códigos de categoría: "No hay" por defecto
+            cod_evento, cat_evento = pd.factorize(df_events['evento_tipo'].fillna("No hay"))
+            if "No hay" not in cat_evento:
+                cat_evento = cat_evento.append(pd.Index(["No hay"]))
+            cod_no_hay = int(cat_evento.get_loc("No hay"))
+
+            tipos = np.full(n_dias, cod_no_hay, dtype=np.int32)
+            tipos[pos_cal] = cod_evento
+            conteos = np.zeros(n_dias, dtype=np.int16)
+            conteos[pos_cal] = df_events['num_eventos'].fillna(0).to_numpy(dtype=np.int16)
+
+            idx = _indices_lookup(_dias_epoch(df['fecha_inicio']) - d0, n_dias)
+            df['evento_tipo'] = pd.Categorical.from_codes(
+                _take_con_nulo(tipos, idx, cod_no_hay), categories=cat_evento
             )
-            
-            df.drop(columns=['fecha_date'], inplace=True, errors='ignore')
-            
-            # Rellenar nulos (por seguridad) y optimizar tipos
-            df['evento_tipo'] = df['evento_tipo'].fillna("No hay").astype('category')
-            df['num_eventos'] = df['num_eventos'].fillna(0).astype('int16')
+            df['num_eventos'] = _take_con_nulo(conteos, idx, 0).astype('int16')
             
             log_msg.append("Events_Detailed") 
 
 
-        # ===== ORDENAR =====
+        # ===== ORDENAR + GUARDAR =====
         if 'fecha_inicio' in df.columns:
-            df.sort_values(by='fecha_inicio', inplace=True)
+            # El mes ya está entero en memoria: se ordena la tabla Arrow con
+            # sort_indices (estable) y se escribe con el orden declarado en el
+            # footer (datos_finales lo aprovecha para mezclar meses sin
+            # reordenarlos). Un mes sin filas se escribe igual, vacío.
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            del df
+            tabla = tabla.take(pc.sort_indices(tabla, sort_keys=[('fecha_inicio', 'ascending')]))
+            escribir_parquet(tabla, file_path, ordenado_por='fecha_inicio')
             log_msg.append("Sorted")
-
-        # Guardar
-        df.to_parquet(file_path, index=False)
+        else:
+            escribir_parquet(df, file_path)
         
         return f" {file_path.name} ({', '.join(log_msg)})"
 
@@ -0,0 +1,106 @@
+"""Escaneo compartido de datos_final: una lectura para varios consumidores.
+
+Cada problema (P1, P2, P4, P5) y las funcionalidades de demanda y mapa
+recorrían datos_final.parquet por su cuenta, algunos dos veces. Aquí cada
+row group se lee una sola vez, con la unión de las columnas que piden los
+consumidores registrados, y se pasa a cada uno con sus columnas.
+
+Un consumidor es un objeto con:
+  - columnas: lista de columnas que necesita (None = todas)
+  - procesar(df): se llama con cada row group, en orden del fichero
+  - finalizar(info): se llama al terminar; lo que devuelva es su resultado
+
+info trae filas, row groups y el rango de fecha_inicio (t_min, t_max),
+sacados del footer antes de empezar (src.processing.lectura.resumen_footer).
+
+    escaneo = EscaneoCompartido(ARCHIVO_FINAL)
+    escaneo.registrar("demanda", AgregadorDemandaZonaHora())
+    escaneo.registrar("p1", AgregadorZonaHora())
+    resultados = escaneo.ejecutar()
+"""
+
+from __future__ import annotations
+
+import time
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.processing.lectura import ficheros_parquet, resumen_footer
+
+
+class Consumidor:
+    """Base de los consumidores del escaneo (agregadores o sinks que escriben a disco)."""
+
+    columnas: list[str] | None = None
+
+    def procesar(self, df: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    def finalizar(self, info: dict):
+        return None
+
+
+class EscaneoCompartido:
+    """Lee datos_final (fichero o directorio Hive) una vez por row group y reparte."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.consumidores: dict[str, Consumidor] = {}
+
+    def registrar(self, nombre: str, consumidor: Consumidor) -> "EscaneoCompartido":
+        if nombre in self.consumidores:
+            raise ValueError(f"Ya hay un consumidor registrado como '{nombre}'")
+        self.consumidores[nombre] = consumidor
+        return self
+
+    def _columnas(self, nombres: list[str]) -> list[str] | None:
+        """Unión (en orden) de las columnas pedidas que existen en el fichero."""
+        if any(c.columnas is None for c in self.consumidores.values()):
+            return None
+        union = []
+        for consumidor in self.consumidores.values():
+            union += [col for col in consumidor.columnas if col in nombres and col not in union]
+        return union
+
+    def ejecutar(self, verbose: bool = True) -> dict:
+        """Un pase sobre los datos. Devuelve {nombre: resultado de finalizar}."""
+        if not self.consumidores:
+            return {}
+
+        ficheros = [pq.ParquetFile(f) for f in ficheros_parquet(self.ruta)]
+        total_rg = sum(p.num_row_groups for p in ficheros)
+        footer = resumen_footer(self.ruta)
+        info = {"filas": footer["filas"], "row_groups": total_rg, "t_min": footer["min"], "t_max": footer["max"]}
+        t0 = time.perf_counter()
+
+        leidos = 0
+        for parquet in ficheros:
+            nombres = parquet.schema_arrow.names
+            leer = self._columnas(nombres)
+            # Columnas de cada consumidor en este fichero (se calcula una vez)
+            propias = {
+                nombre: (nombres if c.columnas is None else [col for col in c.columnas if col in nombres])
+                for nombre, c in self.consumidores.items()
+            }
+
+            for rg in range(parquet.num_row_groups):
+                tabla = parquet.read_row_group(rg, columns=leer)
+                # Una sola conversión a pandas; cada consumidor recibe su selección
+                # (copy-on-write: si la modifica no afecta a los demás)
+                df = tabla.to_pandas()
+                del tabla
+                for nombre, consumidor in self.consumidores.items():
+                    consumidor.procesar(df[propias[nombre]])
+                del df
+
+                leidos += 1
+                if verbose:
+                    print(f"\r   Row group {leidos}/{total_rg}...", end="", flush=True)
+
+        if verbose:
+            print(
+                f"\n   Escaneo compartido: {info['filas']:,} filas, {total_rg} row groups, "
+                f"{len(self.consumidores)} consumidores en {time.perf_counter() - t0:.1f}s"
+            )
+        return {nombre: c.finalizar(info) for nombre, c in self.consumidores.items()}
@@ -0,0 +1,262 @@
+"""Escritura de parquets con esquema compacto.
+
+Todos los parquets procesados (meses limpios/enriquecidos, dataset
+intermedio y datos_final) se escriben con las mismas reglas:
+
+  - columnas de texto de baja cardinalidad como diccionario (category en pandas)
+  - enteros de dominio acotado en int16/int8 (ids de zona, hora, flags...)
+  - float64 -> float32
+  - zstd, row groups de tamaño fijo, estadísticas y page index
+  - opcionalmente, orden declarado en el footer (sorting_columns)
+  - bloom filter en origen_id para las búsquedas por zona
+
+Uso (comparar tamaño y tiempo de lectura de un parquet existente):
+    python -m src.processing.escritura data/processed/tlc_clean/datos_final.parquet
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+COLUMNAS_DICCIONARIO = {
+    "origen_zona", "origen_barrio", "destino_zona", "destino_barrio",
+    "tipo_vehiculo", "franja_horaria", "evento_tipo",
+}
+
+# Enteros con dominio conocido: el tipo no depende del lote que se esté
+# escribiendo, así el esquema es estable entre row groups y entre meses.
+TIPOS_ENTEROS = {
+    "origen_id": pa.int16(),
+    "destino_id": pa.int16(),
+    "hora": pa.int8(),
+    "dia_semana": pa.int8(),
+    "mes_num": pa.int8(),
+    "es_fin_semana": pa.int8(),
+    "es_festivo": pa.int8(),
+    "lluvia": pa.int8(),
+    "nieve": pa.int8(),
+}
+
+TIPO_DICCIONARIO = pa.dictionary(pa.int16(), pa.string())
+COMPRESION = "zstd"
+NIVEL_COMPRESION = 3
+FILAS_POR_ROW_GROUP = 262_144
+# ~265 LocationIDs distintos: con ndv pequeño el filtro ocupa muy poco
+BLOOM_FILTERS = {"origen_id": {"ndv": 512, "fpp": 0.01}}
+
+
+def _entero_minimo(minimo, maximo) -> pa.DataType | None:
+    for tipo, lo, hi in (
+        (pa.int8(), -(2**7), 2**7 - 1),
+        (pa.int16(), -(2**15), 2**15 - 1),
+        (pa.int32(), -(2**31), 2**31 - 1),
+    ):
+        if lo <= minimo and maximo <= hi:
+            return tipo
+    return None
+
+
+def esquema_compacto(tabla: pa.Table, por_datos: bool = False) -> pa.Schema:
+    """
+    Esquema destino de una tabla. Con por_datos=True el resto de enteros se
+    reduce al menor tipo que cubre su rango en esta tabla. Eso solo vale para
+    un fichero que se lee suelto: los meses y particiones se leen juntos y
+    cada uno acabaría con un tipo distinto según sus datos, así que por
+    defecto solo se estrechan las columnas de TIPOS_ENTEROS.
+    """
+    campos = []
+    for campo in tabla.schema:
+        nombre, tipo = campo.name, campo.type
+        if nombre in TIPOS_ENTEROS and (pa.types.is_integer(tipo) or pa.types.is_floating(tipo)):
+            tipo = TIPOS_ENTEROS[nombre]
+        elif nombre in COLUMNAS_DICCIONARIO and (
+            pa.types.is_string(tipo) or pa.types.is_large_string(tipo) or pa.types.is_dictionary(tipo)
+        ):
+            tipo = TIPO_DICCIONARIO
+        elif pa.types.is_float64(tipo):
+            tipo = pa.float32()
+        elif por_datos and pa.types.is_integer(tipo) and tipo.bit_width > 8:
+            rango = pc.min_max(tabla.column(nombre))
+            minimo, maximo = rango["min"].as_py(), rango["max"].as_py()
+            if minimo is not None:
+                tipo = _entero_minimo(minimo, maximo) or tipo
+        campos.append(pa.field(nombre, tipo, nullable=campo.nullable))
+    return pa.schema(campos)
+
+
+def a_tabla(datos) -> pa.Table:
+    if isinstance(datos, pd.DataFrame):
+        return pa.Table.from_pandas(datos, preserve_index=False)
+    return datos
+
+
+def compactar(datos, esquema: pa.Schema | None = None) -> pa.Table:
+    """Convierte un DataFrame/Table al esquema compacto (o al esquema dado)."""
+    tabla = a_tabla(datos)
+    esquema = esquema or esquema_compacto(tabla)
+    columnas = []
+    for campo in esquema:
+        columna = tabla.column(campo.name)
+        if pa.types.is_dictionary(campo.type) and not pa.types.is_dictionary(columna.type):
+            columna = pc.dictionary_encode(columna)
+        # cast seguro: si un valor no cabe en el tipo destino, falla en vez de truncar
+        columnas.append(columna.cast(campo.type, safe=not pa.types.is_float32(campo.type)))
+    # Sin metadata de pandas: los dtypes salen del esquema Arrow al leer
+    return pa.Table.from_arrays(columnas, schema=esquema)
+
+
+def _opciones_escritura(esquema: pa.Schema, ordenado_por: str | None = None) -> dict:
+    opciones = {
+        "compression": COMPRESION,
+        "compression_level": NIVEL_COMPRESION,
+        "write_statistics": True,
+        "write_page_index": True,
+    }
+    if ordenado_por is not None:
+        opciones["sorting_columns"] = [pq.SortingColumn(esquema.get_field_index(ordenado_por))]
+    bloom = {c: v for c, v in BLOOM_FILTERS.items() if c in esquema.names}
+    if bloom:
+        opciones["bloom_filter_options"] = bloom
+    return opciones
+
+
+def _abrir_writer(ruta, esquema: pa.Schema, ordenado_por: str | None = None) -> pq.ParquetWriter:
+    opciones = _opciones_escritura(esquema, ordenado_por)
+    try:
+        return pq.ParquetWriter(ruta, esquema, **opciones)
+    except TypeError:
+        # pyarrow sin soporte de bloom filters: se escribe igual, sin ellos
+        opciones.pop("bloom_filter_options", None)
+        return pq.ParquetWriter(ruta, esquema, **opciones)
+
+
+class EscritorParquet:
+    """
+    ParquetWriter con esquema compacto para escribir por bloques. El esquema
+    se fija con el primer bloque (sin reducir enteros por datos: los bloques
+    siguientes podrían no caber).
+
+    Con ordenado_por se declara el orden en el footer y se comprueba que cada
+    bloque llega ordenado y a continuación del anterior; si no, ValueError
+    (un orden declarado falso haría que los lectores descarten row groups mal).
+    """
+
+    def __init__(
+        self, ruta, esquema: pa.Schema | None = None,
+        filas_por_row_group: int = FILAS_POR_ROW_GROUP, ordenado_por: str | None = None,
+    ):
+        self.ruta = ruta
+        self.esquema = esquema
+        self.filas_por_row_group = filas_por_row_group
+        self.ordenado_por = ordenado_por
+        self._ultimo = None
+        self._writer = None
+
+    def _comprobar_orden(self, tabla: pa.Table) -> None:
+        col = tabla.column(self.ordenado_por)
+        if len(col) == 0:
+            return
+        if col.null_count or (len(col) > 1 and not pc.all(pc.greater_equal(col[1:], col[:-1])).as_py()):
+            raise ValueError(f"El bloque no está ordenado por {self.ordenado_por}")
+        if self._ultimo is not None and col[0].as_py() < self._ultimo:
+            raise ValueError(f"El bloque empieza antes que el anterior en {self.ordenado_por}")
+        self._ultimo = col[-1].as_py()
+
+    def escribir(self, datos) -> None:
+        tabla = a_tabla(datos)
+        if self.ordenado_por is not None:
+            self._comprobar_orden(tabla)
+        if self._writer is None:
+            self.esquema = self.esquema or esquema_compacto(tabla)
+            self._writer = _abrir_writer(self.ruta, self.esquema, self.ordenado_por)
+        self._writer.write_table(compactar(tabla, self.esquema), row_group_size=self.filas_por_row_group)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def escribir_parquet(
+    datos, ruta, filas_por_row_group: int = FILAS_POR_ROW_GROUP, ordenado_por: str | None = None
+) -> pa.Schema:
+    """
+    Escribe un DataFrame/Table completo con el esquema compacto (el mismo
+    para todos los meses: sin reducir enteros por datos). Se escribe a un
+    temporal y se renombra, porque enrich reescribe el mismo fichero que lee.
+    """
+    ruta = Path(ruta)
+    tabla = compactar(datos)
+    tmp = ruta.with_name(ruta.name + ".tmp")
+    with EscritorParquet(tmp, tabla.schema, filas_por_row_group, ordenado_por) as escritor:
+        escritor.escribir(tabla)
+    os.replace(tmp, ruta)
+    return tabla.schema
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Comparación antes / después
+# ──────────────────────────────────────────────────────────────────────────────
+def _tiempo_lectura(ruta, columnas=None, repeticiones: int = 3) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        pd.read_parquet(ruta, columns=columnas)
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor
+
+
+def comparar_formato(ruta_antes, ruta_despues, columnas=None) -> dict:
+    """Tamaño en disco, memoria en pandas y tiempo de lectura de dos versiones de un parquet."""
+    resultado = {}
+    for etiqueta, ruta in (("antes", ruta_antes), ("despues", ruta_despues)):
+        df = pd.read_parquet(ruta, columns=columnas)
+        resultado[etiqueta] = {
+            "disco_mb": Path(ruta).stat().st_size / 1024**2,
+            "memoria_mb": df.memory_usage(deep=True).sum() / 1024**2,
+            "lectura_s": _tiempo_lectura(ruta, columnas),
+        }
+        del df
+    return resultado
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser("Reescribe un parquet con el esquema compacto y compara")
+    parser.add_argument("parquet", type=Path)
+    parser.add_argument("--salida", type=Path, default=None, help="Por defecto <nombre>.compacto.parquet")
+    parser.add_argument("--columnas", nargs="+", default=None, help="Columnas para medir la lectura")
+    args = parser.parse_args()
+
+    salida = args.salida or args.parquet.with_suffix(".compacto.parquet")
+    parquet = pq.ParquetFile(args.parquet)
+    with EscritorParquet(salida) as escritor:
+        for i in range(parquet.num_row_groups):
+            escritor.escribir(parquet.read_row_group(i))
+
+    res = comparar_formato(args.parquet, salida, args.columnas)
+    print(f"{'':10s} {'disco MB':>10s} {'memoria MB':>11s} {'lectura s':>10s}")
+    for etiqueta, r in res.items():
+        print(f"{etiqueta:10s} {r['disco_mb']:10.1f} {r['memoria_mb']:11.1f} {r['lectura_s']:10.3f}")
+    a, d = res["antes"], res["despues"]
+    print(
+        f"Ahorro: disco x{a['disco_mb'] / d['disco_mb']:.2f}, memoria x{a['memoria_mb'] / d['memoria_mb']:.2f}, "
+        f"lectura x{a['lectura_s'] / d['lectura_s']:.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Lectura selectiva de datos_final usando las estadísticas del footer.
+
+datos_final se escribe ordenado por fecha_inicio, así que cada row group
+cubre un intervalo de tiempo estrecho y sus min/max permiten descartarlo
+sin leerlo. `scan` lee solo los row groups que pueden contener filas del
+rango pedido (y de las zonas pedidas, si sus min/max de origen_id no las
+excluyen) y después filtra fila a fila.
+
+Funciona igual con el parquet suelto o con su versión particionada.
+
+`resumen_footer` y `planificar_cortes` dan el rango temporal, las filas y
+los cortes train/val/test solo con el footer, sin leer columnas.
+
+    from src.processing.lectura import scan
+    df = scan(ARCHIVO_FINAL, rango_tiempo=("2025-09-01", "2025-10-01"),
+              zonas=[132, 138], columnas=["fecha_inicio", "origen_id", "propina"])
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+COLUMNA_TIEMPO = "fecha_inicio"
+COLUMNA_ZONA = "origen_id"
+
+
+# Particiones que marcan el tiempo: van primero al ordenar los ficheros
+PARTICIONES_TIEMPO = ("year", "month")
+
+
+def _natural(texto: str) -> tuple:
+    """Clave de orden natural: 'part-10' va después de 'part-2'."""
+    return tuple(int(t) if t.isdigit() else t for t in re.split(r"(\d+)", texto))
+
+
+def _clave_fichero(fichero: Path, base: Path) -> tuple:
+    """(valores de year y month, resto de particiones, nombre) comparando números como números."""
+    partes = fichero.relative_to(base).parts
+    particiones = dict(p.split("=", 1) for p in partes[:-1] if "=" in p)
+    tiempo = tuple(_natural(particiones.pop(k, "")) for k in PARTICIONES_TIEMPO)
+    return tiempo, tuple(_natural(v) for v in particiones.values()), _natural(partes[-1])
+
+
+def ficheros_parquet(ruta) -> list[Path]:
+    """
+    El propio fichero o todos los .parquet de un directorio Hive en orden
+    temporal de partición: por año y mes (month=2 antes que month=10) y,
+    dentro del mes, por servicio y número de parte. El orden es por meses,
+    no fila a fila: en un mes van primero las filas de un servicio y luego
+    las del otro. Los sinks que parten por posición (P5) exigen un fichero
+    declarado en orden; P4 parte por mes.
+    """
+    ruta = Path(ruta)
+    if ruta.is_dir():
+        return sorted(ruta.rglob("*.parquet"), key=lambda f: _clave_fichero(f, ruta))
+    return [ruta]
+
+
+def _estadisticas(metadata: pq.FileMetaData, rg: int, columna: str):
+    """(min, max) de una columna en un row group, o None si no hay estadísticas."""
+    grupo = metadata.row_group(rg)
+    for i in range(grupo.num_columns):
+        col = grupo.column(i)
+        if col.path_in_schema == columna:
+            stats = col.statistics
+            if stats is None or not stats.has_min_max:
+                return None
+            return stats.min, stats.max
+    return None
+
+
+def _normalizar_rango(rango_tiempo):
+    if rango_tiempo is None:
+        return None
+    inicio, fin = rango_tiempo
+    inicio = pd.Timestamp(inicio) if inicio is not None else None
+    fin = pd.Timestamp(fin) if fin is not None else None
+    return inicio, fin
+
+
+def resumen_footer(ruta, columna: str = COLUMNA_TIEMPO) -> dict:
+    """
+    Filas, rango de `columna` y límites de cada row group sacados del footer,
+    sin leer datos. Solo se lee la columna de los row groups que no tienen
+    estadísticas min/max.
+
+    Devuelve {'filas', 'min', 'max', 'row_groups': [{'fichero', 'rg', 'filas', 'min', 'max'}, ...]}
+    """
+    resumen = {"filas": 0, "min": None, "max": None, "row_groups": []}
+    for fichero in ficheros_parquet(ruta):
+        parquet = pq.ParquetFile(fichero)
+        metadata = parquet.metadata
+        tiene_columna = columna in parquet.schema_arrow.names
+        for rg in range(metadata.num_row_groups):
+            filas = metadata.row_group(rg).num_rows
+            stats = _estadisticas(metadata, rg, columna)
+            if stats is None and filas and tiene_columna:
+                col = parquet.read_row_group(rg, columns=[columna]).column(columna)
+                rango = pc.min_max(col)
+                stats = (rango["min"].as_py(), rango["max"].as_py())
+            lo, hi = stats if stats is not None else (None, None)
+            if columna == COLUMNA_TIEMPO and lo is not None:
+                lo, hi = pd.Timestamp(lo), pd.Timestamp(hi)
+            resumen["row_groups"].append({"fichero": fichero, "rg": rg, "filas": filas, "min": lo, "max": hi})
+            resumen["filas"] += filas
+            if lo is not None:
+                resumen["min"] = lo if resumen["min"] is None else min(resumen["min"], lo)
+                resumen["max"] = hi if resumen["max"] is None else max(resumen["max"], hi)
+    return resumen
+
+
+def planificar_cortes(ruta, split=(0.70, 0.85), redondeo: str = "1h", resumen: dict | None = None) -> dict:
+    """
+    Cortes temporales train/val/test como fracción del rango de fecha_inicio,
+    redondeados hacia abajo a `redondeo`. Todo sale del footer.
+
+    Además estima las filas de cada split suponiendo que dentro de cada row
+    group los viajes se reparten uniformemente entre su min y su max (con
+    datos_final ordenado el error queda en los row groups que cruzan un corte).
+    """
+    resumen = resumen or resumen_footer(ruta)
+    t_min, t_max = resumen["min"], resumen["max"]
+    if t_min is None:
+        raise ValueError(f"{ruta} no tiene valores de {COLUMNA_TIEMPO}")
+    rango = t_max - t_min
+    corte_train = (t_min + rango * split[0]).floor(redondeo)
+    corte_val = (t_min + rango * split[1]).floor(redondeo)
+
+    def filas_antes(corte) -> float:
+        total = 0.0
+        for g in resumen["row_groups"]:
+            if g["min"] is None or g["filas"] == 0:
+                continue
+            if g["max"] < corte:
+                total += g["filas"]
+            elif g["min"] < corte:
+                ancho = (g["max"] - g["min"]).total_seconds()
+                total += g["filas"] * ((corte - g["min"]).total_seconds() / ancho if ancho else 0.0)
+        return total
+
+    antes_train, antes_val = filas_antes(corte_train), filas_antes(corte_val)
+    return {
+        "t_min": t_min,
+        "t_max": t_max,
+        "corte_train": corte_train,
+        "corte_val": corte_val,
+        "filas": resumen["filas"],
+        "filas_estimadas": {
+            "train": round(antes_train),
+            "val": round(antes_val - antes_train),
+            "test": round(resumen["filas"] - antes_val),
+        },
+    }
+
+
+def row_groups_candidatos(parquet: pq.ParquetFile, rango_tiempo=None, zonas=None) -> list[int]:
+    """
+    Row groups que pueden tener filas con inicio <= fecha_inicio < fin y
+    origen_id en zonas. Sin estadísticas, el row group se lee (no se puede descartar).
+    """
+    metadata = parquet.metadata
+    rango = _normalizar_rango(rango_tiempo)
+    zonas = sorted(int(z) for z in zonas) if zonas is not None else None
+
+    candidatos = []
+    for rg in range(metadata.num_row_groups):
+        if rango is not None:
+            stats = _estadisticas(metadata, rg, COLUMNA_TIEMPO)
+            if stats is not None:
+                lo, hi = pd.Timestamp(stats[0]), pd.Timestamp(stats[1])
+                inicio, fin = rango
+                if (inicio is not None and hi < inicio) or (fin is not None and lo >= fin):
+                    continue
+        if zonas is not None:
+            stats = _estadisticas(metadata, rg, COLUMNA_ZONA)
+            if stats is not None and not any(stats[0] <= z <= stats[1] for z in zonas):
+                continue
+        candidatos.append(rg)
+    return candidatos
+
+
+def _filtrar(tabla: pa.Table, rango, zonas) -> pa.Table:
+    mascara = None
+
+    def y(a, b):
+        return b if a is None else pc.and_(a, b)
+
+    if rango is not None:
+        tipo = tabla.schema.field(COLUMNA_TIEMPO).type
+        inicio, fin = rango
+        if inicio is not None:
+            mascara = y(mascara, pc.greater_equal(tabla[COLUMNA_TIEMPO], pa.scalar(inicio, tipo)))
+        if fin is not None:
+            mascara = y(mascara, pc.less(tabla[COLUMNA_TIEMPO], pa.scalar(fin, tipo)))
+    if zonas is not None:
+        mascara = y(mascara, pc.is_in(tabla[COLUMNA_ZONA], pa.array(zonas).cast(tabla.schema.field(COLUMNA_ZONA).type)))
+    return tabla if mascara is None else tabla.filter(mascara)
+
+
+def scan(ruta, rango_tiempo=None, zonas=None, columnas: list[str] | None = None) -> pd.DataFrame:
+    """
+    Lee de datos_final (fichero o directorio particionado) las filas con
+    fecha_inicio en [inicio, fin) y origen_id en zonas, solo de los row groups
+    que lo permiten según min/max. Cualquiera de los dos filtros puede ser None.
+    """
+    rango = _normalizar_rango(rango_tiempo)
+    zonas = sorted(int(z) for z in zonas) if zonas is not None else None
+
+    tablas = []
+    for fichero in ficheros_parquet(ruta):
+        parquet = pq.ParquetFile(fichero)
+        nombres = parquet.schema_arrow.names
+        # Las columnas de filtro se leen aunque no se pidan y se quitan al final
+        leer = None
+        if columnas is not None:
+            leer = [c for c in columnas if c in nombres]
+            for extra, activo in ((COLUMNA_TIEMPO, rango), (COLUMNA_ZONA, zonas)):
+                if activo is not None and extra not in leer:
+                    leer.append(extra)
+
+        rgs = row_groups_candidatos(parquet, rango, zonas)
+        if not rgs:
+            continue
+        tabla = _filtrar(parquet.read_row_groups(rgs, columns=leer), rango, zonas)
+        if columnas is not None:
+            tabla = tabla.select([c for c in columnas if c in tabla.schema.names])
+        tablas.append(tabla)
+
+    if not tablas:
+        esquema = pq.ParquetFile(ficheros_parquet(ruta)[0]).schema_arrow
+        if columnas is not None:
+            esquema = pa.schema([esquema.field(c) for c in columnas if c in esquema.names])
+        return esquema.empty_table().to_pandas()
+    return pa.concat_tables(tablas, promote_options="permissive").to_pandas()
@@ -0,0 +1,232 @@
+"""Ordenación externa de tablas Arrow con presupuesto de memoria.
+
+Los bloques de entrada se acumulan hasta llenar el presupuesto; entonces se
+ordenan y se vuelcan como un "run" a un fichero Arrow IPC temporal. Al final
+los runs (leídos con memory-map, un lote cada vez) se mezclan con un merge
+k-way y se escriben a Parquet con el esquema compacto de
+src.processing.escritura. Si todo cabe en el presupuesto no se vuelca nada.
+
+La ordenación es estable: a igual clave se conserva el orden de llegada.
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+import tempfile
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from src.processing.escritura import EscritorParquet
+
+PRESUPUESTO_MB = 512
+FILAS_POR_LOTE = 65_536
+
+
+def _ordenar_tabla(tabla: pa.Table, clave: str) -> pa.Table:
+    # sort_indices es estable
+    return tabla.take(pc.sort_indices(tabla, sort_keys=[(clave, "ascending")]))
+
+
+def _claves(tabla: pa.Table, clave: str) -> np.ndarray:
+    return tabla.column(clave).to_numpy()
+
+
+def _volcar_run(tabla: pa.Table, ruta: Path) -> None:
+    with pa.ipc.new_file(ruta, tabla.schema) as writer:
+        for lote in tabla.to_batches(max_chunksize=FILAS_POR_LOTE):
+            writer.write_batch(lote)
+
+
+def _en_lotes(tabla: pa.Table) -> Iterator[pa.Table]:
+    for inicio in range(0, tabla.num_rows, FILAS_POR_LOTE):
+        yield tabla.slice(inicio, FILAS_POR_LOTE)
+
+
+def leer_run(ruta) -> Iterator[pa.Table]:
+    """Lotes de un run Arrow IPC, leídos con memory-map de uno en uno."""
+    with pa.memory_map(str(ruta), "r") as fuente:
+        reader = pa.ipc.open_file(fuente)
+        for j in range(reader.num_record_batches):
+            yield pa.Table.from_batches([reader.get_batch(j)])
+
+
+def mezclar_ordenados(fuentes: list[Iterable[pa.Table]], clave: str) -> Iterator[pa.Table]:
+    """
+    Merge k-way de fuentes ya ordenadas por `clave`. Un heap guarda el último
+    valor del bloque en memoria de cada fuente: todas las filas <= el mínimo de
+    esos valores ya se pueden emitir, porque ninguna fuente tiene pendiente una
+    fila menor. Cada paso agota al menos un bloque, y en memoria solo hay un
+    bloque por fuente.
+    """
+    iteradores = [iter(f) for f in fuentes]
+    bloques: dict[int, pa.Table] = {}
+    version = [0] * len(iteradores)
+    heap: list = []
+
+    def poner(i: int, bloque: pa.Table | None) -> None:
+        while bloque is not None and bloque.num_rows == 0:
+            bloque = next(iteradores[i], None)
+        # Cada cambio de bloque invalida la entrada anterior de la fuente en el heap
+        version[i] += 1
+        if bloque is None:
+            bloques.pop(i, None)
+            return
+        bloques[i] = bloque
+        ultimo = _claves(bloque.slice(bloque.num_rows - 1), clave)[0]
+        heapq.heappush(heap, (ultimo, i, version[i]))
+
+    for i in range(len(iteradores)):
+        poner(i, next(iteradores[i], None))
+
+    while heap:
+        corte, i, v = heapq.heappop(heap)
+        if v != version[i]:
+            continue
+
+        piezas = []
+        # Recorrido en orden de fuente: en empates va antes la fuente anterior (estable)
+        for j in sorted(bloques):
+            bloque, avanzado = bloques[j], False
+            # Si el bloque se agota justo en el corte, el siguiente puede empezar
+            # con la misma clave: se sigue leyendo para no romper la estabilidad
+            while bloque is not None:
+                n = int(np.searchsorted(_claves(bloque, clave), corte, side="right"))
+                if n == 0:
+                    break
+                piezas.append(bloque.slice(0, n))
+                avanzado = True
+                if n < bloque.num_rows:
+                    bloque = bloque.slice(n)
+                    break
+                bloque = next(iteradores[j], None)
+            if avanzado:
+                poner(j, bloque)
+
+        if piezas:
+            yield _ordenar_tabla(pa.concat_tables(piezas), clave)
+
+
+def ordenados(
+    bloques: Iterable[pa.Table], clave: str, presupuesto_mb: float = PRESUPUESTO_MB, tmp_dir=None
+) -> Iterator[pa.Table]:
+    """
+    Devuelve los bloques de entrada ordenados por `clave`, en lotes. Los runs
+    que no caben en el presupuesto se vuelcan a IPC en tmp_dir y se borran al
+    terminar de consumir el generador.
+    """
+    presupuesto = presupuesto_mb * 1024**2
+    with tempfile.TemporaryDirectory(prefix="orden_", dir=tmp_dir) as tmp:
+        runs: list[Path] = []
+        pendientes: list[pa.Table] = []
+        acumulado = 0
+
+        for bloque in bloques:
+            if bloque.num_rows == 0:
+                continue
+            pendientes.append(bloque)
+            acumulado += bloque.nbytes
+            if acumulado >= presupuesto:
+                run = Path(tmp) / f"run_{len(runs):04d}.arrow"
+                _volcar_run(_ordenar_tabla(pa.concat_tables(pendientes), clave), run)
+                runs.append(run)
+                pendientes, acumulado = [], 0
+
+        ultimo = _ordenar_tabla(pa.concat_tables(pendientes), clave) if pendientes else None
+        del pendientes
+        if not runs:
+            # Todo cabe en memoria: sin ficheros temporales
+            if ultimo is not None:
+                yield from _en_lotes(ultimo)
+            return
+
+        fuentes = [leer_run(run) for run in runs]
+        if ultimo is not None:
+            fuentes.append(_en_lotes(ultimo))
+        yield from mezclar_ordenados(fuentes, clave)
+
+
+def volcar_ordenados(
+    bloques: Iterable[pa.Table], destino, clave: str,
+    presupuesto_mb: float = PRESUPUESTO_MB, tmp_dir=None,
+) -> int:
+    """
+    Ordena los bloques por `clave` y los deja en `destino` como un run Arrow
+    IPC (para leerlo luego con leer_run). Sirve para preparar las fuentes de
+    mezclar_ordenados: ordenando cada fuente a disco antes de mezclar, el
+    presupuesto se usa de una en una y en el merge solo queda un lote por
+    fuente. Devuelve el número de filas; sin filas no se crea el fichero.
+    """
+    total = 0
+    writer = None
+    try:
+        for lote in ordenados(bloques, clave, presupuesto_mb, tmp_dir):
+            if writer is None:
+                writer = pa.ipc.new_file(str(destino), lote.schema)
+            for batch in lote.to_batches(max_chunksize=FILAS_POR_LOTE):
+                writer.write_batch(batch)
+            total += lote.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return total
+
+
+def ordenar_externo(
+    bloques: Iterable[pa.Table], destino, clave: str,
+    presupuesto_mb: float = PRESUPUESTO_MB, esquema: pa.Schema | None = None, tmp_dir=None,
+) -> int:
+    """
+    Ordena los bloques por `clave` y los escribe en `destino` (Parquet compacto,
+    orden declarado en el footer). Se escribe a un temporal y se renombra, así
+    destino puede ser el mismo fichero del que se leen los bloques.
+    Sin filas se escribe un parquet vacío con el esquema de los bloques (si
+    no llega ninguno ni hay `esquema`, destino no se toca).
+    Devuelve el número de filas escritas.
+    """
+    destino = Path(destino)
+    tmp = destino.with_name(destino.name + ".tmp")
+    vacio = []
+
+    def con_esquema(bloques):
+        # ordenados() descarta los bloques vacíos: se guarda uno para el esquema
+        for bloque in bloques:
+            if not vacio:
+                vacio.append(bloque.schema.empty_table())
+            yield bloque
+
+    total = 0
+    with EscritorParquet(tmp, esquema, ordenado_por=clave) as escritor:
+        for lote in ordenados(con_esquema(bloques), clave, presupuesto_mb, tmp_dir or destino.parent):
+            escritor.escribir(lote)
+            total += lote.num_rows
+        if total == 0 and (esquema is not None or vacio):
+            escritor.escribir(esquema.empty_table() if esquema is not None else vacio[0])
+    if not tmp.exists():
+        return 0
+    os.replace(tmp, destino)
+    return total
+
+
+def declarado_ordenado(ruta, clave: str) -> bool:
+    """True si el footer declara todos los row groups ordenados (ascendente) por `clave`."""
+    metadata = pq.ParquetFile(ruta).metadata
+    if metadata.num_row_groups == 0:
+        return True
+    indice = metadata.schema.to_arrow_schema().get_field_index(clave)
+    return all(
+        any(c.column_index == indice and not c.descending for c in metadata.row_group(rg).sorting_columns)
+        for rg in range(metadata.num_row_groups)
+    )
+
+
+def ordenar_parquet(origen, destino, clave: str, presupuesto_mb: float = PRESUPUESTO_MB) -> int:
+    """Ordenación externa de un parquet leído por row groups."""
+    parquet = pq.ParquetFile(origen)
+    bloques = (parquet.read_row_group(i) for i in range(parquet.num_row_groups))
+    return ordenar_externo(bloques, destino, clave, presupuesto_mb)
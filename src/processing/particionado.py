@@ -0,0 +1,164 @@
+"""Dataset procesado particionado en formato Hive (service=/year=/month=).
+
+En vez de un único parquet grande, cada mes de cada servicio vive en su
+propio directorio. Con `pyarrow.dataset` los filtros sobre las columnas de
+partición descartan directorios enteros antes de leer, y los filtros sobre
+el resto de columnas usan las estadísticas min/max de cada row group.
+"""
+
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.config import PROCESSED_DIR
+from src.pipelines.manifest import Manifest, hash_codigo
+
+DATASET_DIR = PROCESSED_DIR / "tlc_dataset"
+DATOS_FINAL_DIR = PROCESSED_DIR / "tlc_clean" / "datos_final"
+# Artefacto del manifest con el que run_pipeline registra DATOS_FINAL_DIR
+ARTEFACTO_PARTICIONADO = "datos_final_particionado"
+
+ESQUEMA_PARTICION = pa.schema([
+    ("service", pa.string()),
+    ("year", pa.int16()),
+    ("month", pa.int8()),
+])
+
+
+def _particionado() -> ds.Partitioning:
+    return ds.partitioning(ESQUEMA_PARTICION, flavor="hive")
+
+
+def _con_columnas_particion(batch: pa.RecordBatch, service, year, month) -> pa.RecordBatch:
+    """Añade service/year/month (constantes o arrays) a un batch."""
+    n = batch.num_rows
+    columnas = {
+        "service": service if isinstance(service, pa.Array) else pa.array([service] * n, pa.string()),
+        "year": year if isinstance(year, pa.Array) else pa.array([year] * n, pa.int16()),
+        "month": month if isinstance(month, pa.Array) else pa.array([month] * n, pa.int8()),
+    }
+    arrays = list(batch.columns) + [columnas[c] for c in ESQUEMA_PARTICION.names]
+    nombres = batch.schema.names + ESQUEMA_PARTICION.names
+    return pa.RecordBatch.from_arrays(arrays, names=nombres)
+
+
+def _escribir(batches, schema: pa.Schema, base_dir: Path) -> None:
+    ds.write_dataset(
+        batches,
+        base_dir,
+        schema=schema,
+        format="parquet",
+        partitioning=_particionado(),
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
+
+
+def escribir_mes_particionado(
+    parquet_path: Path, service: str, year: int, month: int, base_dir: Path = DATASET_DIR
+) -> str:
+    """
+    Copia un mes limpio a base_dir/service=.../year=.../month=.../ leyendo por
+    row groups. Si la partición ya existía se reemplaza entera.
+    """
+    parquet = pq.ParquetFile(parquet_path)
+    schema = parquet.schema_arrow
+    for campo in ESQUEMA_PARTICION:
+        schema = schema.append(campo)
+
+    def batches():
+        for batch in parquet.iter_batches():
+            yield _con_columnas_particion(batch, service, int(year), int(month))
+
+    _escribir(batches(), schema, Path(base_dir))
+    return f"OK   particion service={service}/year={year}/month={month}"
+
+
+def particionar_datos_final(ruta_final, base_dir: Path = DATOS_FINAL_DIR) -> str:
+    """
+    Reescribe datos_final.parquet como dataset Hive por servicio/año/mes,
+    en streaming. El año sale de fecha_inicio y el mes de mes_num, de forma
+    que el diciembre del año anterior queda en year=<anterior>/month=12.
+    Se reescribe el directorio completo para no dejar particiones huérfanas.
+    """
+    base_dir = Path(base_dir)
+    if base_dir.exists():
+        shutil.rmtree(base_dir)
+    parquet = pq.ParquetFile(ruta_final)
+    schema = parquet.schema_arrow
+    for campo in ESQUEMA_PARTICION:
+        schema = schema.append(campo)
+
+    def batches():
+        for batch in parquet.iter_batches():
+            # tipo_vehiculo de datos_final ('Yellow Taxi' / 'VTC') -> servicio TLC
+            tipo = batch.column("tipo_vehiculo").cast(pa.string())
+            service = pc.replace_substring_regex(tipo, "^Yellow Taxi$", "yellow")
+            service = pc.replace_substring_regex(service, "^VTC$", "fhvhv")
+            year = pc.year(batch.column("fecha_inicio")).cast(pa.int16())
+            month = batch.column("mes_num").cast(pa.int8())
+            yield _con_columnas_particion(batch, service, year, month)
+
+    _escribir(batches(), schema, base_dir)
+    return f"OK   datos_final particionado en {base_dir}"
+
+
+def codigo_particionado() -> str:
+    return hash_codigo(__file__)
+
+
+def entrada_datos_final(ruta_final, base_dir: Path = DATOS_FINAL_DIR, manifest: Manifest | None = None) -> str:
+    """
+    Ruta desde la que leer datos_final: la copia particionada si el manifest
+    la da por generada a partir del datos_final.parquet actual (con el mismo
+    código de particionado); si no, el propio parquet. Que exista el
+    directorio no basta: si datos_final se ha regenerado sin --particionado,
+    la copia se queda con los datos viejos.
+    """
+    if Path(base_dir).is_dir():
+        manifest = manifest if manifest is not None else Manifest()
+        if manifest.esta_actualizado(ARTEFACTO_PARTICIONADO, [base_dir], [ruta_final], codigo_particionado()):
+            return str(base_dir)
+    return str(ruta_final)
+
+
+def abrir_dataset(ruta) -> ds.Dataset:
+    """
+    Abre un parquet suelto o un directorio Hive como pyarrow.dataset.
+    Así los consumidores funcionan igual con datos_final.parquet o con su
+    versión particionada.
+    """
+    ruta = Path(ruta)
+    if ruta.is_dir():
+        return ds.dataset(ruta, format="parquet", partitioning=_particionado())
+    return ds.dataset(ruta, format="parquet")
+
+
+def es_particionado(dataset: ds.Dataset) -> bool:
+    particion = getattr(dataset, "partitioning", None)
+    return particion is not None and "month" in particion.schema.names
+
+
+def filtro_meses(dataset: ds.Dataset, meses) -> ds.Expression:
+    """
+    Filtro por mes: sobre la columna de partición si existe (poda directorios),
+    si no sobre mes_num (poda row groups por estadísticas).
+    """
+    meses = sorted(int(m) for m in meses)
+    if es_particionado(dataset):
+        return pc.field("month").isin(pa.array(meses, pa.int8()))
+    return pc.field("mes_num").isin(meses)
+
+
+def leer_pandas(ruta, columnas: list[str] | None = None, filtro: ds.Expression | None = None):
+    """Lee solo los fragmentos/row groups que cumplen el filtro y devuelve un DataFrame."""
+    dataset = abrir_dataset(ruta)
+    if columnas is not None:
+        columnas = [c for c in columnas if c in dataset.schema.names]
+    return dataset.to_table(columns=columnas, filter=filtro).to_pandas()
@@ -1,10 +1,386 @@
+"""Perfilado de parquets en streaming.
+
+El informe se calcula en una sola pasada por lotes, sin cargar el fichero
+entero. Cada columna guarda acumuladores de tamaño fijo que se pueden
+combinar entre sí (lotes, meses, servicios):
+
+  - numéricas: momentos (media, varianza, skew, kurtosis) + sketch KLL de cuantiles
+  - categóricas: HyperLogLog para únicos + heavy hitters (Misra-Gries)
+  - fechas: min / max
+  - todas: nulos
+
+Los cuantiles y los outliers IQR son aproximados en ficheros grandes
+(error de rango ~1%); en ficheros pequeños el sketch guarda todos los
+valores y coinciden con pandas.
+"""
+
+import json
 from pathlib import Path
-import pandas as pd
+
 import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+BATCH_ROWS = 262_144
+KLL_K = 400
+HLL_P = 14
+TOPK_CAPACIDAD = 1000
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Acumuladores combinables
+# ──────────────────────────────────────────────────────────────────────────────
+class Momentos:
+    """count, media y momentos centrales M2..M4 con combinación de Pébay."""
+
+    def __init__(self):
+        self.n = 0
+        self.media = 0.0
+        self.m2 = self.m3 = self.m4 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def actualizar(self, x: np.ndarray) -> None:
+        if len(x) == 0:
+            return
+        otro = Momentos()
+        otro.n = len(x)
+        otro.media = float(x.mean())
+        c = x - otro.media
+        c2 = c * c
+        otro.m2 = float(c2.sum())
+        otro.m3 = float((c2 * c).sum())
+        otro.m4 = float((c2 * c2).sum())
+        otro.min = float(x.min())
+        otro.max = float(x.max())
+        self.combinar(otro)
+
+    def combinar(self, otro: "Momentos") -> None:
+        if otro.n == 0:
+            return
+        if self.n == 0:
+            self.__dict__.update(otro.__dict__)
+            return
+        na, nb = self.n, otro.n
+        n = na + nb
+        d = otro.media - self.media
+        d2 = d * d
+        m2 = self.m2 + otro.m2 + d2 * na * nb / n
+        m3 = (
+            self.m3 + otro.m3
+            + d * d2 * na * nb * (na - nb) / n**2
+            + 3 * d * (na * otro.m2 - nb * self.m2) / n
+        )
+        m4 = (
+            self.m4 + otro.m4
+            + d2 * d2 * na * nb * (na * na - na * nb + nb * nb) / n**3
+            + 6 * d2 * (na * na * otro.m2 + nb * nb * self.m2) / n**2
+            + 4 * d * (na * otro.m3 - nb * self.m3) / n
+        )
+        self.media += d * nb / n
+        self.n = n
+        self.m2, self.m3, self.m4 = m2, m3, m4
+        self.min = min(self.min, otro.min)
+        self.max = max(self.max, otro.max)
+
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else np.nan
+
+    def skew(self) -> float:
+        # Misma fórmula (sesgo corregido) que pandas.Series.skew
+        n = self.n
+        if n < 3:
+            return np.nan
+        if self.m2 == 0:
+            return 0.0
+        return float(n * (n - 1) ** 0.5 / (n - 2) * self.m3 / self.m2**1.5)
+
+    def kurtosis(self) -> float:
+        # Misma fórmula (exceso corregido) que pandas.Series.kurtosis
+        n = self.n
+        if n < 4:
+            return np.nan
+        if self.m2 == 0:
+            return 0.0
+        num = n * (n + 1) * (n - 1) * self.m4
+        den = (n - 2) * (n - 3) * self.m2**2
+        return float(num / den - 3 * (n - 1) ** 2 / ((n - 2) * (n - 3)))
+
+
+class CuantilesKLL:
+    """
+    Sketch KLL de cuantiles. El nivel h guarda elementos de peso 2^h; cuando
+    un nivel se llena se ordena y la mitad (con desfase aleatorio) sube al
+    siguiente. Tamaño ~3k independientemente del número de valores.
+    """
+
+    def __init__(self, k: int = KLL_K, semilla: int = 0):
+        self.k = k
+        self.niveles = [np.empty(0)]
+        self._rng = np.random.default_rng(semilla)
+
+    def _capacidad(self, h: int) -> int:
+        profundidad = len(self.niveles) - 1 - h
+        return max(8, int(np.ceil(self.k * (2 / 3) ** profundidad)))
+
+    def _compactar(self) -> None:
+        h = 0
+        while h < len(self.niveles):
+            nivel = self.niveles[h]
+            if len(nivel) <= self._capacidad(h):
+                h += 1
+                continue
+            if h + 1 == len(self.niveles):
+                self.niveles.append(np.empty(0))
+            nivel = np.sort(nivel)
+            resto = len(nivel) % 2
+            sube = nivel[resto + self._rng.integers(2)::2]
+            self.niveles[h] = nivel[:resto]
+            self.niveles[h + 1] = np.concatenate([self.niveles[h + 1], sube])
+            # Al crecer la altura bajan las capacidades de los niveles inferiores
+            h = 0
+
+    def actualizar(self, x: np.ndarray) -> None:
+        if len(x):
+            self.niveles[0] = np.concatenate([self.niveles[0], x])
+            self._compactar()
+
+    def combinar(self, otro: "CuantilesKLL") -> None:
+        while len(self.niveles) < len(otro.niveles):
+            self.niveles.append(np.empty(0))
+        for h, nivel in enumerate(otro.niveles):
+            self.niveles[h] = np.concatenate([self.niveles[h], nivel])
+        self._compactar()
+
+    def _ordenado(self):
+        valores = np.concatenate(self.niveles)
+        pesos = np.concatenate([np.full(len(n), 2.0**h) for h, n in enumerate(self.niveles)])
+        orden = np.argsort(valores, kind="stable")
+        return valores[orden], pesos[orden]
+
+    def cuantiles(self, qs) -> np.ndarray:
+        """Interpolación lineal como pandas: con todos los pesos a 1 es exacto."""
+        valores, pesos = self._ordenado()
+        if len(valores) == 0:
+            return np.full(len(qs), np.nan)
+        acum = np.cumsum(pesos)
+        # Rango medio de cada elemento (0-indexado)
+        centro = acum - pesos + (pesos - 1) / 2
+        total = acum[-1]
+        return np.interp(np.asarray(qs) * (total - 1), centro, valores)
+
+    def fuera_de(self, inferior: float, superior: float) -> float:
+        """Peso estimado de valores < inferior o > superior."""
+        valores, pesos = self._ordenado()
+        return float(pesos[(valores < inferior) | (valores > superior)].sum())
+
+
+class HyperLogLog:
+    """Estimador de cardinalidad con 2^p registros de 1 byte."""
+
+    def __init__(self, p: int = HLL_P):
+        self.p = p
+        self.registros = np.zeros(1 << p, dtype=np.uint8)
+
+    def actualizar(self, hashes: np.ndarray) -> None:
+        if len(hashes) == 0:
+            return
+        hashes = hashes.astype(np.uint64, copy=False)
+        idx = (hashes & np.uint64((1 << self.p) - 1)).astype(np.intp)
+        resto = hashes >> np.uint64(self.p)
+        bits = 64 - self.p
+        # resto < 2^50: la conversión a float64 es exacta y frexp da su bit_length
+        longitud = np.frexp(resto.astype(np.float64))[1]
+        rho = (bits - longitud + 1).astype(np.uint8)
+        np.maximum.at(self.registros, idx, rho)
+
+    def combinar(self, otro: "HyperLogLog") -> None:
+        np.maximum(self.registros, otro.registros, out=self.registros)
 
+    def estimar(self) -> int:
+        m = len(self.registros)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimado = alpha * m * m / np.sum(np.ldexp(1.0, -self.registros.astype(np.int64)))
+        ceros = int((self.registros == 0).sum())
+        if estimado <= 2.5 * m and ceros > 0:
+            # Corrección de rango pequeño (linear counting)
+            estimado = m * np.log(m / ceros)
+        return int(round(estimado))
 
-def print_dataset_stats(parquet_path: Path, sample_rows: int = 5) -> None:
-    df = pd.read_parquet(parquet_path)
+
+class TopK:
+    """
+    Heavy hitters de Misra-Gries. Mientras el número de valores distintos no
+    supere la capacidad las cuentas son exactas.
+    """
+
+    def __init__(self, capacidad: int = TOPK_CAPACIDAD):
+        self.capacidad = capacidad
+        self.cuentas = pd.Series(dtype="int64")
+        self.exacto = True
+
+    def _recortar(self) -> None:
+        if len(self.cuentas) <= self.capacidad:
+            return
+        umbral = self.cuentas.nlargest(self.capacidad + 1).iloc[-1]
+        self.cuentas = self.cuentas - umbral
+        self.cuentas = self.cuentas[self.cuentas > 0]
+        self.exacto = False
+
+    def actualizar(self, serie: pd.Series) -> None:
+        vc = serie.value_counts(dropna=True)
+        vc = vc[vc > 0]
+        vc.index = vc.index.astype(object)
+        self.cuentas = self.cuentas.add(vc, fill_value=0).astype("int64")
+        self._recortar()
+
+    def combinar(self, otro: "TopK") -> None:
+        self.cuentas = self.cuentas.add(otro.cuentas, fill_value=0).astype("int64")
+        self.exacto = self.exacto and otro.exacto
+        self._recortar()
+
+    def top(self, n: int | None = None) -> pd.Series:
+        ordenado = self.cuentas.sort_values(ascending=False, kind="stable")
+        return ordenado if n is None else ordenado.head(n)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# Perfil de un dataset
+# ──────────────────────────────────────────────────────────────────────────────
+class PerfilDataset:
+    """Acumuladores por columna; se alimenta por lotes y se combina con otros perfiles."""
+
+    def __init__(self, dtypes: pd.Series):
+        self.dtypes = dtypes
+        self.filas = 0
+        self.nulos = pd.Series(0, index=dtypes.index, dtype="int64")
+        vacio = pd.DataFrame({c: pd.Series(dtype=t) for c, t in dtypes.items()})
+        self.num_cols = list(vacio.select_dtypes(include=["number"]).columns)
+        self.cat_cols = list(vacio.select_dtypes(include=["object", "str", "category"]).columns)
+        self.date_cols = list(vacio.select_dtypes(include=["datetime", "datetimetz"]).columns)
+
+        self.momentos = {c: Momentos() for c in self.num_cols}
+        self.cuantiles = {c: CuantilesKLL() for c in self.num_cols}
+        self.distintos = {c: HyperLogLog() for c in self.cat_cols}
+        self.frecuentes = {c: TopK() for c in self.cat_cols}
+        self.fechas = {c: [None, None] for c in self.date_cols}
+        self.muestra = vacio
+
+    def actualizar(self, df: pd.DataFrame) -> None:
+        self.filas += len(df)
+        self.nulos += df.isna().sum().reindex(self.nulos.index, fill_value=0)
+
+        for col in self.num_cols:
+            x = df[col].to_numpy(dtype="float64", na_value=np.nan)
+            x = x[~np.isnan(x)]
+            self.momentos[col].actualizar(x)
+            self.cuantiles[col].actualizar(x)
+
+        for col in self.cat_cols:
+            serie = df[col].dropna()
+            self.distintos[col].actualizar(pd.util.hash_pandas_object(serie, index=False).to_numpy())
+            self.frecuentes[col].actualizar(serie)
+
+        for col in self.date_cols:
+            lo, hi = df[col].min(), df[col].max()
+            actual = self.fechas[col]
+            if pd.notna(lo):
+                actual[0] = lo if actual[0] is None else min(actual[0], lo)
+                actual[1] = hi if actual[1] is None else max(actual[1], hi)
+
+    def combinar(self, otro: "PerfilDataset") -> None:
+        self.filas += otro.filas
+        self.nulos = self.nulos.add(otro.nulos, fill_value=0).astype("int64")
+        for col in self.num_cols:
+            self.momentos[col].combinar(otro.momentos[col])
+            self.cuantiles[col].combinar(otro.cuantiles[col])
+        for col in self.cat_cols:
+            self.distintos[col].combinar(otro.distintos[col])
+            self.frecuentes[col].combinar(otro.frecuentes[col])
+        for col in self.date_cols:
+            for i, f in ((0, min), (1, max)):
+                a, b = self.fechas[col][i], otro.fechas[col][i]
+                self.fechas[col][i] = b if a is None else a if b is None else f(a, b)
+
+    # ── Resultados ───────────────────────────────────────────────────────────
+    def unicos(self, col: str) -> int:
+        # Si el top-k es exacto, el número de claves es la cardinalidad exacta
+        if self.frecuentes[col].exacto:
+            return len(self.frecuentes[col].cuentas)
+        return self.distintos[col].estimar()
+
+    def describe(self) -> pd.DataFrame:
+        filas = {}
+        for col in self.num_cols:
+            m = self.momentos[col]
+            q1, q2, q3 = self.cuantiles[col].cuantiles([0.25, 0.5, 0.75])
+            filas[col] = {
+                "count": float(m.n),
+                "mean": m.media if m.n else np.nan,
+                "std": m.std(),
+                "min": m.min if m.n else np.nan,
+                "25%": q1, "50%": q2, "75%": q3,
+                "max": m.max if m.n else np.nan,
+                "skew": m.skew(),
+                "kurtosis": m.kurtosis(),
+            }
+        return pd.DataFrame.from_dict(filas, orient="index")
+
+    def outliers_iqr(self) -> dict[str, int]:
+        resultado = {}
+        for col in self.num_cols:
+            q1, q3 = self.cuantiles[col].cuantiles([0.25, 0.75])
+            iqr = q3 - q1
+            fuera = self.cuantiles[col].fuera_de(q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+            resultado[col] = int(round(fuera))
+        return resultado
+
+    def a_dict(self) -> dict:
+        desc = self.describe()
+        return {
+            "filas": self.filas,
+            "columnas": len(self.dtypes),
+            "dtypes": {c: str(t) for c, t in self.dtypes.items()},
+            "nulos": {c: int(v) for c, v in self.nulos.items() if v > 0},
+            "numericas": {
+                col: {k: (None if pd.isna(v) else float(v)) for k, v in desc.loc[col].items()}
+                for col in self.num_cols
+            },
+            "outliers_iqr": self.outliers_iqr(),
+            "categoricas": {
+                col: {
+                    "unicos": self.unicos(col),
+                    "exacto": self.frecuentes[col].exacto,
+                    "top": {str(k): int(v) for k, v in self.frecuentes[col].top(10).items()},
+                }
+                for col in self.cat_cols
+            },
+            "fechas": {
+                col: {"min": str(lo), "max": str(hi)} for col, (lo, hi) in self.fechas.items()
+            },
+        }
+
+
+def perfilar_parquet(parquet_path: Path, sample_rows: int = 5, batch_rows: int = BATCH_ROWS) -> PerfilDataset:
+    """Recorre el parquet una vez por lotes y devuelve su perfil."""
+    parquet = pq.ParquetFile(parquet_path)
+    perfil = None
+    for batch in parquet.iter_batches(batch_size=batch_rows):
+        df = batch.to_pandas()
+        if perfil is None:
+            perfil = PerfilDataset(df.dtypes)
+            perfil.muestra = df.head(sample_rows)
+        perfil.actualizar(df)
+    if perfil is None:
+        perfil = PerfilDataset(parquet.schema_arrow.empty_table().to_pandas().dtypes)
+    return perfil
+
+
+def print_dataset_stats(parquet_path: Path, sample_rows: int = 5, json_path: Path | None = None) -> dict:
+    parquet_path = Path(parquet_path)
+    perfil = perfilar_parquet(parquet_path, sample_rows)
+    metadata = pq.ParquetFile(parquet_path).metadata
+    n = max(perfil.filas, 1)
 
     print("\n" + "=" * 70)
     print(f" DATASET STATS: {parquet_path.name}")
@@ -14,28 +390,28 @@ def print_dataset_stats(parquet_path: Path, sample_rows: int = 5) -> None:
     # 1️ Dimensiones básicas
     # --------------------------------------------------
     print("\n Dimensiones")
-    print(f"   Filas: {len(df):,}")
-    print(f"   Columnas: {len(df.columns)}")
+    print(f"   Filas: {perfil.filas:,}")
+    print(f"   Columnas: {len(perfil.dtypes)}")
 
-    memoria_mb = df.memory_usage(deep=True).sum() / 1024**2
-    print(f"   Memoria: {memoria_mb:.2f} MB")
+    disco_mb = parquet_path.stat().st_size / 1024**2
+    sin_comprimir_mb = sum(
+        metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups)
+    ) / 1024**2
+    print(f"   Disco: {disco_mb:.2f} MB (sin comprimir: {sin_comprimir_mb:.2f} MB)")
 
     # --------------------------------------------------
     # 2️ Tipos de datos
     # --------------------------------------------------
     print("\n Tipos de datos")
-    print(df.dtypes.to_string().replace("\n", "\n   "))
+    print(perfil.dtypes.to_string().replace("\n", "\n   "))
 
     # --------------------------------------------------
     # 3️ Nulos
     # --------------------------------------------------
     print("\n Valores nulos")
-    na = df.isna().sum()
-    na_pct = (na / len(df) * 100).round(2)
-
     df_na = pd.DataFrame({
-        "Nulos": na,
-        "Porcentaje (%)": na_pct
+        "Nulos": perfil.nulos,
+        "Porcentaje (%)": (perfil.nulos / n * 100).round(2)
     }).sort_values("Porcentaje (%)", ascending=False)
 
     df_na = df_na[df_na["Nulos"] > 0]
@@ -48,60 +424,55 @@ def print_dataset_stats(parquet_path: Path, sample_rows: int = 5) -> None:
     # --------------------------------------------------
     # 4️ Numéricas
     # --------------------------------------------------
-    num_cols = df.select_dtypes(include=["number"]).columns
-
-    if len(num_cols) > 0:
+    if perfil.num_cols:
         print("\n Estadísticas numéricas")
-        desc = df[num_cols].describe().T
-        desc["skew"] = df[num_cols].skew()
-        desc["kurtosis"] = df[num_cols].kurtosis()
-        print(desc.round(3).to_string())
+        print(perfil.describe().round(3).to_string())
 
-        # Outliers simples (IQR)
+        # Outliers simples (IQR), contados sobre el sketch de cuantiles
         print("\n Outliers aproximados (IQR method)")
-        for col in num_cols:
-            q1 = df[col].quantile(0.25)
-            q3 = df[col].quantile(0.75)
-            iqr = q3 - q1
-            lower = q1 - 1.5 * iqr
-            upper = q3 + 1.5 * iqr
-            outliers = ((df[col] < lower) | (df[col] > upper)).sum()
-            pct = outliers / len(df) * 100
+        for col, outliers in perfil.outliers_iqr().items():
+            pct = outliers / n * 100
             print(f"   {col:20s}: {outliers:,} ({pct:.2f}%)")
 
     # --------------------------------------------------
     # 5️ Categóricas
     # --------------------------------------------------
-    cat_cols = df.select_dtypes(include=["object", "category"]).columns
-
-    if len(cat_cols) > 0:
+    if perfil.cat_cols:
         print("\n🔹 Variables categóricas")
 
-        for col in cat_cols:
-            nunique = df[col].nunique()
+        for col in perfil.cat_cols:
+            nunique = perfil.unicos(col)
+            frecuentes = perfil.frecuentes[col]
+            aprox = "" if frecuentes.exacto else " (aprox.)"
             print(f"\n    {col}")
-            print(f"      Categorías únicas: {nunique}")
+            print(f"      Categorías únicas: {nunique}{aprox}")
 
-            if nunique <= 20:
-                print(df[col].value_counts().to_string().replace("\n", "\n      "))
+            if nunique <= 20 and frecuentes.exacto:
+                print(frecuentes.top().to_string().replace("\n", "\n      "))
             else:
-                print("      Top 10 valores:")
-                print(df[col].value_counts().head(10).to_string().replace("\n", "\n      "))
+                print(f"      Top 10 valores{aprox}:")
+                print(frecuentes.top(10).to_string().replace("\n", "\n      "))
 
     # --------------------------------------------------
     # 6️ Fechas
     # --------------------------------------------------
-    date_cols = df.select_dtypes(include=["datetime"]).columns
-
-    if len(date_cols) > 0:
+    if perfil.date_cols:
         print("\n Rango temporal")
-        for col in date_cols:
-            print(f"   {col}: {df[col].min()} -> {df[col].max()}")
+        for col, (lo, hi) in perfil.fechas.items():
+            print(f"   {col}: {lo} -> {hi}")
 
     # --------------------------------------------------
     # 7️ Muestra de filas
     # --------------------------------------------------
     print("\n Sample filas")
-    print(df.head(sample_rows).to_string())
+    print(perfil.muestra.to_string())
 
     print("\n" + "=" * 70)
+
+    resumen = perfil.a_dict()
+    if json_path is not None:
+        json_path = Path(json_path)
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False)
+    return resumen